@@ -4,6 +4,7 @@ Sistema de logging para agentes com integração BigQuery
 import os
 import sys
 import json
+import logging
 import structlog
 from datetime import datetime
 from typing import Dict, Any, Optional
@@ -112,8 +113,19 @@ class AgentLogger:
             # Não falhar se o BigQuery não estiver disponível
             self.logger.error(f"Erro ao enviar log para BigQuery: {str(e)}")
     
+    def isEnabledFor(self, level: int) -> bool:
+        """
+        Indica se um log do nível seria emitido localmente ou enviado ao BigQuery
+        
+        Permite evitar montar o dict de extra quando o log seria descartado:
+        if logger.isEnabledFor(logging.INFO): logger.info(msg, {...})
+        """
+        return self.bigquery_client is not None or logging.getLogger(self.agent_name).isEnabledFor(level)
+    
     def info(self, message: str, extra: Optional[Dict[str, Any]] = None):
         """Log de informação"""
+        if not self.isEnabledFor(logging.INFO):
+            return
         self.logger.info(message, **extra if extra else {})
         self._log_to_bigquery("INFO", message, extra)
     
@@ -129,6 +141,8 @@ class AgentLogger:
     
     def debug(self, message: str, extra: Optional[Dict[str, Any]] = None):
         """Log de debug"""
+        if not self.isEnabledFor(logging.DEBUG):
+            return
         self.logger.debug(message, **extra if extra else {})
         self._log_to_bigquery("DEBUG", message, extra)
     
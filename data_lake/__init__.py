@@ -5,14 +5,20 @@ Camadas RAW, TRUSTED e REFINED para análise de dados
 
 from .bigquery_setup import BigQueryDataLake
 from .data_pipeline import DataPipeline
-from .log_ingestion import LogIngestion, log_ingestion, start_log_ingestion, stop_log_ingestion
+from .log_ingestion import LogIngestion, log_ingestion, get_log_ingestion, start_log_ingestion, stop_log_ingestion
+from .shared_log_ring import SharedLogRing, create_log_rings, start_shared_ingestion, stop_shared_ingestion
 
 __all__ = [
     'BigQueryDataLake',
     'DataPipeline', 
     'LogIngestion',
     'log_ingestion',
+    'get_log_ingestion',
     'start_log_ingestion',
-    'stop_log_ingestion'
+    'stop_log_ingestion',
+    'SharedLogRing',
+    'create_log_rings',
+    'start_shared_ingestion',
+    'stop_shared_ingestion'
 ]
 
@@ -20,13 +20,46 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 from config.project_config import config
 from agents.base.logger import AgentLogger
+from data_lake.shared_log_ring import SharedLogRing
+
+# Sentinela colocada na fila para acordar o worker bloqueado no stop
+_STOP_SENTINEL = object()
+
+# Templates de linha por tabela RAW: copiar um dict pronto evita reconstruir
+# a tabela de hash a cada log
+_AGENT_LOGS_TEMPLATE = dict.fromkeys((
+    "timestamp", "agent_name", "agent_type", "log_level", "message",
+    "extra_data", "session_id", "task_id", "execution_time_ms",
+    "error_details"
+))
+_MCP_REQUESTS_TEMPLATE = dict.fromkeys((
+    "timestamp", "mcp_server", "tool_name", "request_data", "response_data",
+    "response_time_ms", "status", "error_message", "requesting_agent"
+))
+_COST_ANALYSIS_RAW_TEMPLATE = dict.fromkeys((
+    "timestamp", "provider", "service", "resource_id", "cost_data",
+    "usage_data", "region", "account_id", "tags"
+))
+_SLA_METRICS_RAW_TEMPLATE = dict.fromkeys((
+    "timestamp", "provider", "service", "metric_type", "metric_value",
+    "metric_unit", "region", "availability_zone", "incident_id"
+))
+_COMPLIANCE_CHECKS_RAW_TEMPLATE = dict.fromkeys((
+    "timestamp", "framework", "control_id", "resource_id", "check_result",
+    "severity", "details", "remediation", "provider"
+))
 
 class LogIngestion:
     """
     Sistema de ingestão de logs para BigQuery
     """
     
-    def __init__(self):
+    def __init__(self, shared_ring_name: Optional[str] = None):
+        """
+        Args:
+            shared_ring_name: Anel compartilhado para onde enviar os logs. Quando
+                informado, a instância é apenas produtora e não cria cliente BigQuery
+        """
         self.logger = AgentLogger("LogIngestion")
         self.client = None
         self.project_id = config.gcp.project_id
@@ -34,9 +67,15 @@ class LogIngestion:
         self.log_queue = queue.Queue()
         self.batch_size = 100
         self.batch_timeout = 30  # segundos
+        self._config_gen = 0  # incrementado a cada mudança de configuração
         self.ingestion_thread = None
         self.running = False
-        self._initialize_client()
+        self.shared_ring = None
+        self.dropped_logs = 0  # logs descartados com o anel cheio
+        if shared_ring_name:
+            self.attach_shared_ring(shared_ring_name)
+        else:
+            self._initialize_client()
     
     def _initialize_client(self):
         """Inicializa cliente BigQuery"""
@@ -61,7 +100,7 @@ class LogIngestion:
     
     def start_ingestion(self):
         """Inicia o processo de ingestão em background"""
-        if self.running:
+        if self.running or self.shared_ring:
             return
         
         self.running = True
@@ -75,46 +114,103 @@ class LogIngestion:
         """Para o processo de ingestão"""
         self.running = False
         if self.ingestion_thread:
+            self.log_queue.put(_STOP_SENTINEL)
             self.ingestion_thread.join(timeout=5)
+            self.ingestion_thread = None
         
         # Processar logs restantes
         self._flush_logs()
         
         self.logger.info("Sistema de ingestão parado")
     
+    def attach_shared_ring(self, ring_name: str):
+        """
+        Direciona os logs deste processo para um anel em memória compartilhada
+        
+        O envio ao BigQuery passa a ser feito pelo processo de ingestão
+        compartilhado (ver data_lake.shared_log_ring.start_shared_ingestion).
+        
+        Args:
+            ring_name: Nome do anel criado pelo processo principal
+        """
+        # O worker local aguarda na fila antiga: parar e enviar o que restou
+        # antes de trocar a fila
+        if self.running:
+            self.stop_ingestion()
+        
+        self.shared_ring = SharedLogRing(ring_name, create=False)
+        self.log_queue = self.shared_ring
+        
+        # Produtores não inserem no BigQuery: liberar o cliente, se houver
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+    
+    def configure_batching(self, batch_size: Optional[int] = None, batch_timeout: Optional[float] = None):
+        """
+        Altera os parâmetros de lote com o worker em execução
+        
+        Args:
+            batch_size: Quantidade máxima de logs por lote
+            batch_timeout: Tempo máximo (segundos) de espera por lote
+        """
+        if batch_size is not None:
+            self.batch_size = batch_size
+        if batch_timeout is not None:
+            self.batch_timeout = batch_timeout
+        self._config_gen += 1
+    
     def _ingestion_worker(self):
         """Worker thread para processar logs em lotes"""
-        batch = []
-        last_flush = time.time()
+        # Atributos usados no loop ficam em variáveis locais (LOAD_FAST);
+        # só são relidos de self quando _config_gen muda
+        log_queue = self.log_queue
+        insert_batch = self._insert_batch
+        logger = self.logger
+        config_gen = self._config_gen
+        batch_size = self.batch_size
+        batch_timeout = self.batch_timeout
+        monotonic = time.monotonic
         
         while self.running:
             try:
-                # Tentar obter log da fila
-                try:
-                    log_entry = self.log_queue.get(timeout=1)
-                    batch.append(log_entry)
-                except queue.Empty:
-                    pass
+                if config_gen != self._config_gen:
+                    config_gen = self._config_gen
+                    batch_size = self.batch_size
+                    batch_timeout = self.batch_timeout
                 
-                # Verificar se deve fazer flush
-                current_time = time.time()
-                should_flush = (
-                    len(batch) >= self.batch_size or
-                    (batch and current_time - last_flush >= self.batch_timeout)
-                )
+                # Bloquear até o primeiro log chegar (sem acordar a cada segundo)
+                log_entry = log_queue.get()
+                if log_entry is _STOP_SENTINEL:
+                    break
+                batch = [log_entry]
+                first_item_time = monotonic()
+                stop = False
+                
+                # Drenar o restante até encher o lote ou estourar o timeout
+                while len(batch) < batch_size:
+                    try:
+                        log_entry = log_queue.get_nowait()
+                    except queue.Empty:
+                        remaining = batch_timeout - (monotonic() - first_item_time)
+                        if remaining <= 0:
+                            break
+                        try:
+                            log_entry = log_queue.get(timeout=remaining)
+                        except queue.Empty:
+                            break
+                    if log_entry is _STOP_SENTINEL:
+                        stop = True
+                        break
+                    batch.append(log_entry)
                 
-                if should_flush:
-                    self._insert_batch(batch)
-                    batch = []
-                    last_flush = current_time
+                insert_batch(batch)
+                if stop:
+                    break
                     
             except Exception as e:
-                self.logger.error(f"Erro no worker de ingestão: {str(e)}")
+                logger.error(f"Erro no worker de ingestão: {str(e)}")
                 time.sleep(1)
-        
-        # Processar batch final
-        if batch:
-            self._insert_batch(batch)
     
     def _insert_batch(self, batch: List[Dict[str, Any]]):
         """Insere lote de logs no BigQuery"""
@@ -147,18 +243,39 @@ class LogIngestion:
     
     def _flush_logs(self):
         """Força o processamento de todos os logs na fila"""
+        if self.shared_ring:
+            return
+        
         batch = []
         
         while not self.log_queue.empty():
             try:
                 log_entry = self.log_queue.get_nowait()
-                batch.append(log_entry)
             except queue.Empty:
                 break
+            if log_entry is not _STOP_SENTINEL:
+                batch.append(log_entry)
         
         if batch:
             self._insert_batch(batch)
     
+    def _enqueue(self, log_entry: Dict[str, Any]):
+        """
+        Enfileira um log sem nunca bloquear nem lançar exceção no chamador
+        
+        No modo produtor o anel é limitado: se estiver cheio (processo de
+        ingestão parado ou atrasado), o log não couber ou não puder ser
+        serializado, ele é descartado e contado em dropped_logs.
+        """
+        if self.shared_ring is None:
+            self.log_queue.put(log_entry)
+            return
+        
+        try:
+            self.shared_ring.put_nowait(log_entry)
+        except Exception:  # queue.Full, ValueError (log maior que o anel), pickle
+            self.dropped_logs += 1
+    
     def log_agent_activity(
         self,
         agent_name: str,
@@ -185,23 +302,20 @@ class LogIngestion:
             execution_time_ms: Tempo de execução em ms
             error_details: Detalhes do erro se houver
         """
-        log_entry = {
-            "table": "agent_logs",
-            "data": {
-                "timestamp": datetime.now().isoformat(),
-                "agent_name": agent_name,
-                "agent_type": agent_type,
-                "log_level": log_level,
-                "message": message,
-                "extra_data": json.dumps(extra_data) if extra_data else None,
-                "session_id": session_id or str(uuid.uuid4()),
-                "task_id": task_id,
-                "execution_time_ms": execution_time_ms,
-                "error_details": json.dumps(error_details) if error_details else None
-            }
-        }
+        data = _AGENT_LOGS_TEMPLATE.copy()
+        data["timestamp"] = datetime.now().isoformat()
+        data["agent_name"] = agent_name
+        data["agent_type"] = agent_type
+        data["log_level"] = log_level
+        data["message"] = message
+        data["extra_data"] = json.dumps(extra_data) if extra_data else None
+        data["session_id"] = session_id or str(uuid.uuid4())
+        data["task_id"] = task_id
+        data["execution_time_ms"] = execution_time_ms
+        data["error_details"] = json.dumps(error_details) if error_details else None
+        log_entry = {"table": "agent_logs", "data": data}
         
-        self.log_queue.put(log_entry)
+        self._enqueue(log_entry)
     
     def log_mcp_request(
         self,
@@ -227,22 +341,19 @@ class LogIngestion:
             error_message: Mensagem de erro se houver
             requesting_agent: Agente que fez a requisição
         """
-        log_entry = {
-            "table": "mcp_requests",
-            "data": {
-                "timestamp": datetime.now().isoformat(),
-                "mcp_server": mcp_server,
-                "tool_name": tool_name,
-                "request_data": json.dumps(request_data),
-                "response_data": json.dumps(response_data) if response_data else None,
-                "response_time_ms": response_time_ms,
-                "status": status,
-                "error_message": error_message,
-                "requesting_agent": requesting_agent
-            }
-        }
+        data = _MCP_REQUESTS_TEMPLATE.copy()
+        data["timestamp"] = datetime.now().isoformat()
+        data["mcp_server"] = mcp_server
+        data["tool_name"] = tool_name
+        data["request_data"] = json.dumps(request_data)
+        data["response_data"] = json.dumps(response_data) if response_data else None
+        data["response_time_ms"] = response_time_ms
+        data["status"] = status
+        data["error_message"] = error_message
+        data["requesting_agent"] = requesting_agent
+        log_entry = {"table": "mcp_requests", "data": data}
         
-        self.log_queue.put(log_entry)
+        self._enqueue(log_entry)
     
     def log_cost_analysis(
         self,
@@ -268,22 +379,19 @@ class LogIngestion:
             account_id: ID da conta
             tags: Tags do recurso
         """
-        log_entry = {
-            "table": "cost_analysis_raw",
-            "data": {
-                "timestamp": datetime.now().isoformat(),
-                "provider": provider,
-                "service": service,
-                "resource_id": resource_id,
-                "cost_data": json.dumps(cost_data),
-                "usage_data": json.dumps(usage_data) if usage_data else None,
-                "region": region,
-                "account_id": account_id,
-                "tags": json.dumps(tags) if tags else None
-            }
-        }
+        data = _COST_ANALYSIS_RAW_TEMPLATE.copy()
+        data["timestamp"] = datetime.now().isoformat()
+        data["provider"] = provider
+        data["service"] = service
+        data["resource_id"] = resource_id
+        data["cost_data"] = json.dumps(cost_data)
+        data["usage_data"] = json.dumps(usage_data) if usage_data else None
+        data["region"] = region
+        data["account_id"] = account_id
+        data["tags"] = json.dumps(tags) if tags else None
+        log_entry = {"table": "cost_analysis_raw", "data": data}
         
-        self.log_queue.put(log_entry)
+        self._enqueue(log_entry)
     
     def log_sla_metric(
         self,
@@ -309,22 +417,19 @@ class LogIngestion:
             availability_zone: Zona de disponibilidade
             incident_id: ID do incidente se houver
         """
-        log_entry = {
-            "table": "sla_metrics_raw",
-            "data": {
-                "timestamp": datetime.now().isoformat(),
-                "provider": provider,
-                "service": service,
-                "metric_type": metric_type,
-                "metric_value": metric_value,
-                "metric_unit": metric_unit,
-                "region": region,
-                "availability_zone": availability_zone,
-                "incident_id": incident_id
-            }
-        }
+        data = _SLA_METRICS_RAW_TEMPLATE.copy()
+        data["timestamp"] = datetime.now().isoformat()
+        data["provider"] = provider
+        data["service"] = service
+        data["metric_type"] = metric_type
+        data["metric_value"] = metric_value
+        data["metric_unit"] = metric_unit
+        data["region"] = region
+        data["availability_zone"] = availability_zone
+        data["incident_id"] = incident_id
+        log_entry = {"table": "sla_metrics_raw", "data": data}
         
-        self.log_queue.put(log_entry)
+        self._enqueue(log_entry)
     
     def log_compliance_check(
         self,
@@ -350,22 +455,19 @@ class LogIngestion:
             details: Detalhes da verificação
             remediation: Ação de remediação recomendada
         """
-        log_entry = {
-            "table": "compliance_checks_raw",
-            "data": {
-                "timestamp": datetime.now().isoformat(),
-                "framework": framework,
-                "control_id": control_id,
-                "resource_id": resource_id,
-                "check_result": check_result,
-                "severity": severity,
-                "details": json.dumps(details) if details else None,
-                "remediation": remediation,
-                "provider": provider
-            }
-        }
+        data = _COMPLIANCE_CHECKS_RAW_TEMPLATE.copy()
+        data["timestamp"] = datetime.now().isoformat()
+        data["framework"] = framework
+        data["control_id"] = control_id
+        data["resource_id"] = resource_id
+        data["check_result"] = check_result
+        data["severity"] = severity
+        data["details"] = json.dumps(details) if details else None
+        data["remediation"] = remediation
+        data["provider"] = provider
+        log_entry = {"table": "compliance_checks_raw", "data": data}
         
-        self.log_queue.put(log_entry)
+        self._enqueue(log_entry)
     
     def get_ingestion_stats(self) -> Dict[str, Any]:
         """Retorna estatísticas de ingestão"""
@@ -375,23 +477,46 @@ class LogIngestion:
             "batch_size": self.batch_size,
             "batch_timeout": self.batch_timeout,
             "client_connected": self.client is not None,
+            "shared_ring": self.shared_ring.name if self.shared_ring else None,
+            "dropped_logs": self.dropped_logs,
             "timestamp": datetime.now().isoformat()
         }
 
-# Instância global para uso pelos agentes
-log_ingestion = LogIngestion()
+# Instância global para uso pelos agentes, criada no primeiro acesso para que
+# importar o módulo (ex.: no processo de ingestão compartilhado) não abra um
+# cliente BigQuery extra
+_log_ingestion = None
+_log_ingestion_lock = threading.Lock()
+
+def get_log_ingestion() -> LogIngestion:
+    """Retorna a instância global de ingestão, criando-a se necessário"""
+    global _log_ingestion
+    if _log_ingestion is None:
+        with _log_ingestion_lock:
+            if _log_ingestion is None:
+                _log_ingestion = LogIngestion()
+    return _log_ingestion
+
+class _LazyLogIngestion:
+    """Proxy da instância global: repassa os acessos e a cria no primeiro uso"""
+    
+    def __getattr__(self, name: str):
+        return getattr(get_log_ingestion(), name)
+
+log_ingestion = _LazyLogIngestion()
 
 def start_log_ingestion():
     """Inicia o sistema de ingestão de logs"""
-    log_ingestion.start_ingestion()
+    get_log_ingestion().start_ingestion()
 
 def stop_log_ingestion():
     """Para o sistema de ingestão de logs"""
-    log_ingestion.stop_ingestion()
+    get_log_ingestion().stop_ingestion()
 
 def main():
     """Função principal para teste do sistema de ingestão"""
     print("Iniciando sistema de ingestão de logs...")
+    log_ingestion = get_log_ingestion()
     
     # Iniciar ingestão
     log_ingestion.start_ingestion()
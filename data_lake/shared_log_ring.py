@@ -0,0 +1,214 @@
+"""
+Ring buffer em memória compartilhada para ingestão de logs multi-processo
+Cada processo de agente escreve no seu próprio anel (SPSC) e um único
+processo de ingestão drena todos os anéis e envia lotes ao BigQuery
+"""
+import pickle
+import queue
+import struct
+import sys
+import time
+from multiprocessing import Event, Process, resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, List, Optional
+
+DEFAULT_RING_SIZE = 8 * 1024 * 1024  # 8 MiB por processo produtor
+
+# Cabeçalho: head (bytes escritos) e tail (bytes lidos), ambos uint64
+_HEADER_SIZE = 16
+_LEN = struct.Struct("<I")
+
+
+class SharedLogRing:
+    """
+    Ring buffer single-producer/single-consumer sobre SharedMemory
+
+    Expõe put/put_nowait compatíveis com queue.Queue para poder substituir
+    LogIngestion.log_queue nos processos produtores. Não usa locks: apenas
+    o produtor avança head e apenas o consumidor avança tail.
+    """
+
+    def __init__(self, name: Optional[str] = None, size: int = DEFAULT_RING_SIZE, create: bool = True):
+        """
+        Cria ou anexa um anel
+
+        Args:
+            name: Nome do segmento de memória compartilhada (obrigatório ao anexar)
+            size: Capacidade de dados em bytes
+            create: True para criar o segmento, False para anexar a um existente
+        """
+        if create:
+            self._shm = SharedMemory(name=name, create=True, size=_HEADER_SIZE + size)
+            self._shm.buf[:_HEADER_SIZE] = bytes(_HEADER_SIZE)
+        elif sys.version_info >= (3, 13):
+            self._shm = SharedMemory(name=name, track=False)
+        else:
+            # Antes do 3.13 anexar também registra o segmento no resource_tracker.
+            # Processos filhos do criador compartilham o tracker dele; um produtor
+            # iniciado de forma independente sobe o próprio tracker, que removeria
+            # o segmento quando o produtor terminasse
+            own_tracker = resource_tracker._resource_tracker._fd is None
+            self._shm = SharedMemory(name=name)
+            if own_tracker:
+                resource_tracker.unregister(self._shm._name, "shared_memory")
+
+        self.name = self._shm.name
+        self.capacity = self._shm.size - _HEADER_SIZE
+        self._header = self._shm.buf[:_HEADER_SIZE].cast("Q")
+        self._data = self._shm.buf[_HEADER_SIZE:_HEADER_SIZE + self.capacity]
+
+    def _write(self, pos: int, payload) -> None:
+        """Copia bytes para o anel tratando a volta ao início"""
+        start = pos % self.capacity
+        first = min(len(payload), self.capacity - start)
+        self._data[start:start + first] = payload[:first]
+        if first < len(payload):
+            self._data[:len(payload) - first] = payload[first:]
+
+    def _read(self, pos: int, length: int) -> bytes:
+        """Lê bytes do anel tratando a volta ao início"""
+        start = pos % self.capacity
+        first = min(length, self.capacity - start)
+        if first == length:
+            return bytes(self._data[start:start + length])
+        return bytes(self._data[start:start + first]) + bytes(self._data[:length - first])
+
+    def put_nowait(self, entry: Dict[str, Any]) -> None:
+        """Serializa e grava um log no anel (lado produtor)"""
+        payload = pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL)
+        record_size = _LEN.size + len(payload)
+        if record_size > self.capacity:
+            # Nunca caberia: com block=True, put ficaria aguardando para sempre
+            raise ValueError(
+                f"Log de {record_size} bytes excede a capacidade do anel ({self.capacity} bytes)"
+            )
+
+        head = self._header[0]
+        if record_size > self.capacity - (head - self._header[1]):
+            raise queue.Full
+
+        self._write(head, _LEN.pack(len(payload)))
+        self._write(head + _LEN.size, payload)
+        # Publicar somente após o registro estar completo
+        self._header[0] = head + record_size
+
+    def put(self, entry: Dict[str, Any], block: bool = True, timeout: Optional[float] = None) -> None:
+        """
+        Compatível com queue.Queue.put; aguarda espaço se block=True
+
+        Raises:
+            ValueError: Se o log serializado for maior que a capacidade do anel
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                return self.put_nowait(entry)
+            except queue.Full:
+                if not block or (deadline is not None and time.monotonic() >= deadline):
+                    raise
+                time.sleep(0.001)
+
+    def drain(self, max_items: int) -> List[Dict[str, Any]]:
+        """Lê até max_items logs do anel (lado consumidor)"""
+        entries = []
+        tail = self._header[1]
+        head = self._header[0]
+
+        while tail < head and len(entries) < max_items:
+            (length,) = _LEN.unpack(self._read(tail, _LEN.size))
+            entries.append(pickle.loads(self._read(tail + _LEN.size, length)))
+            tail += _LEN.size + length
+
+        self._header[1] = tail
+        return entries
+
+    def qsize(self) -> int:
+        """Bytes pendentes no anel (aproximado)"""
+        return self._header[0] - self._header[1]
+
+    def empty(self) -> bool:
+        return self._header[0] == self._header[1]
+
+    def close(self) -> None:
+        """Libera as views e desanexa o segmento"""
+        self._header.release()
+        self._data.release()
+        self._shm.close()
+
+    def unlink(self) -> None:
+        """Remove o segmento (chamar apenas no processo que o criou)"""
+        self._shm.unlink()
+
+
+def _shared_ingestion_worker(ring_names: List[str], stop_event, batch_size: int, batch_timeout: float):
+    """Processo de ingestão: drena os anéis em round-robin e envia lotes"""
+    from .log_ingestion import LogIngestion
+
+    # Único cliente BigQuery do processo (a instância global é criada sob demanda)
+    ingestion = LogIngestion()
+    rings = [SharedLogRing(name, create=False) for name in ring_names]
+    insert_batch = ingestion._insert_batch
+    monotonic = time.monotonic
+
+    batch = []
+    first_item_time = None
+
+    try:
+        while True:
+            stopping = stop_event.is_set()
+            drained = 0
+            for ring in rings:
+                entries = ring.drain(batch_size - len(batch))
+                if entries:
+                    drained += len(entries)
+                    if first_item_time is None:
+                        first_item_time = monotonic()
+                    batch.extend(entries)
+                    if len(batch) >= batch_size:
+                        insert_batch(batch)
+                        batch = []
+                        first_item_time = None
+
+            if batch and (stopping or monotonic() - first_item_time >= batch_timeout):
+                insert_batch(batch)
+                batch = []
+                first_item_time = None
+
+            if stopping and not drained:
+                break
+            if not drained:
+                time.sleep(0.05)
+    finally:
+        for ring in rings:
+            ring.close()
+
+
+def create_log_rings(count: int, size: int = DEFAULT_RING_SIZE) -> List[SharedLogRing]:
+    """Cria um anel por processo produtor"""
+    return [SharedLogRing(size=size) for _ in range(count)]
+
+
+def start_shared_ingestion(rings: List[SharedLogRing], batch_size: int = 100, batch_timeout: float = 30):
+    """
+    Inicia o processo único de ingestão que atende todos os anéis
+
+    Returns:
+        Tupla (processo, evento de parada)
+    """
+    stop_event = Event()
+    process = Process(
+        target=_shared_ingestion_worker,
+        args=([ring.name for ring in rings], stop_event, batch_size, batch_timeout),
+        daemon=True
+    )
+    process.start()
+    return process, stop_event
+
+
+def stop_shared_ingestion(process, stop_event, rings: List[SharedLogRing], timeout: float = 10):
+    """Sinaliza parada, aguarda o flush final e remove os anéis"""
+    stop_event.set()
+    process.join(timeout=timeout)
+    for ring in rings:
+        ring.close()
+        ring.unlink()
@@ -6,9 +6,57 @@ Instrumentação automática de agentes e funções MCP
 import time
 import functools
 import inspect
+import operator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from types import MappingProxyType
 from typing import Dict, Any, Callable, Optional
 from .gcp_logger import get_logger
 
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Valores padrão dos campos extraídos do resultado de uma comparação de custos
+# (vazios imutáveis para poderem ser compartilhados entre chamadas)
+_DEFAULT_COMPARISON_RESULT = {
+    'providers': (),
+    'results_by_provider': MappingProxyType({}),
+    'recommendation': '',
+    'confidence': 0.0,
+    'savings_pct': 0.0,
+    'savings_amount': 0.0,
+    'reasoning': ''
+}
+_get_comparison_fields = operator.itemgetter(*_DEFAULT_COMPARISON_RESULT)
+
+# Sessão corrente: propagada por contexto (threads e tarefas asyncio) em vez
+# de ser repassada como kwarg por todas as funções instrumentadas
+SESSION_ID: ContextVar[Optional[str]] = ContextVar('session_id', default=None)
+
+
+@contextmanager
+def with_session_id(session_id: str):
+    """
+    Define o session_id usado pelos decoradores dentro do bloco
+    
+    Usage:
+        with with_session_id('session_123'):
+            analyze_aws_costs('t3.medium', 'us-east-1')
+    """
+    token = SESSION_ID.set(session_id)
+    try:
+        yield
+    finally:
+        SESSION_ID.reset(token)
+
+
+def _session_id(kwargs: Dict[str, Any]) -> Optional[str]:
+    """session_id explícito do chamador (kwarg) ou, na falta dele, o do contexto"""
+    return kwargs.get('session_id') or SESSION_ID.get()
+
 
 def log_agent_execution(agent_type: str, task_type: str, 
                        auto_session: bool = True):
@@ -32,8 +80,8 @@ def log_agent_execution(agent_type: str, task_type: str,
             logger = get_logger()
             agent_name = func.__name__
             
-            # Extrair session_id e user_id dos kwargs se disponível
-            session_id = kwargs.get('session_id') if auto_session else None
+            # Extrair session_id (kwargs ou contexto) e user_id se disponível
+            session_id = _session_id(kwargs) if auto_session else None
             user_id = kwargs.get('user_id') if auto_session else None
             
             # Usar context manager para log automático
@@ -43,7 +91,7 @@ def log_agent_execution(agent_type: str, task_type: str,
                 task_type=task_type,
                 session_id=session_id,
                 user_id=user_id,
-                **_extract_serializable_kwargs(kwargs)
+                **_execution_params(_extract_serializable_kwargs(kwargs))
             ) as ctx:
                 result = func(*args, **kwargs)
                 ctx.set_result(result)
@@ -74,9 +122,9 @@ def log_mcp_call(server_type: str, estimate_cost: bool = False):
             start_time = time.time()
             method_name = func.__name__
             
-            # Extrair IDs dos kwargs
+            # Extrair IDs
             agent_id = kwargs.get('agent_id')
-            session_id = kwargs.get('session_id')
+            session_id = _session_id(kwargs)
             
             try:
                 result = func(*args, **kwargs)
@@ -146,7 +194,7 @@ def log_agent_interaction(interaction_type: str = 'collaboration'):
             # Extrair informações do agente
             source_agent = getattr(self, 'agent_name', self.__class__.__name__)
             target_agent = kwargs.get('target_agent') or (args[0] if args else None)
-            session_id = kwargs.get('session_id')
+            session_id = _session_id(kwargs)
             
             try:
                 result = func(self, *args, **kwargs)
@@ -216,17 +264,14 @@ def log_cost_comparison_result(analysis_type: str):
             
             # Extrair dados do resultado
             if isinstance(result, dict):
-                providers = result.get('providers', [])
-                results_by_provider = result.get('results_by_provider', {})
-                recommendation = result.get('recommendation', '')
-                confidence = result.get('confidence', 0.0)
-                savings_pct = result.get('savings_pct', 0.0)
-                savings_amount = result.get('savings_amount', 0.0)
-                reasoning = result.get('reasoning', '')
+                (providers, results_by_provider, recommendation, confidence,
+                 savings_pct, savings_amount, reasoning) = _get_comparison_fields(
+                    {**_DEFAULT_COMPARISON_RESULT, **result}
+                )
                 
                 # Extrair requirements dos kwargs
                 input_requirements = kwargs.get('requirements', {})
-                session_id = kwargs.get('session_id')
+                session_id = _session_id(kwargs)
                 user_id = kwargs.get('user_id')
                 
                 logger.log_cost_comparison(
@@ -250,13 +295,15 @@ def log_cost_comparison_result(analysis_type: str):
     return decorator
 
 
-def log_performance_metrics(track_memory: bool = True, track_cpu: bool = True):
+def log_performance_metrics(track_memory: bool = True, track_cpu=True):
     """
     Decorador para tracking de métricas de performance
     
     Args:
         track_memory: Se deve trackear uso de memória
-        track_cpu: Se deve trackear uso de CPU
+        track_cpu: Se deve trackear uso de CPU. True usa deltas de
+            resource.getrusage (sem thread extra); 'precise' usa amostragem
+            do psutil em thread separada (necessário no Windows)
     
     Usage:
         @log_performance_metrics(track_memory=True, track_cpu=True)
@@ -264,61 +311,73 @@ def log_performance_metrics(track_memory: bool = True, track_cpu: bool = True):
             # Código pesado
             return result
     """
+    sample_cpu = track_cpu == 'precise' or (track_cpu and resource is None)
+    
     def decorator(func: Callable) -> Callable:
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
-            import psutil
-            import threading
+            process = None
+            if track_memory or sample_cpu:
+                import psutil
+                process = psutil.Process()
             
             # Métricas iniciais
-            process = psutil.Process()
             initial_memory = process.memory_info().rss / 1024 / 1024 if track_memory else None
             
-            # Tracking de CPU em thread separada
+            # Tracking de CPU em thread separada (somente modo 'precise')
             cpu_samples = []
-            stop_cpu_tracking = threading.Event()
-            
-            def track_cpu():
-                while not stop_cpu_tracking.is_set():
-                    cpu_samples.append(process.cpu_percent())
-                    time.sleep(0.1)
-            
+            stop_cpu_tracking = None
             cpu_thread = None
-            if track_cpu:
-                cpu_thread = threading.Thread(target=track_cpu)
+            if sample_cpu:
+                import threading
+                stop_cpu_tracking = threading.Event()
+                
+                def sample():
+                    while not stop_cpu_tracking.is_set():
+                        cpu_samples.append(process.cpu_percent())
+                        time.sleep(0.1)
+                
+                cpu_thread = threading.Thread(target=sample)
                 cpu_thread.start()
             
+            start_usage = resource.getrusage(resource.RUSAGE_SELF) if track_cpu and not sample_cpu else None
+            
             try:
-                start_time = time.time()
+                start_time = time.monotonic()
                 result = func(*args, **kwargs)
-                execution_time = time.time() - start_time
-                
-                # Parar tracking de CPU
+                execution_time = time.monotonic() - start_time
+            finally:
+                # Parar tracking de CPU mesmo em caso de erro
                 if cpu_thread:
                     stop_cpu_tracking.set()
                     cpu_thread.join()
-                
-                # Métricas finais
-                final_memory = process.memory_info().rss / 1024 / 1024 if track_memory else None
-                avg_cpu = sum(cpu_samples) / len(cpu_samples) if cpu_samples else None
-                
-                # Log das métricas
-                logger = get_logger()
-                logger.local_logger.info(
-                    f"Performance metrics for {func.__name__}: "
-                    f"execution_time={execution_time:.3f}s, "
-                    f"memory_delta={final_memory - initial_memory if initial_memory and final_memory else 'N/A'}MB, "
-                    f"avg_cpu={avg_cpu:.1f}%" if avg_cpu else "avg_cpu=N/A"
+            
+            # Métricas finais
+            final_memory = process.memory_info().rss / 1024 / 1024 if track_memory else None
+            
+            avg_cpu = None
+            if start_usage is not None and execution_time > 0:
+                end_usage = resource.getrusage(resource.RUSAGE_SELF)
+                cpu_time = (
+                    (end_usage.ru_utime + end_usage.ru_stime) -
+                    (start_usage.ru_utime + start_usage.ru_stime)
                 )
-                
-                return result
-                
-            except Exception as e:
-                # Parar tracking mesmo em caso de erro
-                if cpu_thread:
-                    stop_cpu_tracking.set()
-                    cpu_thread.join()
-                raise
+                avg_cpu = 100.0 * cpu_time / execution_time
+            elif cpu_samples:
+                avg_cpu = sum(cpu_samples) / len(cpu_samples)
+            
+            # Log das métricas
+            logger = get_logger()
+            memory_delta = final_memory - initial_memory if initial_memory and final_memory else 'N/A'
+            cpu_text = f"{avg_cpu:.1f}%" if avg_cpu is not None else "N/A"
+            logger.local_logger.info(
+                f"Performance metrics for {func.__name__}: "
+                f"execution_time={execution_time:.3f}s, "
+                f"memory_delta={memory_delta}MB, "
+                f"avg_cpu={cpu_text}"
+            )
+            
+            return result
                 
         return wrapper
     return decorator
@@ -343,6 +402,11 @@ def _extract_serializable_kwargs(kwargs: Dict[str, Any]) -> Dict[str, Any]:
     return serializable
 
 
+def _execution_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Remove session_id/user_id, já passados explicitamente ao contexto"""
+    return {key: value for key, value in params.items() if key not in ('session_id', 'user_id')}
+
+
 def _serialize_response(response: Any) -> Dict[str, Any]:
     """Serializa resposta para log"""
     if response is None:
@@ -396,6 +460,10 @@ def log_complete_agent(agent_type: str, task_type: str,
     """
     Decorador composto que combina logging de execução, MCP e performance
     
+    Execução, chamada MCP e métricas compartilham um único wrapper: uma
+    medição de tempo e um frame por chamada, em vez de três decoradores
+    empilhados.
+    
     Usage:
         @log_complete_agent('aws_specialist', 'cost_analysis', 'aws_pricing')
         def analyze_aws_costs(instance_type, region):
@@ -403,18 +471,87 @@ def log_complete_agent(agent_type: str, task_type: str,
             return result
     """
     def decorator(func: Callable) -> Callable:
-        # Aplicar decoradores em sequência
-        decorated_func = func
-        
-        if track_performance:
-            decorated_func = log_performance_metrics()(decorated_func)
-        
-        if server_type:
-            decorated_func = log_mcp_call(server_type, estimate_cost=True)(decorated_func)
+        method_name = func.__name__
+        api_cost = _estimate_api_cost(server_type, method_name, {}) if server_type else None
         
-        decorated_func = log_agent_execution(agent_type, task_type)(decorated_func)
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            logger = get_logger()
+            session_id = _session_id(kwargs)
+            input_params = _extract_serializable_kwargs(kwargs)
+            
+            process = None
+            if track_performance:
+                import psutil
+                process = psutil.Process()
+                initial_memory = process.memory_info().rss / 1024 / 1024
+                start_usage = resource.getrusage(resource.RUSAGE_SELF) if resource else None
+            
+            with logger.log_agent_execution_context(
+                agent_type=agent_type,
+                agent_name=method_name,
+                task_type=task_type,
+                session_id=session_id,
+                user_id=kwargs.get('user_id'),
+                **_execution_params(input_params)
+            ) as ctx:
+                start_ns = time.perf_counter_ns()
+                try:
+                    result = func(*args, **kwargs)
+                except Exception as e:
+                    if server_type:
+                        logger.log_mcp_server_call(
+                            server_type=server_type,
+                            method_name=method_name,
+                            input_params=input_params,
+                            response_data=None,
+                            response_time=(time.perf_counter_ns() - start_ns) // 1_000_000,
+                            status_code=500,
+                            error_msg=str(e),
+                            cache_hit=False,
+                            api_cost=0.0,
+                            agent_id=kwargs.get('agent_id'),
+                            session_id=session_id
+                        )
+                    raise
+                elapsed_ns = time.perf_counter_ns() - start_ns
+                
+                if server_type:
+                    logger.log_mcp_server_call(
+                        server_type=server_type,
+                        method_name=method_name,
+                        input_params=input_params,
+                        response_data=_serialize_response(result),
+                        response_time=elapsed_ns // 1_000_000,
+                        status_code=200,
+                        error_msg=None,
+                        cache_hit=_check_cache_hit(kwargs),
+                        api_cost=api_cost,
+                        agent_id=kwargs.get('agent_id'),
+                        session_id=session_id
+                    )
+                
+                if process is not None:
+                    execution_time = elapsed_ns / 1e9
+                    memory_delta = process.memory_info().rss / 1024 / 1024 - initial_memory
+                    cpu_text = "N/A"
+                    if start_usage is not None and execution_time > 0:
+                        end_usage = resource.getrusage(resource.RUSAGE_SELF)
+                        cpu_time = (
+                            (end_usage.ru_utime + end_usage.ru_stime) -
+                            (start_usage.ru_utime + start_usage.ru_stime)
+                        )
+                        cpu_text = f"{100.0 * cpu_time / execution_time:.1f}%"
+                    logger.local_logger.info(
+                        f"Performance metrics for {method_name}: "
+                        f"execution_time={execution_time:.3f}s, "
+                        f"memory_delta={memory_delta}MB, "
+                        f"avg_cpu={cpu_text}"
+                    )
+                
+                ctx.set_result(result)
+                return result
         
-        return decorated_func
+        return wrapper
     
     return decorator
-
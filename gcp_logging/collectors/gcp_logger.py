@@ -2,28 +2,116 @@
 Sistema completo de logging e analytics para agentes de IA
 """
 
-import json
 import time
-import uuid
+import random
+import msgpack
+import orjson
 import psutil
 import threading
+import zstandard
+import concurrent.futures
+from collections import deque
 from datetime import datetime, timezone
+from decimal import Decimal
 from typing import Dict, Any, Optional, List
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, fields
 from contextlib import contextmanager
 
 # GCP imports
 from google.cloud import logging as cloud_logging
+from google.cloud.logging.handlers import CloudLoggingHandler
 from google.cloud import pubsub_v1
 from google.cloud import bigquery
 from google.cloud.exceptions import GoogleCloudError
 
 # Local imports
 import logging
+import logging.handlers
 import os
 
+try:
+    from .storage_writer import AppendRowsNotCommitted, StorageWriteSink, schema_from_dataclass
+except ImportError:  # google-cloud-bigquery-storage não instalado
+    StorageWriteSink = None
+    AppendRowsNotCommitted = None
 
-@dataclass
+
+# Configuração via ambiente, lida uma vez na importação
+_PROJECT_ID = os.getenv('GCP_PROJECT_ID')
+_PAYLOAD_FORMAT = os.getenv('PUBSUB_PAYLOAD_FORMAT', 'msgpack')
+_PUBSUB_TOPIC_NAME = os.getenv('PUBSUB_TOPIC_NAME', 'agent-analysis-events')
+
+# Opções do orjson para payloads do Pub/Sub
+_ORJSON_OPTS = orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _json_default(obj: Any) -> Any:
+    """Converte tipos que o orjson não serializa nativamente"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    return str(obj)
+
+
+def _to_json_safe(obj: Any) -> Any:
+    """
+    Converte uma estrutura para tipos JSON nativos em uma única passada
+    
+    Usado antes dos clientes que serializam com json/protobuf (Cloud Logging,
+    insert_rows_json): um valor não serializável derrubaria o lote inteiro.
+    """
+    return orjson.loads(orjson.dumps(obj, default=_json_default, option=_ORJSON_OPTS))
+
+
+def _msgpack_default(obj: Any) -> Any:
+    """Converte tipos que o msgpack não serializa nativamente"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, datetime):
+        # datetime=True só aceita datetimes com timezone
+        return obj.isoformat()
+    return str(obj)
+
+
+# Formatos de payload do Pub/Sub: content type -> serializador
+_PAYLOAD_ENCODERS = {
+    'msgpack': lambda data: msgpack.packb(
+        data, use_bin_type=True, datetime=True, default=_msgpack_default
+    ),
+    'json': lambda data: orjson.dumps(data, default=_json_default, option=_ORJSON_OPTS)
+}
+
+# Payloads acima deste tamanho (bytes) são comprimidos com zstd
+_COMPRESSION_THRESHOLD = 1024
+
+# ZstdCompressor não pode ser usado por duas threads ao mesmo tempo:
+# cada thread mantém o seu
+_zstd_local = threading.local()
+
+
+def _zstd_compress(payload: bytes) -> bytes:
+    """Comprime com zstd nível 1 usando o compressor da thread atual"""
+    compressor = getattr(_zstd_local, 'compressor', None)
+    if compressor is None:
+        compressor = _zstd_local.compressor = zstandard.ZstdCompressor(level=1)
+    return compressor.compress(payload)
+
+
+def decode_pubsub_payload(data: bytes, attributes: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Decodifica uma mensagem publicada pelo CloudCostLogger (lado assinante)
+    
+    Args:
+        data: Payload da mensagem
+        attributes: Atributos da mensagem (encoding, ct)
+    """
+    if attributes.get('encoding') == 'zstd':
+        data = zstandard.ZstdDecompressor().decompress(data)
+    if attributes.get('ct', 'json') == 'msgpack':
+        return msgpack.unpackb(data, raw=False, timestamp=3)
+    return orjson.loads(data)
+
+
+@dataclass(slots=True)
 class AgentExecution:
     """Estrutura para log de execução de agente"""
     execution_id: str
@@ -42,7 +130,7 @@ class AgentExecution:
     request_id: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class CostComparison:
     """Estrutura para log de comparação de custos"""
     comparison_id: str
@@ -64,7 +152,7 @@ class CostComparison:
     user_id: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class AgentInteraction:
     """Estrutura para log de interação entre agentes"""
     interaction_id: str
@@ -79,7 +167,7 @@ class AgentInteraction:
     correlation_id: Optional[str] = None
 
 
-@dataclass
+@dataclass(slots=True)
 class MCPServerCall:
     """Estrutura para log de chamadas MCP"""
     call_id: str
@@ -97,23 +185,130 @@ class MCPServerCall:
     session_id: Optional[str] = None
 
 
+def _compile_row_builder(cls):
+    """
+    Gera, uma única vez, a função que converte uma instância em linha
+    
+    Equivale a um dataclasses.asdict raso com os campos fixos no código
+    gerado: dicts e listas aninhados são passados por referência, pois
+    pertencem ao chamador e são serializados logo em seguida.
+    """
+    items = ', '.join(f'{f.name!r}: o.{f.name}' for f in fields(cls))
+    namespace = {}
+    exec(f'def _row(o):\n    return {{{items}}}\n', namespace)
+    return namespace['_row']
+
+
+for _cls in (AgentExecution, CostComparison, AgentInteraction, MCPServerCall):
+    _cls._row = staticmethod(_compile_row_builder(_cls))
+
+
+# Tabelas do dataset de analytics
+_LOG_TABLES = (
+    'agent_executions',
+    'cost_comparisons',
+    'agent_interactions',
+    'mcp_server_calls',
+    'user_feedback',
+)
+
+# Esquema da tabela user_feedback (registrada a partir de um dict, sem dataclass)
+_USER_FEEDBACK_SCHEMA = (
+    ('feedback_id', 'string'),
+    ('timestamp', 'timestamp'),
+    ('session_id', 'string'),
+    ('comparison_id', 'string'),
+    ('recommendation_followed', 'bool'),
+    ('actual_savings_usd', 'double'),
+    ('satisfaction_score', 'int64'),
+    ('feedback_text', 'string'),
+    ('improvement_suggestions', 'string'),
+    ('user_id', 'string'),
+)
+
+
+def _storage_write_schemas() -> Dict[str, tuple]:
+    """Esquemas das tabelas escritas via Storage Write API"""
+    return {
+        'agent_executions': schema_from_dataclass(AgentExecution),
+        'cost_comparisons': schema_from_dataclass(CostComparison),
+        'agent_interactions': schema_from_dataclass(AgentInteraction),
+        'mcp_server_calls': schema_from_dataclass(MCPServerCall),
+        'user_feedback': _USER_FEEDBACK_SCHEMA,
+    }
+
+
+class BufferedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    RotatingFileHandler com escrita bufferizada
+    
+    O arquivo é aberto com buffer grande e só é descarregado em registros
+    WARNING ou mais graves (e no close), em vez de um write por registro.
+    O tamanho para rotação é contado localmente porque o seek/tell do
+    RotatingFileHandler forçaria o flush do buffer a cada registro.
+    """
+    
+    def __init__(self, filename: str, maxBytes: int = 0, backupCount: int = 0,
+                 encoding: str = None, buffer_size: int = 65536,
+                 flush_level: int = logging.WARNING):
+        self.buffer_size = buffer_size
+        self.flush_level = flush_level
+        self._bytes_written = 0
+        super().__init__(filename, maxBytes=maxBytes, backupCount=backupCount, encoding=encoding)
+    
+    def _open(self):
+        stream = open(self.baseFilename, self.mode, buffering=self.buffer_size,
+                      encoding=self.encoding, errors=self.errors)
+        self._bytes_written = os.path.getsize(self.baseFilename)
+        return stream
+    
+    def emit(self, record: logging.LogRecord):
+        try:
+            msg = self.format(record) + self.terminator
+            if self.stream is None:
+                self.stream = self._open()
+            if self.maxBytes > 0 and self._bytes_written + len(msg) >= self.maxBytes:
+                self.doRollover()
+            
+            self.stream.write(msg)
+            self._bytes_written += len(msg)
+            
+            if record.levelno >= self.flush_level:
+                self.stream.flush()
+        except Exception:
+            self.handleError(record)
+
+
 class CloudCostLogger:
     """
     Sistema completo de logging para Cloud Cost Agent
     Integra com Cloud Logging, Pub/Sub e BigQuery
     """
     
-    def __init__(self, project_id: str = None, dataset_id: str = "agent_analytics"):
+    def __init__(self, project_id: str = None, dataset_id: str = "agent_analytics",
+                 batch_size: int = 256, flush_interval: float = 1.0,
+                 clock=time.perf_counter_ns):
         """
         Inicializa o logger com configurações GCP
         
         Args:
             project_id: ID do projeto GCP
             dataset_id: ID do dataset BigQuery
+            batch_size: Registros por tabela que disparam um flush imediato
+            flush_interval: Intervalo máximo (segundos) entre flushes
+            clock: Função que retorna nanossegundos, usada para medir a duração
+                das execuções (pode ser um relógio virtual em testes)
         """
-        self.project_id = project_id or os.getenv('GCP_PROJECT_ID')
+        self.project_id = project_id or _PROJECT_ID
+        self._clock = clock
         self.dataset_id = dataset_id
         
+        # Formato do payload no Pub/Sub (msgpack ou json)
+        self._payload_format = _PAYLOAD_FORMAT
+        if self._payload_format not in _PAYLOAD_ENCODERS:
+            raise ValueError(f"PUBSUB_PAYLOAD_FORMAT inválido: {self._payload_format}")
+        self._encode_payload = _PAYLOAD_ENCODERS[self._payload_format]
+        
         if not self.project_id:
             raise ValueError("GCP_PROJECT_ID deve ser definido")
         
@@ -123,35 +318,102 @@ class CloudCostLogger:
         # Configurar logging local
         self._setup_local_logging()
         
-        # Buffer para batch processing
-        self._log_buffer = []
-        self._buffer_lock = threading.Lock()
-        self._buffer_size = 100
+        # Fração das mensagens de cada tipo publicada no Pub/Sub
+        self._pubsub_sample_rate = {
+            'mcp_call': 0.1,
+            'agent_interaction': 0.2,
+            'agent_execution': 1.0,
+            'cost_comparison': 1.0,
+            'user_feedback': 1.0
+        }
+        
+        # Estado por thread (gerador de IDs e amostragem)
+        self._tls = threading.local()
+        
+        # Cache do prefixo ISO do segundo corrente: (segundo, prefixo)
+        self._ts_cache = (0, '')
+        
+        # Buffers para batch processing, um por tabela: deque.append é atômico
+        # no GIL, então os produtores não disputam lock; só o flusher consome.
+        # Capacidade limitada: se o BigQuery ficar lento, os registros mais
+        # antigos são descartados em vez de a memória crescer sem limite
+        self._buffer_size = batch_size
+        self._table_buffers: Dict[str, deque] = {
+            table_name: deque(maxlen=self._buffer_size * 4) for table_name in _LOG_TABLES
+        }
+        self._cloud_log_buffer = deque()
+        self._flush_interval = flush_interval  # segundos
+        self._flush_lock = threading.Lock()
+        # Inserções das tabelas em paralelo (clientes BigQuery são thread-safe)
+        self._flush_pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=4, thread_name_prefix='bq-flush'
+        )
+        self._flush_event = threading.Event()
+        self._closed = False
         
         # Métricas internas
         self._metrics = {
             'logs_sent': 0,
             'errors': 0,
+            'dropped': 0,
+            'pubsub_sampled_out': 0,
             'last_flush': time.time()
         }
+        
+        # Métricas do processo: handle único, amostrado a cada segundo pela
+        # thread de flush; os logs só leem os últimos valores
+        self._proc = psutil.Process()
+        self._proc.cpu_percent(interval=None)
+        self._metrics_interval = 1.0  # segundos
+        self._last_rss_mb = None
+        self._last_cpu = None
+        self._sample_system_metrics()
+        
+        self._flush_thread = threading.Thread(
+            target=self._flush_worker, name='cloud-cost-logger-flush', daemon=True
+        )
+        self._flush_thread.start()
     
     def _setup_gcp_clients(self):
         """Configura clientes GCP"""
         try:
             # Cloud Logging
+            # Sem setup_logging(): ele instala um handler no root logger que
+            # reenvia todo log da stdlib, duplicando os registros estruturados
             self.cloud_logging_client = cloud_logging.Client(project=self.project_id)
-            self.cloud_logging_client.setup_logging()
+            self._cl_loggers: Dict[str, Any] = {}
             
-            # Pub/Sub
-            self.publisher = pubsub_v1.PublisherClient()
+            # Pub/Sub: o batcher da biblioteca agrupa as mensagens e confirma
+            # de forma assíncrona, amortizando o custo por RPC
+            self.publisher = pubsub_v1.PublisherClient(
+                batch_settings=pubsub_v1.types.BatchSettings(
+                    max_messages=1000,
+                    max_bytes=1_000_000,
+                    max_latency=0.05
+                ),
+                publisher_options=pubsub_v1.types.PublisherOptions(
+                    enable_message_ordering=False
+                )
+            )
             self.topic_path = self.publisher.topic_path(
                 self.project_id, 
-                os.getenv('PUBSUB_TOPIC_NAME', 'agent-analysis-events')
+                _PUBSUB_TOPIC_NAME
             )
             
             # BigQuery
             self.bigquery_client = bigquery.Client(project=self.project_id)
             
+            # Storage Write API (fallback para insert_rows_json se indisponível)
+            self.storage_writer = None
+            if StorageWriteSink is not None:
+                try:
+                    self.storage_writer = StorageWriteSink(
+                        self.project_id, self.dataset_id,
+                        _storage_write_schemas(), json_default=_json_default
+                    )
+                except Exception as e:
+                    logging.warning(f"Storage Write API indisponível, usando insert_rows_json: {e}")
+            
             # Verificar se dataset existe
             try:
                 self.bigquery_client.get_dataset(f"{self.project_id}.{self.dataset_id}")
@@ -164,51 +426,105 @@ class CloudCostLogger:
     
     def _setup_local_logging(self):
         """Configura logging local para fallback"""
-        logging.basicConfig(
-            level=logging.INFO,
-            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler('cloud_cost_agent.log'),
-                logging.StreamHandler()
-            ]
-        )
         self.local_logger = logging.getLogger('CloudCostAgent')
+        
+        # Handlers ficam só neste logger (não no root) para não capturar
+        # os logs de todas as bibliotecas; configurados uma vez por processo
+        if self.local_logger.handlers:
+            return
+        
+        self.local_logger.setLevel(logging.INFO)
+        self.local_logger.propagate = False
+        
+        formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        handlers = [
+            BufferedRotatingFileHandler(
+                'cloud_cost_agent.log', maxBytes=50 * 1024 * 1024, backupCount=5
+            ),
+            logging.StreamHandler(),
+            # Apenas os logs do próprio agente vão para o Cloud Logging
+            CloudLoggingHandler(self.cloud_logging_client, name='cloud-cost-agent')
+        ]
+        for handler in handlers:
+            handler.setFormatter(formatter)
+            self.local_logger.addHandler(handler)
     
-    def _get_system_metrics(self) -> Dict[str, float]:
-        """Obtém métricas do sistema"""
+    def _sample_system_metrics(self):
+        """Atualiza a amostra de memória e CPU do processo"""
         try:
-            process = psutil.Process()
-            return {
-                'memory_usage_mb': process.memory_info().rss / 1024 / 1024,
-                'cpu_usage_percent': process.cpu_percent()
-            }
+            self._last_rss_mb = self._proc.memory_info().rss / 1024 / 1024
+            self._last_cpu = self._proc.cpu_percent(interval=None)
         except Exception:
-            return {'memory_usage_mb': None, 'cpu_usage_percent': None}
+            self._last_rss_mb = None
+            self._last_cpu = None
+    
+    def _get_system_metrics(self) -> Dict[str, float]:
+        """Obtém métricas do sistema (última amostra, sem syscalls)"""
+        return {
+            'memory_usage_mb': self._last_rss_mb,
+            'cpu_usage_percent': self._last_cpu
+        }
+    
+    def _thread_rng(self) -> random.Random:
+        """Gerador aleatório da thread atual (sem o lock do random global)"""
+        tls = self._tls
+        rng = getattr(tls, 'rng', None)
+        if rng is None or tls.pid != os.getpid():
+            rng = tls.rng = random.Random(os.urandom(16))
+            tls.pid = os.getpid()
+        return rng
     
     def _generate_id(self) -> str:
-        """Gera ID único"""
-        return str(uuid.uuid4())
+        """
+        Gera ID único de 128 bits (hex)
+        
+        Usa um random.Random por thread semeado com os.urandom, evitando a
+        syscall do uuid4 a cada ID. A semente é refeita após fork para que
+        processos filhos não repitam a sequência do pai.
+        """
+        rng = self._thread_rng()
+        return f'{rng.getrandbits(64):016x}{rng.getrandbits(64):016x}'
     
     def _get_timestamp(self) -> str:
-        """Obtém timestamp ISO"""
-        return datetime.now(timezone.utc).isoformat()
+        """
+        Obtém timestamp ISO (UTC, microssegundos)
+        
+        O prefixo até os segundos é formatado uma vez por segundo; a cada
+        chamada só a fração é anexada.
+        """
+        now = time.time()
+        sec = int(now)
+        cached_sec, prefix = self._ts_cache
+        if sec != cached_sec:
+            prefix = datetime.fromtimestamp(sec, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S')
+            self._ts_cache = (sec, prefix)
+        return f'{prefix}.{int((now - sec) * 1_000_000):06d}+00:00'
     
     def _send_to_pubsub(self, data: Dict[str, Any], message_type: str):
-        """Envia dados para Pub/Sub"""
+        """
+        Envia dados para Pub/Sub
+        
+        Tipo, timestamp, content type (ct) e encoding vão nos atributos para
+        que os assinantes saibam como decodificar o payload
+        (ver decode_pubsub_payload).
+        """
         try:
-            message_data = {
-                'type': message_type,
-                'data': data,
-                'timestamp': self._get_timestamp()
-            }
+            message_bytes = self._encode_payload(data)
             
-            message_json = json.dumps(message_data, default=str)
-            message_bytes = message_json.encode('utf-8')
+            encoding = 'identity'
+            if len(message_bytes) > _COMPRESSION_THRESHOLD:
+                message_bytes = _zstd_compress(message_bytes)
+                encoding = 'zstd'
             
             future = self.publisher.publish(
                 self.topic_path, 
                 message_bytes,
-                message_type=message_type
+                message_type=message_type,
+                # Os registros já trazem o timestamp; reutilizá-lo evita
+                # formatar outro por mensagem
+                timestamp=data.get('timestamp') or self._get_timestamp(),
+                ct=self._payload_format,
+                encoding=encoding
             )
             
             # Não bloquear - fire and forget
@@ -219,56 +535,153 @@ class CloudCostLogger:
             return None
     
     def _log_to_cloud_logging(self, data: Dict[str, Any], log_name: str, severity: str = 'INFO'):
-        """Envia log para Cloud Logging"""
+        """Enfileira log para Cloud Logging (enviado em lote pela thread de flush)"""
+        self._cloud_log_buffer.append((log_name, data, severity))
+    
+    def _cl_logger(self, log_name: str):
+        """Obtém o logger do Cloud Logging para log_name (criado uma vez por nome)"""
+        logger = self._cl_loggers.get(log_name)
+        if logger is None:
+            logger = self._cl_loggers[log_name] = self.cloud_logging_client.logger(log_name)
+        return logger
+    
+    def _flush_cloud_logging(self):
+        """Envia os logs enfileirados ao Cloud Logging, um batch por log_name"""
+        entries_by_name = {}
+        popleft = self._cloud_log_buffer.popleft
         try:
-            logger = self.cloud_logging_client.logger(log_name)
-            logger.log_struct(data, severity=severity)
-            
-        except Exception as e:
-            self.local_logger.error(f"Erro ao enviar para Cloud Logging: {e}")
+            while True:
+                log_name, data, severity = popleft()
+                entries_by_name.setdefault(log_name, []).append((data, severity))
+        except IndexError:
+            pass
+        
+        for log_name, entries in entries_by_name.items():
+            try:
+                batch = self._cl_logger(log_name).batch()
+                payloads = _to_json_safe([data for data, _ in entries])
+                for data, (_, severity) in zip(payloads, entries):
+                    batch.log_struct(data, severity=severity)
+                batch.commit()
+                
+            except Exception as e:
+                self.local_logger.error(f"Erro ao enviar para Cloud Logging: {e}")
+    
+    def _emit(self, data: Dict[str, Any], table_name: str, log_name: str, message_type: str):
+        """Distribui um registro para Cloud Logging, Pub/Sub e buffer do BigQuery"""
+        self._log_to_cloud_logging(data, log_name)
+        
+        # Pub/Sub é amostrado para tipos de alto volume; BigQuery recebe tudo
+        sample_rate = self._pubsub_sample_rate.get(message_type, 1.0)
+        if sample_rate >= 1.0 or self._thread_rng().random() < sample_rate:
+            self._send_to_pubsub(data, message_type)
+        else:
+            self._metrics['pubsub_sampled_out'] += 1
+        
+        self._add_to_buffer(data, table_name)
+    
+    def _add_to_buffer(self, data: Dict[str, Any], table_name: str = 'agent_executions'):
+        """Adiciona dados ao buffer da tabela para batch processing"""
+        buffer = self._table_buffers.get(table_name)
+        if buffer is None:
+            buffer = self._table_buffers.setdefault(
+                table_name, deque(maxlen=self._buffer_size * 4)
+            )
+        if len(buffer) == buffer.maxlen:
+            # O append vai descartar o registro mais antigo
+            self._metrics['dropped'] += 1
+        buffer.append(data)
+        
+        if len(buffer) >= self._buffer_size:
+            self._flush_event.set()
     
-    def _add_to_buffer(self, data: Dict[str, Any]):
-        """Adiciona dados ao buffer para batch processing"""
-        with self._buffer_lock:
-            self._log_buffer.append(data)
+    def _flush_worker(self):
+        """Thread de flush: acorda por tamanho do buffer ou por intervalo"""
+        last_sample = time.monotonic()
+        while not self._closed:
+            self._flush_event.wait(self._flush_interval)
+            self._flush_event.clear()
+            self._flush_cloud_logging()
+            self._flush_buffer()
             
-            if len(self._log_buffer) >= self._buffer_size:
-                self._flush_buffer()
+            now = time.monotonic()
+            if now - last_sample >= self._metrics_interval:
+                self._sample_system_metrics()
+                last_sample = now
+    
+    @staticmethod
+    def _drain(buffer: deque) -> List[Dict[str, Any]]:
+        """Retira todos os itens disponíveis de um buffer"""
+        rows = []
+        popleft = buffer.popleft
+        try:
+            while True:
+                rows.append(popleft())
+        except IndexError:
+            pass
+        return rows
+    
+    def _insert_table(self, table_name: str, rows: List[Dict[str, Any]]) -> int:
+        """
+        Insere as linhas de uma tabela (Storage Write API ou insert_rows_json)
+        
+        O insert_rows_json só é usado como alternativa quando o AppendRows
+        garantidamente não gravou nada; um timeout ou erro após o envio no
+        stream _default pode já ter sido confirmado, e reenviar duplicaria o lote.
+        
+        Returns:
+            Quantidade de linhas inseridas
+        """
+        if self.storage_writer and self.storage_writer.supports(table_name):
+            try:
+                self.storage_writer.append_rows(table_name, rows)
+                return len(rows)
+            except AppendRowsNotCommitted as e:
+                self.local_logger.warning(
+                    f"Falha no AppendRows em {table_name}, usando insert_rows_json: {e}"
+                )
+            except Exception as e:
+                self.local_logger.error(
+                    f"AppendRows em {table_name} sem confirmação, lote de {len(rows)} linhas "
+                    f"não reenviado: {e}"
+                )
+                self._metrics['errors'] += 1
+                return 0
+        
+        table_ref = self.bigquery_client.dataset(self.dataset_id).table(table_name)
+        
+        try:
+            errors = self.bigquery_client.insert_rows_json(table_ref, _to_json_safe(rows))
+            if errors:
+                self.local_logger.error(f"Erros ao inserir em {table_name}: {errors}")
+                return 0
+            return len(rows)
+                
+        except Exception as e:
+            self.local_logger.error(f"Erro ao inserir em {table_name}: {e}")
+            return 0
     
     def _flush_buffer(self):
-        """Flush do buffer para BigQuery"""
-        if not self._log_buffer:
+        """Flush dos buffers para BigQuery (já particionados por tabela)"""
+        # O lock cobre só a retirada dos buffers; a I/O de rede acontece
+        # depois, sem bloquear outro flush (ex.: flush() do usuário)
+        with self._flush_lock:
+            pending = []
+            for table_name, buffer in list(self._table_buffers.items()):
+                rows = self._drain(buffer)
+                if rows:
+                    pending.append((table_name, rows))
+        
+        if not pending:
             return
         
         try:
-            # Agrupar por tipo de tabela
-            tables_data = {}
-            
-            for item in self._log_buffer:
-                table_name = item.get('_table_name', 'agent_executions')
-                if table_name not in tables_data:
-                    tables_data[table_name] = []
-                
-                # Remover metadados internos
-                clean_item = {k: v for k, v in item.items() if not k.startswith('_')}
-                tables_data[table_name].append(clean_item)
-            
-            # Inserir em cada tabela
-            for table_name, rows in tables_data.items():
-                table_ref = self.bigquery_client.dataset(self.dataset_id).table(table_name)
-                
-                try:
-                    errors = self.bigquery_client.insert_rows_json(table_ref, rows)
-                    if errors:
-                        self.local_logger.error(f"Erros ao inserir em {table_name}: {errors}")
-                    else:
-                        self._metrics['logs_sent'] += len(rows)
-                        
-                except Exception as e:
-                    self.local_logger.error(f"Erro ao inserir em {table_name}: {e}")
-            
-            # Limpar buffer
-            self._log_buffer.clear()
+            futures = [
+                self._flush_pool.submit(self._insert_table, table_name, rows)
+                for table_name, rows in pending
+            ]
+            concurrent.futures.wait(futures)
+            self._metrics['logs_sent'] += sum(f.result() for f in futures)
             self._metrics['last_flush'] = time.time()
             
         except Exception as e:
@@ -282,6 +695,9 @@ class CloudCostLogger:
         """
         Context manager para log automático de execução de agente
         
+        A duração é medida com o relógio do logger (ver parâmetro clock do
+        construtor); kwargs são registrados como parâmetros de entrada.
+        
         Usage:
             with logger.log_agent_execution_context('aws_specialist', 'analyze_costs', 'cost_analysis') as ctx:
                 # Código do agente
@@ -289,7 +705,8 @@ class CloudCostLogger:
                 ctx.set_result(result)
         """
         execution_id = self._generate_id()
-        start_time = time.time()
+        clock = self._clock
+        start_ns = clock()
         
         class ExecutionContext:
             def __init__(self, logger_instance):
@@ -309,7 +726,7 @@ class CloudCostLogger:
             yield context
             
             # Log de sucesso
-            duration_ms = int((time.time() - start_time) * 1000)
+            duration_ms = (clock() - start_ns) // 1_000_000
             system_metrics = self._get_system_metrics()
             
             execution = AgentExecution(
@@ -332,7 +749,7 @@ class CloudCostLogger:
             
         except Exception as e:
             # Log de erro
-            duration_ms = int((time.time() - start_time) * 1000)
+            duration_ms = (clock() - start_ns) // 1_000_000
             system_metrics = self._get_system_metrics()
             
             execution = AgentExecution(
@@ -357,17 +774,8 @@ class CloudCostLogger:
     
     def _log_execution(self, execution: AgentExecution):
         """Log interno de execução"""
-        data = asdict(execution)
-        data['_table_name'] = 'agent_executions'
-        
-        # Cloud Logging
-        self._log_to_cloud_logging(data, 'agent-executions')
-        
-        # Pub/Sub
-        self._send_to_pubsub(data, 'agent_execution')
-        
-        # Buffer para BigQuery
-        self._add_to_buffer(data)
+        data = AgentExecution._row(execution)
+        self._emit(data, 'agent_executions', 'agent-executions', 'agent_execution')
     
     def log_cost_comparison(self, analysis_type: str, providers: List[str],
                           input_requirements: Dict[str, Any],
@@ -402,17 +810,8 @@ class CloudCostLogger:
             user_id=user_id
         )
         
-        data = asdict(comparison)
-        data['_table_name'] = 'cost_comparisons'
-        
-        # Cloud Logging
-        self._log_to_cloud_logging(data, 'cost-comparisons')
-        
-        # Pub/Sub
-        self._send_to_pubsub(data, 'cost_comparison')
-        
-        # Buffer para BigQuery
-        self._add_to_buffer(data)
+        data = CostComparison._row(comparison)
+        self._emit(data, 'cost_comparisons', 'cost-comparisons', 'cost_comparison')
         
         return comparison.comparison_id
     
@@ -439,17 +838,8 @@ class CloudCostLogger:
             correlation_id=self._generate_id()
         )
         
-        data = asdict(interaction)
-        data['_table_name'] = 'agent_interactions'
-        
-        # Cloud Logging
-        self._log_to_cloud_logging(data, 'agent-interactions')
-        
-        # Pub/Sub
-        self._send_to_pubsub(data, 'agent_interaction')
-        
-        # Buffer para BigQuery
-        self._add_to_buffer(data)
+        data = AgentInteraction._row(interaction)
+        self._emit(data, 'agent_interactions', 'agent-interactions', 'agent_interaction')
         
         return interaction.interaction_id
     
@@ -482,17 +872,8 @@ class CloudCostLogger:
             session_id=session_id
         )
         
-        data = asdict(call)
-        data['_table_name'] = 'mcp_server_calls'
-        
-        # Cloud Logging
-        self._log_to_cloud_logging(data, 'mcp-server-calls')
-        
-        # Pub/Sub
-        self._send_to_pubsub(data, 'mcp_call')
-        
-        # Buffer para BigQuery
-        self._add_to_buffer(data)
+        data = MCPServerCall._row(call)
+        self._emit(data, 'mcp_server_calls', 'mcp-server-calls', 'mcp_call')
         
         return call.call_id
     
@@ -519,18 +900,10 @@ class CloudCostLogger:
             'satisfaction_score': satisfaction_score,
             'feedback_text': feedback_text,
             'improvement_suggestions': improvement_suggestions,
-            'user_id': user_id,
-            '_table_name': 'user_feedback'
+            'user_id': user_id
         }
         
-        # Cloud Logging
-        self._log_to_cloud_logging(feedback_data, 'user-feedback')
-        
-        # Pub/Sub
-        self._send_to_pubsub(feedback_data, 'user_feedback')
-        
-        # Buffer para BigQuery
-        self._add_to_buffer(feedback_data)
+        self._emit(feedback_data, 'user_feedback', 'user-feedback', 'user_feedback')
         
         return feedback_data['feedback_id']
     
@@ -538,22 +911,30 @@ class CloudCostLogger:
         """Obtém métricas internas do logger"""
         return {
             **self._metrics,
-            'buffer_size': len(self._log_buffer),
+            'buffer_size': sum(len(buffer) for buffer in self._table_buffers.values()),
             'time_since_last_flush': time.time() - self._metrics['last_flush']
         }
     
     def flush(self):
         """Força flush do buffer"""
-        with self._buffer_lock:
-            self._flush_buffer()
+        self._flush_cloud_logging()
+        self._flush_buffer()
     
     def close(self):
-        """Fecha o logger e faz flush final"""
+        """Fecha o logger e faz flush final; chamadas repetidas não fazem nada"""
+        if self._closed:
+            return
+        self._closed = True
+        self._flush_event.set()
+        self._flush_thread.join(timeout=5)
         self.flush()
+        self._flush_pool.shutdown(wait=True)
         
-        # Fechar clientes
+        # Fechar clientes (stop envia os lotes pendentes do Pub/Sub)
         if hasattr(self, 'publisher'):
-            self.publisher.close()
+            self.publisher.stop()
+        if getattr(self, 'storage_writer', None):
+            self.storage_writer.close()
 
 
 # Instância global do logger
@@ -568,9 +949,9 @@ def get_logger() -> CloudCostLogger:
     
     return _global_logger
 
-def initialize_logger(project_id: str = None, dataset_id: str = "agent_analytics"):
-    """Inicializa logger global"""
+def initialize_logger(project_id: str = None, dataset_id: str = "agent_analytics", **kwargs):
+    """Inicializa logger global (kwargs: batch_size, flush_interval)"""
     global _global_logger
-    _global_logger = CloudCostLogger(project_id, dataset_id)
+    _global_logger = CloudCostLogger(project_id, dataset_id, **kwargs)
     return _global_logger
 
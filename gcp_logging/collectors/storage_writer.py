@@ -0,0 +1,230 @@
+"""
+Escrita no BigQuery via Storage Write API (AppendRows no stream _default)
+Gera as mensagens protobuf das tabelas a partir dos campos dos dataclasses
+"""
+
+import threading
+import typing
+from dataclasses import fields
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+import orjson
+from google.cloud import bigquery_storage_v1
+from google.cloud.bigquery_storage_v1 import types, writer
+from google.protobuf import descriptor_pb2, descriptor_pool, message_factory
+
+
+_PROTO_PACKAGE = 'cloud_cost_agent'
+
+# Tipo lógico do campo -> tipo protobuf
+_PROTO_TYPES = {
+    'string': descriptor_pb2.FieldDescriptorProto.TYPE_STRING,
+    'json': descriptor_pb2.FieldDescriptorProto.TYPE_STRING,
+    'timestamp': descriptor_pb2.FieldDescriptorProto.TYPE_INT64,
+    'int64': descriptor_pb2.FieldDescriptorProto.TYPE_INT64,
+    'double': descriptor_pb2.FieldDescriptorProto.TYPE_DOUBLE,
+    'bool': descriptor_pb2.FieldDescriptorProto.TYPE_BOOL,
+    'repeated_string': descriptor_pb2.FieldDescriptorProto.TYPE_STRING,
+}
+
+_PYTHON_KINDS = {str: 'string', int: 'int64', float: 'double', bool: 'bool'}
+
+TableSchema = Tuple[Tuple[str, str], ...]
+
+
+class AppendRowsNotCommitted(Exception):
+    """
+    Falha em que nenhuma linha do lote foi gravada
+
+    Erros antes do envio (abertura do stream, serialização) ou lote recusado
+    com row_errors (o AppendRows é atômico). Só nesses casos é seguro
+    reenviar por outro caminho; qualquer outra falha após o envio pode já
+    ter sido confirmada no stream _default.
+    """
+
+
+def schema_from_dataclass(cls) -> TableSchema:
+    """
+    Deriva (nome, tipo lógico) de cada campo de um dataclass de log
+
+    Dicts viram colunas JSON, List[str] vira REPEATED STRING e o campo
+    'timestamp' é enviado como TIMESTAMP (microssegundos desde a época).
+    """
+    schema = []
+    for field in fields(cls):
+        field_type = field.type
+        if typing.get_origin(field_type) is typing.Union:
+            field_type = next(arg for arg in typing.get_args(field_type) if arg is not type(None))
+
+        origin = typing.get_origin(field_type) or field_type
+        if field.name == 'timestamp':
+            kind = 'timestamp'
+        elif origin is dict:
+            kind = 'json'
+        elif origin is list:
+            kind = 'repeated_string'
+        else:
+            kind = _PYTHON_KINDS[origin]
+        schema.append((field.name, kind))
+    return tuple(schema)
+
+
+def _build_message_class(table_name: str, schema: TableSchema):
+    """Cria a classe protobuf e o DescriptorProto de uma tabela"""
+    message_name = ''.join(part.title() for part in table_name.split('_'))
+    file_proto = descriptor_pb2.FileDescriptorProto(
+        name=f'{table_name}.proto', package=_PROTO_PACKAGE, syntax='proto2'
+    )
+    message_proto = file_proto.message_type.add(name=message_name)
+    for number, (name, kind) in enumerate(schema, start=1):
+        message_proto.field.add(
+            name=name,
+            number=number,
+            type=_PROTO_TYPES[kind],
+            label=(
+                descriptor_pb2.FieldDescriptorProto.LABEL_REPEATED
+                if kind == 'repeated_string'
+                else descriptor_pb2.FieldDescriptorProto.LABEL_OPTIONAL
+            )
+        )
+
+    pool = descriptor_pool.DescriptorPool()
+    pool.Add(file_proto)
+    descriptor = pool.FindMessageTypeByName(f'{_PROTO_PACKAGE}.{message_name}')
+
+    proto_descriptor = descriptor_pb2.DescriptorProto()
+    descriptor.CopyToProto(proto_descriptor)
+    return message_factory.GetMessageClass(descriptor), proto_descriptor
+
+
+def _timestamp_micros(value: Any) -> int:
+    """Converte timestamp ISO (ou datetime) para microssegundos desde a época"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return int(value.timestamp() * 1_000_000)
+
+
+class StorageWriteSink:
+    """
+    Envia linhas para o BigQuery com AppendRows no stream _default
+
+    Mantém um AppendRowsStream aberto por tabela e o reabre na próxima
+    escrita se ocorrer erro.
+    """
+
+    def __init__(self, project_id: str, dataset_id: str, schemas: Dict[str, TableSchema],
+                 json_default=str):
+        """
+        Args:
+            project_id: ID do projeto GCP
+            dataset_id: ID do dataset BigQuery
+            schemas: Tabela -> esquema (ver schema_from_dataclass)
+            json_default: Conversor para valores não serializáveis em colunas JSON
+        """
+        self.client = bigquery_storage_v1.BigQueryWriteClient()
+        self.project_id = project_id
+        self.dataset_id = dataset_id
+        self._json_default = json_default
+        self._schemas = schemas
+        self._messages = {
+            table_name: _build_message_class(table_name, schema)
+            for table_name, schema in schemas.items()
+        }
+        self._streams: Dict[str, writer.AppendRowsStream] = {}
+        # append_rows é chamado por várias threads: a abertura do stream é
+        # check-then-create e não pode abrir dois streams para a mesma tabela
+        self._streams_lock = threading.Lock()
+
+    def supports(self, table_name: str) -> bool:
+        return table_name in self._schemas
+
+    def _get_stream(self, table_name: str) -> writer.AppendRowsStream:
+        """Obtém (ou abre) o AppendRowsStream da tabela"""
+        stream = self._streams.get(table_name)
+        if stream is not None:
+            return stream
+
+        with self._streams_lock:
+            stream = self._streams.get(table_name)
+            if stream is not None:
+                return stream
+
+            _, proto_descriptor = self._messages[table_name]
+            table_path = self.client.table_path(self.project_id, self.dataset_id, table_name)
+
+            template = types.AppendRowsRequest()
+            template.write_stream = f'{table_path}/streams/_default'
+            proto_data = types.AppendRowsRequest.ProtoData()
+            proto_data.writer_schema = types.ProtoSchema(proto_descriptor=proto_descriptor)
+            template.proto_rows = proto_data
+
+            stream = self._streams[table_name] = writer.AppendRowsStream(self.client, template)
+            return stream
+
+    def _serialize_rows(self, table_name: str, rows: List[Dict[str, Any]]) -> List[bytes]:
+        """Converte as linhas (dicts) em mensagens protobuf serializadas"""
+        message_class, _ = self._messages[table_name]
+        json_default = self._json_default
+        serialized = []
+
+        for row in rows:
+            message = message_class()
+            for name, kind in self._schemas[table_name]:
+                value = row.get(name)
+                if value is None:
+                    continue
+                if kind == 'json':
+                    setattr(message, name, orjson.dumps(value, default=json_default).decode())
+                elif kind == 'timestamp':
+                    setattr(message, name, _timestamp_micros(value))
+                elif kind == 'repeated_string':
+                    getattr(message, name).extend(str(item) for item in value)
+                else:
+                    setattr(message, name, value)
+            serialized.append(message.SerializeToString())
+
+        return serialized
+
+    def append_rows(self, table_name: str, rows: List[Dict[str, Any]]):
+        """
+        Envia as linhas e aguarda a confirmação do BigQuery
+
+        Raises:
+            AppendRowsNotCommitted: Nenhuma linha foi gravada
+        """
+        try:
+            proto_rows = types.ProtoRows()
+            proto_rows.serialized_rows.extend(self._serialize_rows(table_name, rows))
+
+            request = types.AppendRowsRequest()
+            proto_data = types.AppendRowsRequest.ProtoData()
+            proto_data.rows = proto_rows
+            request.proto_rows = proto_data
+
+            stream = self._get_stream(table_name)
+        except Exception as e:
+            raise AppendRowsNotCommitted(f"Falha antes do envio: {e}") from e
+
+        try:
+            response = stream.send(request).result()
+        except Exception:
+            # Descartar apenas o stream que falhou (outra thread pode já ter reaberto)
+            with self._streams_lock:
+                if self._streams.get(table_name) is stream:
+                    del self._streams[table_name]
+            stream.close()
+            raise
+
+        if response.row_errors:
+            raise AppendRowsNotCommitted(
+                f"Erros em {len(response.row_errors)} linhas: {response.row_errors}"
+            )
+
+    def close(self):
+        """Fecha os streams abertos"""
+        with self._streams_lock:
+            streams = list(self._streams.values())
+            self._streams.clear()
+        for stream in streams:
+            stream.close()
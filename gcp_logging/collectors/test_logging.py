@@ -6,10 +6,15 @@ Script para testar todas as funcionalidades do sistema de logging
 
 import os
 import sys
+import logging
 import time
 import random
+import itertools
+from contextlib import contextmanager
 from datetime import datetime
 
+import numpy as np
+
 # Adicionar path do projeto
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
@@ -18,25 +23,106 @@ from gcp_logging.collectors.decorators import (
     log_agent_execution, 
     log_mcp_call, 
     log_cost_comparison_result,
-    log_complete_agent
+    log_complete_agent,
+    with_session_id
 )
 
+# Valores constantes reutilizados pelos registros de teste (não mutar)
+AWS_GCP_PROVIDERS = ('aws', 'gcp')
+T3_USE1_PARAMS = {'instance_type': 't3.medium', 'region': 'us-east-1'}
+REQ_T3_USE1 = {**T3_USE1_PARAMS, 'workload': 'web_server'}
+
+# IDs de sessão: época fixada uma vez por execução + contador monotônico
+_SESSION_EPOCH = int(time.time())
+_sid = itertools.count()
+
+
+def _mk_sid(prefix: str) -> str:
+    """Gera um ID de sessão único nesta execução"""
+    return f"{prefix}_{_SESSION_EPOCH}_{next(_sid)}"
+
+
+class _FakeClock:
+    """Relógio virtual: sleep apenas avança o tempo, sem bloquear"""
+
+    def __init__(self):
+        self.now_ns = time.perf_counter_ns()
+
+    def __call__(self) -> int:
+        return self.now_ns
+
+    def sleep(self, seconds: float):
+        self.now_ns += int(seconds * 1_000_000_000)
+
+
+# CCA_FAKE_CLOCK=1 troca os sleeps dos mocks pelo relógio virtual, para que
+# o tempo medido reflita apenas o overhead do logging
+if os.getenv('CCA_FAKE_CLOCK') == '1':
+    _clock = _FakeClock()
+    _sleep = _clock.sleep
+else:
+    _clock = time.perf_counter_ns
+    _sleep = time.sleep
+
+
+# Diagnósticos dos testes: formatação adiada até o nível estar habilitado
+log = logging.getLogger(__name__)
+
+
+class _Lazy:
+    """Adia a formatação de uma mensagem até __str__ (só se o log for emitido)"""
+    __slots__ = ('f', 'a')
+
+    def __init__(self, f, *a):
+        self.f, self.a = f, a
+
+    def __str__(self):
+        return self.f(*self.a)
+
+
+class _BufferHandler(logging.Handler):
+    """Acumula os diagnósticos emitidos no buffer de saída do teste"""
+
+    def __init__(self, out: list):
+        super().__init__()
+        self.out = out
+
+    def emit(self, record):
+        self.out.append(self.format(record) + "\n")
+
+
+@contextmanager
+def _buffered_output(header: str):
+    """
+    Saída do teste (inclusive os log.info dos mocks) escrita de uma vez no fim
+
+    O nível de log continua valendo: diagnósticos desabilitados não são
+    formatados nem entram no buffer.
+    """
+    out = [header]
+    handler = _BufferHandler(out)
+    log.addHandler(handler)
+    log.propagate = False
+    try:
+        yield out
+    finally:
+        log.removeHandler(handler)
+        log.propagate = True
+        sys.stdout.write(''.join(out))
+
 
 def test_basic_logging():
     """Teste básico do sistema de logging"""
-    print("🧪 Testando logging básico...")
+    # Saída acumulada e escrita de uma vez no fim do teste
+    out = ["🧪 Testando logging básico...\n"]
     
     logger = initialize_logger()
     
     # Teste de execução de agente
     execution_id = logger.log_cost_comparison(
         analysis_type='compute',
-        providers=['aws', 'gcp'],
-        input_requirements={
-            'instance_type': 't3.medium',
-            'region': 'us-east-1',
-            'workload': 'web_server'
-        },
+        providers=AWS_GCP_PROVIDERS,
+        input_requirements=REQ_T3_USE1,
         results_by_provider={
             'aws': {'monthly_cost': 156.80, 'performance_score': 85},
             'gcp': {'monthly_cost': 204.30, 'performance_score': 82}
@@ -51,7 +137,7 @@ def test_basic_logging():
         user_id='test_user_001'
     )
     
-    print(f"✅ Comparação de custos logada: {execution_id}")
+    out.append(f"✅ Comparação de custos logada: {execution_id}\n")
     
     # Teste de interação entre agentes
     interaction_id = logger.log_agent_interaction(
@@ -60,20 +146,20 @@ def test_basic_logging():
         interaction_type='request',
         message_content={
             'action': 'analyze_costs',
-            'parameters': {'instance_type': 't3.medium', 'region': 'us-east-1'}
+            'parameters': T3_USE1_PARAMS
         },
         response_time=1200,
         success=True,
         session_id='test_session_001'
     )
     
-    print(f"✅ Interação entre agentes logada: {interaction_id}")
+    out.append(f"✅ Interação entre agentes logada: {interaction_id}\n")
     
     # Teste de chamada MCP
     call_id = logger.log_mcp_server_call(
         server_type='aws_pricing',
         method_name='get_ec2_pricing',
-        input_params={'instance_type': 't3.medium', 'region': 'us-east-1'},
+        input_params=T3_USE1_PARAMS,
         response_data={'hourly_cost': 0.0464, 'monthly_cost': 33.79},
         response_time=850,
         status_code=200,
@@ -83,7 +169,7 @@ def test_basic_logging():
         session_id='test_session_001'
     )
     
-    print(f"✅ Chamada MCP logada: {call_id}")
+    out.append(f"✅ Chamada MCP logada: {call_id}\n")
     
     # Teste de feedback do usuário
     feedback_id = logger.log_user_feedback(
@@ -96,18 +182,19 @@ def test_basic_logging():
         user_id='test_user_001'
     )
     
-    print(f"✅ Feedback do usuário logado: {feedback_id}")
+    out.append(f"✅ Feedback do usuário logado: {feedback_id}\n")
+    sys.stdout.write(''.join(out))
     
     return logger
 
 
 @log_agent_execution('aws_specialist', 'cost_analysis')
-def mock_aws_analysis(instance_type: str, region: str, session_id: str = None):
+def mock_aws_analysis(instance_type: str, region: str):
     """Mock de análise AWS com decorador"""
-    print(f"🔍 Analisando AWS: {instance_type} em {region}")
+    log.info("🔍 Analisando AWS: %s em %s", instance_type, region)
     
     # Simular processamento
-    time.sleep(random.uniform(0.5, 2.0))
+    _sleep(random.uniform(0.5, 2.0))
     
     # Simular resultado
     base_cost = random.uniform(100, 300)
@@ -122,12 +209,12 @@ def mock_aws_analysis(instance_type: str, region: str, session_id: str = None):
 
 
 @log_mcp_call('gcp_pricing', estimate_cost=True)
-def mock_gcp_pricing_call(machine_type: str, region: str, session_id: str = None):
+def mock_gcp_pricing_call(machine_type: str, region: str):
     """Mock de chamada MCP para GCP com decorador"""
-    print(f"💰 Consultando preços GCP: {machine_type} em {region}")
+    log.info("💰 Consultando preços GCP: %s em %s", machine_type, region)
     
     # Simular latência de API
-    time.sleep(random.uniform(0.3, 1.5))
+    _sleep(random.uniform(0.3, 1.5))
     
     # Simular resposta da API
     base_cost = random.uniform(120, 350)
@@ -141,12 +228,12 @@ def mock_gcp_pricing_call(machine_type: str, region: str, session_id: str = None
 
 
 @log_cost_comparison_result('comprehensive')
-def mock_comprehensive_analysis(requirements: dict, session_id: str = None):
+def mock_comprehensive_analysis(requirements: dict):
     """Mock de análise abrangente com decorador"""
-    print("📊 Executando análise abrangente...")
+    log.info("📊 Executando análise abrangente...")
     
     # Simular análise complexa
-    time.sleep(random.uniform(2.0, 5.0))
+    _sleep(random.uniform(2.0, 5.0))
     
     # Simular resultados
     aws_cost = random.uniform(200, 400)
@@ -179,16 +266,16 @@ def mock_comprehensive_analysis(requirements: dict, session_id: str = None):
 
 
 @log_complete_agent('azure_specialist', 'cost_analysis', 'azure_pricing')
-def mock_azure_complete_analysis(vm_size: str, region: str, session_id: str = None):
+def mock_azure_complete_analysis(vm_size: str, region: str):
     """Mock de análise Azure completa com decorador composto"""
-    print(f"🔷 Análise completa Azure: {vm_size} em {region}")
+    log.info("🔷 Análise completa Azure: %s em %s", vm_size, region)
     
     # Simular processamento intensivo
-    time.sleep(random.uniform(1.0, 3.0))
+    _sleep(random.uniform(1.0, 3.0))
     
     # Simular múltiplas operações
     for i in range(3):
-        time.sleep(0.2)  # Simular sub-operações
+        _sleep(0.2)  # Simular sub-operações
     
     base_cost = random.uniform(180, 380)
     return {
@@ -204,147 +291,178 @@ def mock_azure_complete_analysis(vm_size: str, region: str, session_id: str = No
 
 def test_decorators():
     """Teste dos decoradores de logging"""
-    print("\n🎭 Testando decoradores...")
-    
-    session_id = f"test_session_{int(time.time())}"
-    
-    # Teste de agente AWS
-    aws_result = mock_aws_analysis(
-        instance_type='t3.large',
-        region='us-west-2',
-        session_id=session_id
-    )
-    print(f"✅ Resultado AWS: ${aws_result['monthly_cost']:.2f}/mês")
-    
-    # Teste de chamada MCP GCP
-    gcp_result = mock_gcp_pricing_call(
-        machine_type='e2-standard-4',
-        region='us-central1',
-        session_id=session_id
-    )
-    print(f"✅ Preço GCP: ${gcp_result['monthly_cost']:.2f}/mês")
-    
-    # Teste de análise abrangente
-    comprehensive_result = mock_comprehensive_analysis(
-        requirements={
-            'workload_type': 'web_application',
-            'expected_traffic': 'medium',
-            'budget_limit': 500
-        },
-        session_id=session_id
-    )
-    print(f"✅ Recomendação: {comprehensive_result['recommendation'].upper()} "
-          f"(economia de {comprehensive_result['savings_pct']:.1f}%)")
-    
-    # Teste de agente completo
-    azure_result = mock_azure_complete_analysis(
-        vm_size='Standard_D4s_v3',
-        region='East US',
-        session_id=session_id
-    )
-    print(f"✅ Análise Azure: ${azure_result['monthly_cost']:.2f}/mês "
-          f"(score: {azure_result['performance_score']})")
+    with _buffered_output("\n🎭 Testando decoradores...\n"):
+        session_id = _mk_sid("test_session")
+        
+        # session_id propagado por contexto para todos os decoradores
+        with with_session_id(session_id):
+            # Teste de agente AWS
+            aws_result = mock_aws_analysis(
+                instance_type='t3.large',
+                region='us-west-2'
+            )
+            log.info("✅ Resultado AWS: %s", _Lazy(lambda r: f"${r['monthly_cost']:.2f}/mês", aws_result))
+            
+            # Teste de chamada MCP GCP
+            gcp_result = mock_gcp_pricing_call(
+                machine_type='e2-standard-4',
+                region='us-central1'
+            )
+            log.info("✅ Preço GCP: %s", _Lazy(lambda r: f"${r['monthly_cost']:.2f}/mês", gcp_result))
+            
+            # Teste de análise abrangente
+            comprehensive_result = mock_comprehensive_analysis(
+                requirements={
+                    'workload_type': 'web_application',
+                    'expected_traffic': 'medium',
+                    'budget_limit': 500
+                }
+            )
+            log.info("✅ Recomendação: %s", _Lazy(
+                lambda r: f"{r['recommendation'].upper()} (economia de {r['savings_pct']:.1f}%)",
+                comprehensive_result
+            ))
+            
+            # Teste de agente completo
+            azure_result = mock_azure_complete_analysis(
+                vm_size='Standard_D4s_v3',
+                region='East US'
+            )
+            log.info("✅ Análise Azure: %s", _Lazy(
+                lambda r: f"${r['monthly_cost']:.2f}/mês (score: {r['performance_score']})",
+                azure_result
+            ))
 
 
 def test_context_manager():
     """Teste do context manager para logging"""
-    print("\n🔄 Testando context manager...")
+    out = ["\n🔄 Testando context manager...\n"]
     
-    logger = CloudCostLogger()
-    session_id = f"test_session_{int(time.time())}"
+    logger = CloudCostLogger(clock=_clock)
+    session_id = _mk_sid("test_session")
     
-    # Teste de sucesso
-    with logger.log_agent_execution_context(
-        agent_type='cost_coordinator',
-        agent_name='coordinate_analysis',
-        task_type='orchestration',
-        session_id=session_id,
-        workload_type='enterprise',
-        budget_limit=1000
-    ) as ctx:
-        print("🎯 Executando coordenação de análise...")
-        time.sleep(1.5)
-        
-        result = {
-            'total_providers_analyzed': 3,
-            'best_recommendation': 'aws',
-            'total_savings': 250.75
-        }
-        ctx.set_result(result)
-        print(f"✅ Coordenação concluída: economia de ${result['total_savings']}")
-    
-    # Teste de erro
     try:
+        # Teste de sucesso
         with logger.log_agent_execution_context(
-            agent_type='error_agent',
-            agent_name='failing_function',
-            task_type='error_test',
-            session_id=session_id
+            agent_type='cost_coordinator',
+            agent_name='coordinate_analysis',
+            task_type='orchestration',
+            session_id=session_id,
+            workload_type='enterprise',
+            budget_limit=1000
         ) as ctx:
-            print("💥 Simulando erro...")
-            time.sleep(0.5)
-            raise ValueError("Erro simulado para teste")
-    except ValueError as e:
-        print(f"✅ Erro capturado e logado: {e}")
+            out.append("🎯 Executando coordenação de análise...\n")
+            _sleep(1.5)
+            
+            result = {
+                'total_providers_analyzed': 3,
+                'best_recommendation': 'aws',
+                'total_savings': 250.75
+            }
+            ctx.set_result(result)
+            out.append(f"✅ Coordenação concluída: economia de ${result['total_savings']}\n")
+        
+        # Teste de erro
+        try:
+            with logger.log_agent_execution_context(
+                agent_type='error_agent',
+                agent_name='failing_function',
+                task_type='error_test',
+                session_id=session_id
+            ) as ctx:
+                out.append("💥 Simulando erro...\n")
+                _sleep(0.5)
+                raise ValueError("Erro simulado para teste")
+        except ValueError as e:
+            out.append(f"✅ Erro capturado e logado: {e}\n")
+        
+        sys.stdout.write(''.join(out))
+    finally:
+        logger.close()
 
 
 def test_performance_load():
     """Teste de carga para verificar performance"""
-    print("\n⚡ Testando performance com carga...")
-    
-    logger = CloudCostLogger()
-    start_time = time.time()
-    
-    # Simular múltiplas análises simultâneas
-    for i in range(50):
-        session_id = f"load_test_session_{i}"
-        
-        # Log de execução
-        with logger.log_agent_execution_context(
-            agent_type=random.choice(['aws_specialist', 'gcp_specialist', 'azure_specialist']),
-            agent_name=f'analysis_{i}',
-            task_type='load_test',
-            session_id=session_id
-        ):
-            time.sleep(random.uniform(0.01, 0.1))  # Simular processamento rápido
+    with _buffered_output("\n⚡ Testando performance com carga...\n"):
+        logger = CloudCostLogger(clock=_clock)
+        iterations = 50
+        comparisons = iterations // 5
         
-        # Log de comparação
-        if i % 5 == 0:  # A cada 5 execuções
-            logger.log_cost_comparison(
-                analysis_type='compute',
-                providers=['aws', 'gcp'],
-                input_requirements={'test_id': i},
-                results_by_provider={
-                    'aws': {'cost': random.uniform(100, 300)},
-                    'gcp': {'cost': random.uniform(120, 320)}
-                },
-                recommendation=random.choice(['aws', 'gcp']),
-                confidence=random.uniform(0.7, 0.95),
-                savings_pct=random.uniform(5, 30),
-                savings_amount=random.uniform(20, 100),
-                reasoning=f'Análise de carga #{i}',
-                execution_time=random.randint(1000, 5000),
-                session_id=session_id
-            )
-    
-    # Forçar flush
-    logger.flush()
-    
-    total_time = time.time() - start_time
-    print(f"✅ Teste de carga concluído: 50 execuções em {total_time:.2f}s")
-    print(f"📊 Métricas do logger: {logger.get_metrics()}")
+        try:
+            # Sortear todos os valores de uma vez, fora do tempo medido; tolist()
+            # devolve floats/ints Python para os logs
+            rng = np.random.default_rng(0)
+            agent_types = ['aws_specialist', 'gcp_specialist', 'azure_specialist']
+            agent_pick = rng.integers(0, len(agent_types), iterations).tolist()
+            sleep_times = rng.uniform(0.01, 0.1, iterations).tolist()
+            aws_costs = rng.uniform(100, 300, comparisons).tolist()
+            gcp_costs = rng.uniform(120, 320, comparisons).tolist()
+            recommendations = rng.choice(['aws', 'gcp'], comparisons).tolist()
+            confidences = rng.uniform(0.7, 0.95, comparisons).tolist()
+            savings_pcts = rng.uniform(5, 30, comparisons).tolist()
+            savings_amounts = rng.uniform(20, 100, comparisons).tolist()
+            execution_times = rng.integers(1000, 5001, comparisons).tolist()
+            
+            # Resultados montados antes da medição. Um dict único mutado a cada
+            # iteração não serve: o logger guarda a referência nos buffers até o flush
+            results_by_provider = [
+                {'aws': {'cost': aws_cost}, 'gcp': {'cost': gcp_cost}}
+                for aws_cost, gcp_cost in zip(aws_costs, gcp_costs)
+            ]
+            
+            start_time = time.time()
+            
+            # Simular múltiplas análises simultâneas
+            for i in range(iterations):
+                session_id = _mk_sid("load_test_session")
+                
+                # Log de execução
+                with logger.log_agent_execution_context(
+                    agent_type=agent_types[agent_pick[i]],
+                    agent_name=f'analysis_{i}',
+                    task_type='load_test',
+                    session_id=session_id
+                ):
+                    _sleep(sleep_times[i])  # Simular processamento rápido
+                
+                # Log de comparação
+                if i % 5 == 0:  # A cada 5 execuções
+                    j = i // 5
+                    logger.log_cost_comparison(
+                        analysis_type='compute',
+                        providers=AWS_GCP_PROVIDERS,
+                        input_requirements={'test_id': i},
+                        results_by_provider=results_by_provider[j],
+                        recommendation=recommendations[j],
+                        confidence=confidences[j],
+                        savings_pct=savings_pcts[j],
+                        savings_amount=savings_amounts[j],
+                        reasoning=f'Análise de carga #{i}',
+                        execution_time=execution_times[j],
+                        session_id=session_id
+                    )
+            
+            # Forçar flush
+            logger.flush()
+            
+            total_time = time.time() - start_time
+            log.info("✅ Teste de carga concluído: %d execuções em %.2fs", iterations, total_time)
+            log.info("📊 Métricas do logger: %s", _Lazy(logger.get_metrics))
+        finally:
+            logger.close()
 
 
 def test_error_handling():
     """Teste de tratamento de erros"""
-    print("\n🚨 Testando tratamento de erros...")
+    out = ["\n🚨 Testando tratamento de erros...\n"]
     
     # Teste com projeto inválido
     try:
         invalid_logger = CloudCostLogger(project_id="projeto-inexistente-12345")
-        print("❌ Deveria ter falhado com projeto inválido")
+        invalid_logger.close()
+        out.append("❌ Deveria ter falhado com projeto inválido\n")
     except Exception as e:
-        print(f"✅ Erro esperado capturado: {type(e).__name__}")
+        out.append(f"✅ Erro esperado capturado: {type(e).__name__}\n")
     
     # Teste com dados inválidos
     logger = CloudCostLogger()
@@ -366,9 +484,13 @@ def test_error_handling():
             reasoning='teste',
             execution_time=1000
         )
-        print("✅ Dados não serializáveis tratados corretamente")
+        out.append("✅ Dados não serializáveis tratados corretamente\n")
     except Exception as e:
-        print(f"⚠️ Erro inesperado: {e}")
+        out.append(f"⚠️ Erro inesperado: {e}\n")
+    finally:
+        logger.close()
+    
+    sys.stdout.write(''.join(out))
 
 
 def main():
@@ -376,15 +498,19 @@ def main():
     print("🚀 Cloud Cost Agent - Teste do Sistema de Logging")
     print("=" * 60)
     
-    # Verificar variáveis de ambiente
-    required_vars = ['GCP_PROJECT_ID']
-    missing_vars = [var for var in required_vars if not os.getenv(var)]
+    # TEST_LOG_LEVEL=WARNING omite (e não formata) os diagnósticos
+    logging.basicConfig(level=os.getenv('TEST_LOG_LEVEL', 'INFO'), format='%(message)s')
+    
+    # Verificar variáveis de ambiente (lidas uma única vez)
+    env = {var: os.getenv(var) for var in ('GCP_PROJECT_ID',)}
+    missing_vars = [var for var, value in env.items() if not value]
     
     if missing_vars:
         print(f"❌ Variáveis de ambiente faltando: {missing_vars}")
         print("💡 Execute: source ../credentials/env_vars.sh")
         return 1
     
+    logger = None
     try:
         # Executar testes
         logger = test_basic_logging()
@@ -397,14 +523,16 @@ def main():
         logger.flush()
         
         print("\n🎉 Todos os testes concluídos com sucesso!")
-        print(f"📊 Métricas finais: {logger.get_metrics()}")
+        log.info("📊 Métricas finais: %s", _Lazy(logger.get_metrics))
         
         # Instruções para visualização
-        project_id = os.getenv('GCP_PROJECT_ID')
-        print(f"\n📈 Para visualizar os logs:")
-        print(f"🔗 Cloud Logging: https://console.cloud.google.com/logs/query?project={project_id}")
-        print(f"🔗 BigQuery: https://console.cloud.google.com/bigquery?project={project_id}")
-        print(f"🔗 Pub/Sub: https://console.cloud.google.com/cloudpubsub?project={project_id}")
+        project_id = env['GCP_PROJECT_ID']
+        sys.stdout.write(
+            f"\n📈 Para visualizar os logs:\n"
+            f"🔗 Cloud Logging: https://console.cloud.google.com/logs/query?project={project_id}\n"
+            f"🔗 BigQuery: https://console.cloud.google.com/bigquery?project={project_id}\n"
+            f"🔗 Pub/Sub: https://console.cloud.google.com/cloudpubsub?project={project_id}\n"
+        )
         
         return 0
         
@@ -413,6 +541,10 @@ def main():
         import traceback
         traceback.print_exc()
         return 1
+    finally:
+        # Logger global (também usado pelos decoradores)
+        if logger is not None:
+            logger.close()
 
 
 if __name__ == "__main__":
@@ -3,24 +3,164 @@ Módulo MCP (Model Context Protocol) Servers
 Servidores para comunicação entre agentes
 """
 
+import asyncio
+import base64
+import functools
+import inspect
+import json
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+from typing import Any, Callable, Optional
+
+import orjson
+import zstandard
+
 # Nota: Implementação simplificada do MCP
 # Em produção, seria necessário usar uma biblioteca MCP real
 
+_MISS = object()
+
+
+def _orjson_encoder(result: Any) -> bytes:
+    """Serializador padrão das respostas (datetime e numpy nativos)"""
+    return orjson.dumps(
+        result, default=str, option=orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY
+    )
+
+
+# Campo "data" acima deste tamanho (bytes de JSON) é enviado comprimido
+COMPRESSION_THRESHOLD = 64 * 1024
+
+
+def pack_large_data(result: dict, threshold: int = COMPRESSION_THRESHOLD) -> dict:
+    """
+    Comprime com zstd o campo "data" de uma resposta grande
+    
+    A resposta compactada troca "data" por "data_b64" (JSON comprimido em
+    base64) e ganha "compressed": True e "encoding": "zstd". Use
+    unpack_data() para recuperar os dados.
+    """
+    payload = _orjson_encoder(result["data"])
+    if len(payload) <= threshold:
+        return result
+    
+    packed = {key: value for key, value in result.items() if key != "data"}
+    packed["compressed"] = True
+    packed["encoding"] = "zstd"
+    packed["data_b64"] = base64.b64encode(
+        zstandard.ZstdCompressor(level=3).compress(payload)
+    ).decode()
+    return packed
+
+
+def unpack_data(result: dict) -> Any:
+    """Retorna o campo "data" de uma resposta, descomprimindo se necessário"""
+    if result.get("compressed"):
+        payload = zstandard.ZstdDecompressor().decompress(base64.b64decode(result["data_b64"]))
+        return orjson.loads(payload)
+    return result.get("data")
+
+
+def _cache_key(args, kwargs) -> str:
+    """Chave estável para os argumentos de uma chamada de ferramenta"""
+    return json.dumps([args, kwargs], sort_keys=True, default=str)
+
+
+def _cached_tool(func, maxsize: int = 256, ttl: Optional[float] = None):
+    """
+    Cache LRU de resultados por argumentos (serializados em JSON)
+    
+    Para corrotinas o cache guarda o resultado aguardado, não a corrotina,
+    que só pode ser aguardada uma vez. Com ttl (segundos) as entradas
+    expiram; respostas de erro ({"error": ...}) ou desatualizadas
+    ({"stale": True}) não são guardadas.
+    """
+    cache = OrderedDict()
+    
+    def lookup(key):
+        entry = cache.get(key)
+        if entry is None:
+            return _MISS
+        expires_at, result = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del cache[key]
+            return _MISS
+        cache.move_to_end(key)
+        return result
+    
+    def remember(key, result):
+        if isinstance(result, dict) and ('error' in result or result.get('stale')):
+            return result
+        cache[key] = (time.monotonic() + ttl if ttl is not None else None, result)
+        if len(cache) > maxsize:
+            cache.popitem(last=False)
+        return result
+    
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = _cache_key(args, kwargs)
+            result = lookup(key)
+            if result is _MISS:
+                result = remember(key, await func(*args, **kwargs))
+            return result
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = _cache_key(args, kwargs)
+            result = lookup(key)
+            if result is _MISS:
+                result = remember(key, func(*args, **kwargs))
+            return result
+    
+    wrapper.cache_clear = cache.clear
+    return wrapper
+
+
 class MCPServer:
     """Implementação simplificada do servidor MCP"""
     
-    def __init__(self, name: str):
+    def __init__(self, name: str, json_encoder: Optional[Callable[[Any], bytes]] = None):
+        """
+        Args:
+            name: Nome do servidor
+            json_encoder: Serializador das respostas para o transporte (padrão: orjson)
+        """
         self.name = name
+        self.json_encoder = json_encoder or _orjson_encoder
         self.tools = {}
         self.resources = {}
+        # Views somente leitura usadas no dispatch; freeze() troca por cópias
+        # imutáveis quando o registro termina
+        self._tools = MappingProxyType(self.tools)
+        self._resources = MappingProxyType(self.resources)
+        # Criado aqui (e não em start) para que um stop() chamado antes de
+        # start() chegar ao await não se perca
+        self._stop = asyncio.Event()
     
-    def tool(self, name: str):
-        """Decorator para registrar ferramentas"""
+    def tool(self, name: str, cache: bool = False, ttl: Optional[float] = None):
+        """
+        Decorator para registrar ferramentas
+        
+        Args:
+            name: Nome da ferramenta
+            cache: Memoriza resultados por argumentos (LRU de 256 entradas)
+            ttl: Validade (segundos) das entradas do cache; None não expira
+        """
         def decorator(func):
-            self.tools[name] = func
+            self.tools[name] = _cached_tool(func, ttl=ttl) if cache else func
             return func
         return decorator
     
+    def clear_cache(self, name: Optional[str] = None):
+        """Invalida o cache de uma ferramenta (ou de todas)"""
+        tools = [self.tools[name]] if name else self.tools.values()
+        for func in tools:
+            cache_clear = getattr(func, 'cache_clear', None)
+            if cache_clear is not None:
+                cache_clear()
+    
     def resource(self, name: str):
         """Decorator para registrar recursos"""
         def decorator(func):
@@ -28,16 +168,37 @@ class MCPServer:
             return func
         return decorator
     
+    def encode(self, result: Any) -> bytes:
+        """Serializa a resposta de uma ferramenta/recurso para envio"""
+        return self.json_encoder(result)
+    
+    def freeze(self):
+        """Congela o registro de ferramentas/recursos para leituras concorrentes"""
+        self._tools = MappingProxyType(dict(self.tools))
+        self._resources = MappingProxyType(dict(self.resources))
+    
+    def dispatch(self, name: str, *args, **kwargs):
+        """Executa a ferramenta registrada com o nome informado"""
+        func = self._tools.get(name)
+        if func is None:
+            raise KeyError(f"Ferramenta não registrada: {name}")
+        return func(*args, **kwargs)
+    
     async def start(self, host: str = "0.0.0.0", port: int = 8000):
         """Inicia o servidor (implementação simplificada)"""
+        self.freeze()
         print(f"MCP Server {self.name} iniciado em {host}:{port}")
         print(f"Tools: {list(self.tools.keys())}")
         print(f"Resources: {list(self.resources.keys())}")
         
-        # Em produção, aqui seria implementado o servidor HTTP/WebSocket real
-        import asyncio
-        while True:
-            await asyncio.sleep(1)
+        # Em produção, aqui seria implementado o servidor HTTP/WebSocket real.
+        # Aguarda o sinal de parada sem acordar o event loop periodicamente
+        # (pode ser ligado a sinais com loop.add_signal_handler(SIGTERM, self._stop.set))
+        await self._stop.wait()
+    
+    async def stop(self):
+        """Encerra o servidor iniciado por start() (ou faz o próximo start() retornar)"""
+        self._stop.set()
 
 class Tool:
     """Classe base para ferramentas MCP"""
@@ -47,5 +208,5 @@ class Resource:
     """Classe base para recursos MCP"""
     pass
 
-__all__ = ['MCPServer', 'Tool', 'Resource']
+__all__ = ['MCPServer', 'Tool', 'Resource', 'pack_large_data', 'unpack_data']
 
@@ -5,58 +5,419 @@ Responsável por conectar à API de custos da AWS e fornecer dados para os agent
 import os
 import sys
 import asyncio
+import functools
 import json
-from typing import Dict, List, Any, Optional
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, fields
+from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime, timedelta
-import boto3
 from botocore.exceptions import ClientError, NoCredentialsError
 
-# Adicionar o diretório raiz ao path
-sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
+# Adicionar o diretório raiz ao path apenas quando executado como script;
+# importado como mcp.aws.aws_mcp_server a raiz já está no path
+if not __package__:
+    sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
 
-from mcp import MCPServer, Tool, Resource
+from mcp import MCPServer, Tool, Resource, pack_large_data
 from config.project_config import config
 from agents.base.logger import AgentLogger
 
+# Itens por página nas APIs paginadas (limita a memória de cada resposta)
+_PAGE_SIZE = 100
+
+# Espera (segundos) antes de tentar conectar à AWS de novo após uma falha
+_AWS_RETRY_BACKOFF = 30
+
+
+def _get_cost_and_usage_pages(cost_explorer, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Consulta o Cost Explorer seguindo NextPageToken (não há paginator para
+    GetCostAndUsage) e junta ResultsByTime de todas as páginas
+    """
+    response = cost_explorer.get_cost_and_usage(**params)
+    results = response.get('ResultsByTime', [])
+    attributes = response.get('DimensionValueAttributes', [])
+    
+    while response.get('NextPageToken'):
+        response = cost_explorer.get_cost_and_usage(
+            **params, NextPageToken=response['NextPageToken']
+        )
+        results.extend(response.get('ResultsByTime', []))
+        attributes.extend(response.get('DimensionValueAttributes', []))
+    
+    response['ResultsByTime'] = results
+    response['DimensionValueAttributes'] = attributes
+    response.pop('NextPageToken', None)
+    return response
+
+
+def _paginate_all(client, operation: str, **params) -> Dict[str, Any]:
+    """Executa todas as páginas de uma operação e junta o resultado"""
+    return client.get_paginator(operation).paginate(
+        **params, PaginationConfig={'PageSize': _PAGE_SIZE}
+    ).build_full_result()
+
+
+@dataclass(slots=True, frozen=True)
+class EC2InstanceRow:
+    """Instância EC2 listada (campos com os nomes da API)"""
+    InstanceId: str
+    InstanceType: str
+    State: str
+    LaunchTime: datetime
+    Region: str
+
+
+@dataclass(slots=True, frozen=True)
+class RDSInstanceRow:
+    """Instância RDS listada (campos com os nomes da API)"""
+    DBInstanceIdentifier: str
+    DBInstanceClass: str
+    Engine: str
+    DBInstanceStatus: str
+    AllocatedStorage: int
+    Region: str
+
+
+@dataclass(slots=True, frozen=True)
+class S3BucketRow:
+    """Bucket S3 listado (campos com os nomes da API)"""
+    Name: str
+    CreationDate: datetime
+    Region: str
+
+
+def _to_columns(rows: List[Any], row_class) -> Dict[str, List[Any]]:
+    """Converte uma lista de linhas em colunas (um array por campo)"""
+    return {
+        field.name: [getattr(row, field.name) for row in rows]
+        for field in fields(row_class)
+    }
+
+
+# Estados retornados na listagem EC2 (terminadas são filtradas na API)
+_EC2_LISTED_STATES = ['pending', 'running', 'stopping', 'stopped']
+
+
+def _list_ec2_instances(ec2, region: str) -> List[EC2InstanceRow]:
+    """Lista as instâncias EC2 da região percorrendo todas as páginas"""
+    pages = ec2.get_paginator('describe_instances').paginate(
+        Filters=[{'Name': 'instance-state-name', 'Values': _EC2_LISTED_STATES}],
+        PaginationConfig={'PageSize': 500}
+    )
+    return [
+        EC2InstanceRow(
+            instance['InstanceId'],
+            instance['InstanceType'],
+            instance['State']['Name'],
+            instance['LaunchTime'],
+            region
+        )
+        for page in pages
+        for reservation in page['Reservations']
+        for instance in reservation['Instances']
+    ]
+
+
+def _list_rds_instances(rds, region: str) -> List[RDSInstanceRow]:
+    """Lista as instâncias RDS da região percorrendo todas as páginas"""
+    pages = rds.get_paginator('describe_db_instances').paginate(
+        PaginationConfig={'PageSize': _PAGE_SIZE}
+    )
+    return [
+        RDSInstanceRow(
+            instance['DBInstanceIdentifier'],
+            instance['DBInstanceClass'],
+            instance['Engine'],
+            instance['DBInstanceStatus'],
+            instance['AllocatedStorage'],
+            region
+        )
+        for page in pages
+        for instance in page['DBInstances']
+    ]
+
+
+# Códigos de erro de throttling do Cost Explorer
+_THROTTLE_CODES = ('ThrottlingException', 'LimitExceededException')
+
+
+class _CircuitBreaker:
+    """
+    Abre o circuito após mais de `threshold` throttlings em `window` segundos
+    
+    Aberto, as chamadas são recusadas por `cooldown` segundos; depois disso
+    a próxima chamada é liberada e o histórico é zerado.
+    """
+    
+    def __init__(self, threshold: int = 5, window: float = 10.0, cooldown: float = 30.0):
+        self.threshold = threshold
+        self.window = window
+        self.cooldown = cooldown
+        self.opened_at: Optional[float] = None
+        self._failures = deque()
+    
+    @property
+    def state(self) -> str:
+        if self.opened_at is not None and time.monotonic() - self.opened_at < self.cooldown:
+            return 'open'
+        return 'closed'
+    
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return False
+        self.opened_at = None
+        self._failures.clear()
+        return True
+    
+    def record_throttle(self):
+        now = time.monotonic()
+        self._failures.append(now)
+        while self._failures and now - self._failures[0] > self.window:
+            self._failures.popleft()
+        if len(self._failures) > self.threshold:
+            self.opened_at = now
+    
+    def record_success(self):
+        self._failures.clear()
+
+
+# Validade (segundos) das respostas em cache por ferramenta
+_TOOL_TTLS = {
+    'get_cost_and_usage': 3600,
+    'get_rightsizing_recommendations': 21600,
+    'get_reserved_instances_recommendations': 21600,
+    'get_ec2_instances': 60,
+    'get_s3_buckets': 300,
+    'get_rds_instances': 60,
+}
+
+
+# Intervalo (segundos) de atualização do resumo do Cost Explorer
+_SUMMARY_REFRESH_INTERVAL = 3600
+
+
 class AWSMCPServer:
     """
     Servidor MCP para AWS - Fornece acesso às APIs de custos e recursos da AWS
+    
+    As respostas mantêm datetimes do boto3; a serialização fica a cargo do
+    MCPServer.encode (orjson).
     """
     
     def __init__(self):
         self.logger = AgentLogger("AWSMCPServer")
         self.server = MCPServer("aws-cost-api")
         self.aws_session = None
-        self._initialize_aws_connection()
+        self._default_region = config.aws.region
+        # Clientes boto3 por (serviço, região): criar um cliente é caro
+        # (endpoint, credenciais, pool TLS) e eles são thread-safe
+        self._clients: Dict[Tuple[str, str], Any] = {}
+        self._clients_lock = threading.Lock()
+        self._all_regions: Optional[List[str]] = None
+        # Resumo de custos dos últimos 30 dias: (dados, momento da consulta)
+        self._summary_cache: Optional[Tuple[Dict[str, Any], datetime]] = None
+        # Throttling do Cost Explorer: circuit breaker e última resposta
+        # válida por consulta, servida enquanto o circuito estiver aberto
+        self._ce_breaker = _CircuitBreaker()
+        self._last_good: Dict[Tuple, Dict[str, Any]] = {}
+        # Timestamp das respostas: (segundo, ISO) formatado uma vez por segundo
+        self._ts_cache = (0, '')
+        self._boto_config = None
+        # Pool único para todas as chamadas boto3 (bloqueantes) e fan-outs:
+        # threads criadas uma vez e limitadas sob carga concorrente
+        self._pool = ThreadPoolExecutor(max_workers=64, thread_name_prefix='aws-mcp')
+        # Conexão AWS feita na primeira chamada de ferramenta (ver _ensure_aws)
+        self._aws_ready = False
+        self._aws_failed_at = None  # monotonic da última falha de conexão
+        self._aws_lock = asyncio.Lock()
         self._register_tools()
         self._register_resources()
     
     def _initialize_aws_connection(self):
         """Inicializa conexão com AWS"""
+        # Importado aqui: boto3 leva centenas de ms para carregar
+        import boto3
+        from botocore.config import Config
+        
+        # Pool de conexões maior que o padrão (10) para as chamadas em paralelo;
+        # retry adaptativo trata o throttling do Cost Explorer com backoff
+        self._boto_config = Config(
+            max_pool_connections=64,
+            tcp_keepalive=True,
+            retries={'mode': 'adaptive', 'max_attempts': 5},
+            connect_timeout=3,
+            read_timeout=30
+        )
+        
         try:
             self.aws_session = boto3.Session(
                 aws_access_key_id=config.aws.access_key_id,
                 aws_secret_access_key=config.aws.secret_access_key,
-                region_name=config.aws.region
+                region_name=self._default_region
             )
             
             # Testar conexão
-            sts_client = self.aws_session.client('sts')
-            identity = sts_client.get_caller_identity()
+            identity = self._client('sts').get_caller_identity()
+            
+            # Pré-aquecer os clientes usados pelas ferramentas
+            for service in ('ce', 's3', 'ec2', 'rds'):
+                self._client(service)
             
             self.logger.info("AWS MCP Server conectado", {
                 "account_id": identity.get('Account'),
-                "region": config.aws.region
+                "region": self._default_region
             })
             
         except (NoCredentialsError, ClientError) as e:
             self.logger.error(f"Erro na conexão AWS MCP: {str(e)}")
             self.aws_session = None
+            self._clients.clear()
+    
+    async def _ensure_aws(self) -> bool:
+        """
+        Conecta à AWS na primeira chamada; retorna se há sessão ativa
+        
+        Após uma falha (ex.: STS/credenciais indisponíveis) a conexão é
+        tentada de novo depois de _AWS_RETRY_BACKOFF segundos.
+        """
+        if not self._aws_ready:
+            async with self._aws_lock:
+                if not self._aws_ready and not self._aws_backing_off():
+                    await self._run(self._initialize_aws_connection)
+                    if self.aws_session is not None:
+                        self._aws_ready = True
+                        self._aws_failed_at = None
+                    else:
+                        self._aws_failed_at = time.monotonic()
+        return self.aws_session is not None
+    
+    def _aws_backing_off(self) -> bool:
+        """Indica se a última falha de conexão ainda está dentro do backoff"""
+        return (
+            self._aws_failed_at is not None
+            and time.monotonic() - self._aws_failed_at < _AWS_RETRY_BACKOFF
+        )
+    
+    def _client(self, service: str, region: Optional[str] = None):
+        """Obtém (ou cria uma única vez) o cliente boto3 do serviço/região"""
+        key = (service, region or self._default_region)
+        client = self._clients.get(key)
+        if client is None:
+            # boto3.Session.client não é thread-safe
+            with self._clients_lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = self._clients[key] = self.aws_session.client(
+                        service, region_name=key[1], config=self._boto_config
+                    )
+        return client
+    
+    def _iso_now(self) -> str:
+        """Timestamp ISO (resolução de segundos) das respostas"""
+        sec = int(time.time())
+        cached_sec, iso = self._ts_cache
+        if sec != cached_sec:
+            iso = datetime.fromtimestamp(sec).isoformat()
+            self._ts_cache = (sec, iso)
+        return iso
+    
+    def _bucket_region(self, s3, bucket_name: str) -> str:
+        """
+        Região de um bucket S3 via HEAD (header x-amz-bucket-region)
+        
+        O header também vem nas respostas de erro (403, 301), então a região
+        costuma ser conhecida mesmo sem permissão no bucket.
+        """
+        try:
+            response = s3.head_bucket(Bucket=bucket_name)
+        except ClientError as e:
+            response = e.response
+            region = response.get('ResponseMetadata', {}).get('HTTPHeaders', {}).get('x-amz-bucket-region')
+            if region:
+                return region
+            self.logger.warning(f"Região do bucket {bucket_name} indisponível", {
+                "error_code": response.get('Error', {}).get('Code')
+            })
+            return 'unknown'
+        return response['ResponseMetadata']['HTTPHeaders'].get('x-amz-bucket-region', 'unknown')
+    
+    async def _run(self, func, *args, **kwargs):
+        """Executa uma chamada boto3 (bloqueante) no pool do servidor"""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._pool, functools.partial(func, *args, **kwargs)
+        )
+    
+    async def _ce_call(self, key: Tuple, func, *args, **kwargs) -> Tuple[Dict[str, Any], bool]:
+        """
+        Chamada ao Cost Explorer protegida pelo circuit breaker
+        
+        Returns:
+            Tupla (resposta, desatualizada). Com throttling ou circuito aberto
+            devolve a última resposta válida da mesma consulta, se houver.
+        """
+        if self._ce_breaker.allow():
+            try:
+                response = await self._run(func, *args, **kwargs)
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') not in _THROTTLE_CODES:
+                    raise
+                self._ce_breaker.record_throttle()
+                if key not in self._last_good:
+                    raise
+            else:
+                self._ce_breaker.record_success()
+                self._last_good[key] = response
+                return response, False
+        elif key not in self._last_good:
+            raise RuntimeError("Cost Explorer indisponível (circuit breaker aberto)")
+        
+        self.logger.warning("Cost Explorer com throttling, usando última resposta", {
+            "query": key[0],
+            "breaker": self._ce_breaker.state
+        })
+        return self._last_good[key], True
+    
+    async def _resolve_regions(self, regions: List[str]) -> List[str]:
+        """Expande ["all"] para as regiões habilitadas na conta (consultadas uma vez)"""
+        if regions != ['all']:
+            return regions
+        if self._all_regions is None:
+            response = await self._run(self._client('ec2').describe_regions)
+            self._all_regions = [item['RegionName'] for item in response['Regions']]
+        return self._all_regions
+    
+    async def _list_in_regions(self, service: str, list_func,
+                               regions: List[str]) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+        """
+        Executa a listagem em todas as regiões em paralelo
+        
+        Returns:
+            Tupla (itens de todas as regiões, erros por região)
+        """
+        results = await asyncio.gather(
+            *(self._run(list_func, self._client(service, region), region) for region in regions),
+            return_exceptions=True
+        )
+        
+        items, errors = [], {}
+        for region, result in zip(regions, results):
+            if isinstance(result, Exception):
+                errors[region] = str(result)
+            else:
+                items.extend(result)
+        return items, errors
     
     def _register_tools(self):
         """Registra ferramentas MCP para AWS"""
         
-        @self.server.tool("get_cost_and_usage")
+        @self.server.tool("get_cost_and_usage", cache=True, ttl=_TOOL_TTLS['get_cost_and_usage'])
         async def get_cost_and_usage(
             start_date: str,
             end_date: str,
@@ -73,10 +434,10 @@ class AWSMCPServer:
                 group_by: Lista de dimensões para agrupamento
             """
             try:
-                if not self.aws_session:
+                if not await self._ensure_aws():
                     return {"error": "AWS não conectada"}
                 
-                cost_explorer = self.aws_session.client('ce')
+                cost_explorer = self._client('ce')
                 
                 # Configurar parâmetros da consulta
                 params = {
@@ -94,35 +455,46 @@ class AWSMCPServer:
                         {'Type': 'DIMENSION', 'Key': key} for key in group_by
                     ]
                 
-                response = cost_explorer.get_cost_and_usage(**params)
+                response, stale = await self._ce_call(
+                    ('get_cost_and_usage', start_date, end_date, granularity, tuple(group_by or ())),
+                    _get_cost_and_usage_pages, cost_explorer, params
+                )
                 
                 self.logger.info("Dados de custo AWS obtidos", {
                     "period": f"{start_date} to {end_date}",
                     "results_count": len(response.get('ResultsByTime', []))
                 })
                 
-                return {
+                result = {
                     "success": True,
                     "data": response,
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": self._iso_now()
                 }
+                if stale:
+                    result["stale"] = True
+                return pack_large_data(result)
                 
             except Exception as e:
                 self.logger.error(f"Erro ao obter custos AWS: {str(e)}")
                 return {"error": str(e)}
         
-        @self.server.tool("get_rightsizing_recommendations")
+        @self.server.tool(
+            "get_rightsizing_recommendations",
+            cache=True, ttl=_TOOL_TTLS['get_rightsizing_recommendations']
+        )
         async def get_rightsizing_recommendations() -> Dict[str, Any]:
             """
             Obtém recomendações de rightsizing da AWS
             """
             try:
-                if not self.aws_session:
+                if not await self._ensure_aws():
                     return {"error": "AWS não conectada"}
                 
-                cost_explorer = self.aws_session.client('ce')
+                cost_explorer = self._client('ce')
                 
-                response = cost_explorer.get_rightsizing_recommendation(
+                response, stale = await self._ce_call(
+                    ('get_rightsizing_recommendations',),
+                    _paginate_all, cost_explorer, 'get_rightsizing_recommendation',
                     Service='AmazonEC2',
                     Configuration={
                         'BenefitsConsidered': True,
@@ -134,28 +506,36 @@ class AWSMCPServer:
                     "recommendations_count": len(response.get('RightsizingRecommendations', []))
                 })
                 
-                return {
+                result = {
                     "success": True,
                     "data": response,
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": self._iso_now()
                 }
+                if stale:
+                    result["stale"] = True
+                return pack_large_data(result)
                 
             except Exception as e:
                 self.logger.error(f"Erro ao obter recomendações: {str(e)}")
                 return {"error": str(e)}
         
-        @self.server.tool("get_reserved_instances_recommendations")
+        @self.server.tool(
+            "get_reserved_instances_recommendations",
+            cache=True, ttl=_TOOL_TTLS['get_reserved_instances_recommendations']
+        )
         async def get_reserved_instances_recommendations() -> Dict[str, Any]:
             """
             Obtém recomendações de Reserved Instances
             """
             try:
-                if not self.aws_session:
+                if not await self._ensure_aws():
                     return {"error": "AWS não conectada"}
                 
-                cost_explorer = self.aws_session.client('ce')
+                cost_explorer = self._client('ce')
                 
-                response = cost_explorer.get_reservation_purchase_recommendation(
+                response, stale = await self._ce_call(
+                    ('get_reserved_instances_recommendations',),
+                    _paginate_all, cost_explorer, 'get_reservation_purchase_recommendation',
                     Service='AmazonEC2',
                     LookbackPeriodInDays='SIXTY_DAYS',
                     TermInYears='ONE_YEAR',
@@ -166,86 +546,100 @@ class AWSMCPServer:
                     "recommendations_count": len(response.get('Recommendations', []))
                 })
                 
-                return {
+                result = {
                     "success": True,
                     "data": response,
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": self._iso_now()
                 }
+                if stale:
+                    result["stale"] = True
+                return pack_large_data(result)
                 
             except Exception as e:
                 self.logger.error(f"Erro ao obter recomendações RI: {str(e)}")
                 return {"error": str(e)}
         
-        @self.server.tool("get_ec2_instances")
-        async def get_ec2_instances(region: Optional[str] = None) -> Dict[str, Any]:
+        @self.server.tool("get_ec2_instances", cache=True, ttl=_TOOL_TTLS['get_ec2_instances'])
+        async def get_ec2_instances(
+            region: Optional[str] = None,
+            regions: Optional[List[str]] = None,
+            columnar: bool = False
+        ) -> Dict[str, Any]:
             """
             Lista instâncias EC2
             
             Args:
                 region: Região específica (opcional)
+                regions: Várias regiões consultadas em paralelo, ou ["all"]
+                    para todas as regiões habilitadas (opcional)
+                columnar: Retorna os dados em colunas (um array por campo)
             """
             try:
-                if not self.aws_session:
+                if not await self._ensure_aws():
                     return {"error": "AWS não conectada"}
                 
-                target_region = region or config.aws.region
-                ec2 = self.aws_session.client('ec2', region_name=target_region)
-                
-                response = ec2.describe_instances()
+                target_regions = (
+                    await self._resolve_regions(regions) if regions
+                    else [region or self._default_region]
+                )
+                instances, errors = await self._list_in_regions('ec2', _list_ec2_instances, target_regions)
                 
-                instances = []
-                for reservation in response['Reservations']:
-                    for instance in reservation['Instances']:
-                        instances.append({
-                            'InstanceId': instance['InstanceId'],
-                            'InstanceType': instance['InstanceType'],
-                            'State': instance['State']['Name'],
-                            'LaunchTime': instance['LaunchTime'].isoformat(),
-                            'Region': target_region
-                        })
+                if len(errors) == len(target_regions):
+                    raise RuntimeError("; ".join(f"{r}: {e}" for r, e in errors.items()))
                 
                 self.logger.info("Instâncias EC2 listadas", {
-                    "region": target_region,
+                    "regions": target_regions,
                     "instances_count": len(instances)
                 })
                 
-                return {
+                response = {
                     "success": True,
-                    "data": instances,
-                    "timestamp": datetime.now().isoformat()
+                    "data": _to_columns(instances, EC2InstanceRow) if columnar else instances,
+                    "timestamp": self._iso_now()
                 }
+                if errors:
+                    response["errors"] = errors
+                return response
                 
             except Exception as e:
                 self.logger.error(f"Erro ao listar instâncias EC2: {str(e)}")
                 return {"error": str(e)}
         
-        @self.server.tool("get_s3_buckets")
-        async def get_s3_buckets() -> Dict[str, Any]:
+        @self.server.tool("get_s3_buckets", cache=True, ttl=_TOOL_TTLS['get_s3_buckets'])
+        async def get_s3_buckets(columnar: bool = False) -> Dict[str, Any]:
             """
             Lista buckets S3
+            
+            Args:
+                columnar: Retorna os dados em colunas (um array por campo)
             """
             try:
-                if not self.aws_session:
+                if not await self._ensure_aws():
                     return {"error": "AWS não conectada"}
                 
-                s3 = self.aws_session.client('s3')
-                
-                response = s3.list_buckets()
-                
-                buckets = []
-                for bucket in response['Buckets']:
-                    # Obter região do bucket
-                    try:
-                        location = s3.get_bucket_location(Bucket=bucket['Name'])
-                        region = location['LocationConstraint'] or 'us-east-1'
-                    except:
-                        region = 'unknown'
-                    
-                    buckets.append({
-                        'Name': bucket['Name'],
-                        'CreationDate': bucket['CreationDate'].isoformat(),
-                        'Region': region
-                    })
+                s3 = self._client('s3')
+                
+                response = await self._run(s3.list_buckets)
+                
+                # ListBuckets já informa BucketRegion nas versões recentes da API;
+                # senão, HEAD em paralelo nos buckets sem região
+                missing = [
+                    bucket['Name'] for bucket in response['Buckets']
+                    if not bucket.get('BucketRegion')
+                ]
+                looked_up = dict(zip(missing, await asyncio.gather(*(
+                    self._run(self._bucket_region, s3, name)
+                    for name in missing
+                ))))
+                
+                buckets = [
+                    S3BucketRow(
+                        bucket['Name'],
+                        bucket['CreationDate'],
+                        bucket.get('BucketRegion') or looked_up[bucket['Name']]
+                    )
+                    for bucket in response['Buckets']
+                ]
                 
                 self.logger.info("Buckets S3 listados", {
                     "buckets_count": len(buckets)
@@ -253,57 +647,82 @@ class AWSMCPServer:
                 
                 return {
                     "success": True,
-                    "data": buckets,
-                    "timestamp": datetime.now().isoformat()
+                    "data": _to_columns(buckets, S3BucketRow) if columnar else buckets,
+                    "timestamp": self._iso_now()
                 }
                 
             except Exception as e:
                 self.logger.error(f"Erro ao listar buckets S3: {str(e)}")
                 return {"error": str(e)}
         
-        @self.server.tool("get_rds_instances")
-        async def get_rds_instances(region: Optional[str] = None) -> Dict[str, Any]:
+        @self.server.tool("get_rds_instances", cache=True, ttl=_TOOL_TTLS['get_rds_instances'])
+        async def get_rds_instances(
+            region: Optional[str] = None,
+            regions: Optional[List[str]] = None,
+            columnar: bool = False
+        ) -> Dict[str, Any]:
             """
             Lista instâncias RDS
             
             Args:
                 region: Região específica (opcional)
+                regions: Várias regiões consultadas em paralelo, ou ["all"]
+                    para todas as regiões habilitadas (opcional)
+                columnar: Retorna os dados em colunas (um array por campo)
             """
             try:
-                if not self.aws_session:
+                if not await self._ensure_aws():
                     return {"error": "AWS não conectada"}
                 
-                target_region = region or config.aws.region
-                rds = self.aws_session.client('rds', region_name=target_region)
-                
-                response = rds.describe_db_instances()
+                target_regions = (
+                    await self._resolve_regions(regions) if regions
+                    else [region or self._default_region]
+                )
+                instances, errors = await self._list_in_regions('rds', _list_rds_instances, target_regions)
                 
-                instances = []
-                for instance in response['DBInstances']:
-                    instances.append({
-                        'DBInstanceIdentifier': instance['DBInstanceIdentifier'],
-                        'DBInstanceClass': instance['DBInstanceClass'],
-                        'Engine': instance['Engine'],
-                        'DBInstanceStatus': instance['DBInstanceStatus'],
-                        'AllocatedStorage': instance['AllocatedStorage'],
-                        'Region': target_region
-                    })
+                if len(errors) == len(target_regions):
+                    raise RuntimeError("; ".join(f"{r}: {e}" for r, e in errors.items()))
                 
                 self.logger.info("Instâncias RDS listadas", {
-                    "region": target_region,
+                    "regions": target_regions,
                     "instances_count": len(instances)
                 })
                 
-                return {
+                response = {
                     "success": True,
-                    "data": instances,
-                    "timestamp": datetime.now().isoformat()
+                    "data": _to_columns(instances, RDSInstanceRow) if columnar else instances,
+                    "timestamp": self._iso_now()
                 }
+                if errors:
+                    response["errors"] = errors
+                return response
                 
             except Exception as e:
                 self.logger.error(f"Erro ao listar instâncias RDS: {str(e)}")
                 return {"error": str(e)}
     
+        @self.server.tool("refresh")
+        async def refresh(tool_name: Optional[str] = None) -> Dict[str, Any]:
+            """
+            Invalida respostas em cache
+            
+            Args:
+                tool_name: Ferramenta específica (opcional; padrão: todas)
+            """
+            if tool_name and tool_name not in _TOOL_TTLS:
+                return {"error": f"Ferramenta sem cache: {tool_name}"}
+            
+            self.server.clear_cache(tool_name)
+            self.logger.info("Cache de ferramentas AWS invalidado", {
+                "tool": tool_name or "all"
+            })
+            
+            return {
+                "success": True,
+                "refreshed": tool_name or "all",
+                "timestamp": self._iso_now()
+            }
+    
     def _register_resources(self):
         """Registra recursos MCP para AWS"""
         
@@ -313,21 +732,19 @@ class AWSMCPServer:
             Recurso que fornece resumo do Cost Explorer
             """
             try:
-                # Obter dados dos últimos 30 dias
-                end_date = datetime.now()
-                start_date = end_date - timedelta(days=30)
-                
-                cost_data = await self.server.tools["get_cost_and_usage"](
-                    start_date.strftime('%Y-%m-%d'),
-                    end_date.strftime('%Y-%m-%d'),
-                    "MONTHLY",
-                    ["SERVICE"]
-                )
+                # Servido da memória; atualizado em background por start_server
+                if self._summary_cache is None:
+                    cost_data = await self._refresh_summary()
+                    if self._summary_cache is None:
+                        return {"error": cost_data.get("error")}
+                
+                cost_data, cached_at = self._summary_cache
                 
                 return {
                     "resource_type": "cost_summary",
                     "data": cost_data,
-                    "last_updated": datetime.now().isoformat()
+                    "cached_at": cached_at.isoformat(),
+                    "last_updated": cached_at.isoformat()
                 }
                 
             except Exception as e:
@@ -339,8 +756,16 @@ class AWSMCPServer:
             Recurso que fornece todas as recomendações AWS
             """
             try:
-                rightsizing = await self.server.tools["get_rightsizing_recommendations"]()
-                reserved_instances = await self.server.tools["get_reserved_instances_recommendations"]()
+                # Consultas independentes: executadas em paralelo, e a falha de
+                # uma não descarta o resultado da outra
+                rightsizing, reserved_instances = [
+                    {"error": str(result)} if isinstance(result, Exception) else result
+                    for result in await asyncio.gather(
+                        self.server.tools["get_rightsizing_recommendations"](),
+                        self.server.tools["get_reserved_instances_recommendations"](),
+                        return_exceptions=True
+                    )
+                ]
                 
                 return {
                     "resource_type": "recommendations",
@@ -348,23 +773,59 @@ class AWSMCPServer:
                         "rightsizing": rightsizing,
                         "reserved_instances": reserved_instances
                     },
-                    "last_updated": datetime.now().isoformat()
+                    "last_updated": self._iso_now()
                 }
                 
             except Exception as e:
                 return {"error": str(e)}
     
+    async def _refresh_summary(self) -> Dict[str, Any]:
+        """Consulta os custos dos últimos 30 dias e atualiza o resumo em memória"""
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=30)
+        
+        cost_data = await self.server.tools["get_cost_and_usage"](
+            start_date.strftime('%Y-%m-%d'),
+            end_date.strftime('%Y-%m-%d'),
+            "MONTHLY",
+            ["SERVICE"]
+        )
+        
+        if "error" not in cost_data:
+            self._summary_cache = (cost_data, datetime.now())
+        return cost_data
+    
+    async def _refresh_summary_loop(self):
+        """Atualiza o resumo periodicamente (com jitter entre réplicas)"""
+        while True:
+            try:
+                await self._refresh_summary()
+            except Exception as e:
+                self.logger.error(f"Erro ao atualizar resumo de custos AWS: {str(e)}")
+            await asyncio.sleep(_SUMMARY_REFRESH_INTERVAL + random.uniform(0, 60))
+    
     async def start_server(self, host: str = "0.0.0.0", port: int = None):
         """Inicia o servidor MCP"""
         server_port = port or config.mcp.aws_port
+        refresher = None
         
         try:
             self.logger.info(f"Iniciando AWS MCP Server em {host}:{server_port}")
+            refresher = asyncio.create_task(self._refresh_summary_loop())
             await self.server.start(host=host, port=server_port)
             
         except Exception as e:
             self.logger.error(f"Erro ao iniciar AWS MCP Server: {str(e)}")
             raise
+        
+        finally:
+            if refresher is not None:
+                refresher.cancel()
+            self.close()
+    
+    def close(self):
+        """Libera o pool de threads do servidor"""
+        self._pool.shutdown(wait=False, cancel_futures=True)
     
     def get_server_info(self) -> Dict[str, Any]:
         """Retorna informações do servidor"""
@@ -5,12 +5,22 @@ Responsável por conectar à API de custos do Google Cloud e fornecer dados para
 import os
 import sys
 import asyncio
+import hashlib
 import json
-from typing import Dict, List, Any, Optional
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime, timedelta
+from pathlib import Path
 from google.cloud import billing_v1, compute_v1, storage, bigquery
 from google.oauth2 import service_account
 from google.auth import default
+from google.auth.transport.requests import AuthorizedSession, Request
+from googleapiclient import discovery
+from requests.adapters import HTTPAdapter
 
 # Adicionar o diretório raiz ao path
 sys.path.append(os.path.join(os.path.dirname(__file__), '../..'))
@@ -19,22 +29,213 @@ from mcp import MCPServer, Tool, Resource
 from config.project_config import config
 from agents.base.logger import AgentLogger
 
+# Validade (segundos) dos metadados de datasets BigQuery em memória
+_DATASET_CACHE_TTL = 300
+
+# Validade (segundos) das respostas em cache por ferramenta (somente leitura)
+_TOOL_TTLS = {
+    'get_billing_accounts': 300,
+    'get_project_billing_info': 300,
+    'get_storage_buckets': 300,
+    'get_bigquery_datasets': 300,
+}
+
+# Conexões HTTP mantidas por host na sessão compartilhada (padrão do
+# requests: 10, abaixo do número de chamadas em paralelo nas threads)
+_HTTP_POOL_SIZE = 64
+
+# Chamadas simultâneas por API (abaixo das cotas por minuto), para que os
+# fan-outs com gather não disparem 429 e tempestades de retry
+_API_CONCURRENCY = {
+    'billing': 20,
+    'compute': 40,
+    'storage': 40,
+    'bigquery': 10,
+    'cloudkms': 10,
+}
+
+# Intervalo (segundos) da renovação antecipada do token de acesso (expira em 1h)
+_CREDENTIALS_REFRESH_INTERVAL = 1800
+
+# Estimativas de dry-run em disco: diretório, validade (segundos) e versão
+# do formato (entra na chave; incrementar invalida as entradas antigas)
+_CACHE_DIR = Path(os.getenv('GCP_MCP_CACHE_DIR', './gcp_mcp_cache'))
+_DRY_RUN_TTL = 86400
+_DRY_RUN_CACHE_VERSION = 1
+
+
+class _DryRunCache:
+    """
+    Cache persistente (SQLite) das estimativas de custo de dry-run
+    
+    O dry-run é determinístico para a mesma query e projeto; as entradas
+    expiram para acompanhar o crescimento das tabelas. get/set rodam fora do
+    event loop (threads do pool), então a conexão é compartilhada sob lock.
+    """
+    
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS dry_run "
+            "(key TEXT PRIMARY KEY, expires_at REAL, value TEXT)"
+        )
+    
+    @staticmethod
+    def key(project_id: str, query: str) -> str:
+        return hashlib.sha256(
+            f"{_DRY_RUN_CACHE_VERSION}\0{project_id}\0{query}".encode()
+        ).hexdigest()
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM dry_run WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def set(self, key: str, value: Dict[str, Any], expire: float = _DRY_RUN_TTL):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO dry_run VALUES (?, ?, ?)",
+                (key, time.time() + expire, json.dumps(value))
+            )
+    
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+# Colunas das respostas columnar=True de instâncias Compute Engine
+_INSTANCE_COLUMNS = ('name', 'machine_type', 'status', 'zone', 'creation_timestamp', 'cpu_platform')
+
+
+def _instance_to_row(instance, zone: str) -> Tuple[Any, ...]:
+    """Converte uma instância Compute Engine em tupla (ordem de _INSTANCE_COLUMNS)"""
+    return (
+        instance.name,
+        instance.machine_type.rpartition('/')[2],
+        instance.status,
+        zone,
+        instance.creation_timestamp,
+        instance.cpu_platform
+    )
+
+
+def _instance_to_dict(instance, zone: str) -> Dict[str, Any]:
+    """Converte uma instância Compute Engine no dict das respostas"""
+    return {
+        'name': instance.name,
+        'machine_type': instance.machine_type.rpartition('/')[2],
+        'status': instance.status,
+        'zone': zone,
+        'creation_timestamp': instance.creation_timestamp,
+        'cpu_platform': instance.cpu_platform
+    }
+
+
+def _list_zone_instances(compute_client, project_id: str, zone: str,
+                         page_size: Optional[int] = None,
+                         page_token: Optional[str] = None,
+                         convert=_instance_to_dict) -> Tuple[List[Any], Optional[str]]:
+    """
+    Lista as instâncias de uma zona (apenas uma página se page_size for informado)
+    
+    Returns:
+        Tupla (instâncias convertidas com convert, token da próxima página ou None)
+    """
+    request = compute_v1.ListInstancesRequest(
+        project=project_id,
+        zone=zone,
+        max_results=page_size or 500,
+        page_token=page_token or ''
+    )
+    pager = compute_client.list(request=request)
+    if page_size is None:
+        return [convert(instance, zone) for instance in pager], None
+    
+    page = next(iter(pager.pages), None)
+    if page is None:
+        return [], None
+    return [convert(instance, zone) for instance in page.items], page.next_page_token or None
+
+
+def _first_page(iterator) -> Tuple[List[Any], Optional[str]]:
+    """Lê apenas a primeira página de um iterador paginado (google-api-core)"""
+    page = next(iterator.pages, None)
+    items = list(page) if page is not None else []
+    return items, iterator.next_page_token
+
+
+def _list_all_instances(compute_client, project_id: str, convert=_instance_to_dict) -> List[Any]:
+    """Lista as instâncias de todas as zonas com aggregatedList (uma chamada paginada)"""
+    request = compute_v1.AggregatedListInstancesRequest(
+        project=project_id,
+        max_results=500,
+        return_partial_success=True
+    )
+    return [
+        convert(instance, scope.rpartition('/')[2])
+        for scope, scoped_list in compute_client.aggregated_list(request=request)
+        for instance in scoped_list.instances
+    ]
+
+
 class GCPMCPServer:
     """
     Servidor MCP para GCP - Fornece acesso às APIs de custos e recursos do Google Cloud
+    
+    Use GCPMCPServer.instance(): os clientes GCP (canais gRPC, sessões HTTP,
+    credenciais) são criados uma vez e reutilizados durante todo o processo.
+    
+    As respostas mantêm os datetimes do SDK; a serialização fica a cargo do
+    MCPServer.encode (orjson).
     """
     
+    _instance: Optional['GCPMCPServer'] = None
+    _instance_lock = threading.Lock()
+    
+    @classmethod
+    def instance(cls) -> 'GCPMCPServer':
+        """Retorna o servidor do processo, criando-o na primeira chamada"""
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+    
     def __init__(self):
         self.logger = AgentLogger("GCPMCPServer")
         self.server = MCPServer("gcp-cost-api")
         self.credentials = None
         self.clients = {}
+        # Sessão HTTP autenticada compartilhada pelos clientes REST
+        self._http = None
+        # Metadados por (projeto, dataset): (momento da consulta, dict da resposta)
+        self._dataset_cache: Dict[Tuple[str, str], Tuple[float, Dict[str, Any]]] = {}
+        # Sem diretório gravável o servidor funciona sem o cache de dry-run
+        try:
+            self._dryrun_cache = _DryRunCache(_CACHE_DIR / 'dryrun.sqlite3')
+        except (OSError, sqlite3.Error) as e:
+            self.logger.warning(f"Cache de dry-run indisponível: {str(e)}")
+            self._dryrun_cache = None
+        # Serviços discovery (googleapiclient) por (api, versão); o transporte
+        # httplib2 não é thread-safe, então as chamadas passam pelo lock
+        self._services: Dict[Tuple[str, str], Any] = {}
+        self._services_lock = threading.Lock()
+        # Timestamp das respostas: (segundo, ISO) formatado uma vez por segundo
+        self._ts_cache = (0, '')
+        self._limits = {api: asyncio.Semaphore(limit) for api, limit in _API_CONCURRENCY.items()}
         self._initialize_gcp_connection()
         self._register_tools()
         self._register_resources()
     
     def _initialize_gcp_connection(self):
-        """Inicializa conexão com GCP"""
+        """Inicializa conexão com GCP (uma única vez)"""
+        if self.clients:
+            return
+        
         try:
             if config.gcp.credentials_path and os.path.exists(config.gcp.credentials_path):
                 self.credentials = service_account.Credentials.from_service_account_file(
@@ -44,13 +245,32 @@ class GCPMCPServer:
                 # Tentar usar credenciais padrão
                 self.credentials, _ = default()
             
-            # Inicializar clientes GCP
-            self.clients = {
-                'billing': billing_v1.CloudBillingClient(credentials=self.credentials),
-                'compute': compute_v1.InstancesClient(credentials=self.credentials),
-                'storage': storage.Client(credentials=self.credentials, project=config.gcp.project_id),
-                'bigquery': bigquery.Client(credentials=self.credentials, project=config.gcp.project_id)
+            # Storage e BigQuery usam a mesma sessão (um pool de conexões);
+            # todos os clientes compartilham as credenciais, renovadas em
+            # background por _refresh_credentials_loop
+            self._http = AuthorizedSession(self.credentials)
+            adapter = HTTPAdapter(pool_connections=_HTTP_POOL_SIZE, pool_maxsize=_HTTP_POOL_SIZE)
+            self._http.mount('https://', adapter)
+            
+            # Inicializar clientes GCP em paralelo (cada um carrega transporte
+            # e configuração próprios). Billing usa o cliente gRPC assíncrono
+            # nativo, criado nesta thread: o canal aio se associa ao event loop
+            # da thread que o cria
+            constructors = {
+                'compute': lambda: compute_v1.InstancesClient(credentials=self.credentials),
+                'storage': lambda: storage.Client(
+                    credentials=self.credentials, project=config.gcp.project_id, _http=self._http
+                ),
+                'bigquery': lambda: bigquery.Client(
+                    credentials=self.credentials, project=config.gcp.project_id, _http=self._http
+                )
             }
+            with ThreadPoolExecutor(max_workers=len(constructors)) as executor:
+                futures = {name: executor.submit(ctor) for name, ctor in constructors.items()}
+                billing_client = billing_v1.CloudBillingAsyncClient(credentials=self.credentials)
+                clients = {name: future.result() for name, future in futures.items()}
+            
+            self.clients = {'billing': billing_client, **clients}
             
             self.logger.info("GCP MCP Server conectado", {
                 "project_id": config.gcp.project_id,
@@ -61,10 +281,75 @@ class GCPMCPServer:
             self.logger.error(f"Erro na conexão GCP MCP: {str(e)}")
             self.credentials = None
     
+    def _iso_now(self) -> str:
+        """Timestamp ISO (resolução de segundos) das respostas"""
+        sec = int(time.time())
+        cached_sec, iso = self._ts_cache
+        if sec != cached_sec:
+            iso = datetime.fromtimestamp(sec).isoformat()
+            self._ts_cache = (sec, iso)
+        return iso
+    
+    async def _run(self, func, *args, **kwargs):
+        """Executa uma chamada bloqueante do SDK GCP fora do event loop"""
+        return await asyncio.to_thread(func, *args, **kwargs)
+    
+    async def _call(self, api: str, func, *args, **kwargs):
+        """Executa uma chamada bloqueante da API respeitando o limite de concorrência dela"""
+        async with self._limits[api]:
+            return await self._run(func, *args, **kwargs)
+    
+    def _discovery_service(self, api: str, version: str):
+        """
+        Obtém (ou cria uma única vez) o serviço discovery da API; chamar com o lock
+        
+        static_discovery usa o documento discovery embutido no
+        google-api-python-client, sem o GET HTTPS a cada build.
+        """
+        service = self._services.get((api, version))
+        if service is None:
+            service = self._services[(api, version)] = discovery.build(
+                api, version, credentials=self.credentials,
+                cache_discovery=False, static_discovery=True
+            )
+        return service
+    
+    def _batch_list_key_rings(self, locations: List[str]) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        """
+        Lista os key rings do Cloud KMS de várias localizações em uma única
+        requisição HTTP batch (multipart)
+        
+        Returns:
+            Tupla (key rings por localização, erros por localização)
+        """
+        results, errors = {}, {}
+        
+        def _on_response(location, response, exception):
+            if exception is not None:
+                errors[location] = str(exception)
+            else:
+                results[location] = response.get('keyRings', [])
+        
+        with self._services_lock:
+            service = self._discovery_service('cloudkms', 'v1')
+            key_rings = service.projects().locations().keyRings()
+            batch = service.new_batch_http_request(callback=_on_response)
+            for location in locations:
+                batch.add(
+                    key_rings.list(
+                        parent=f"projects/{config.gcp.project_id}/locations/{location}",
+                        pageSize=1000
+                    ),
+                    request_id=location
+                )
+            batch.execute()
+        
+        return results, errors
+    
     def _register_tools(self):
         """Registra ferramentas MCP para GCP"""
         
-        @self.server.tool("get_billing_accounts")
+        @self.server.tool("get_billing_accounts", cache=True, ttl=_TOOL_TTLS['get_billing_accounts'])
         async def get_billing_accounts() -> Dict[str, Any]:
             """
             Lista contas de billing do GCP
@@ -77,29 +362,31 @@ class GCPMCPServer:
                 
                 # Listar contas de billing
                 billing_accounts = []
-                for account in billing_client.list_billing_accounts():
-                    billing_accounts.append({
-                        'name': account.name,
-                        'display_name': account.display_name,
-                        'open': account.open,
-                        'master_billing_account': account.master_billing_account
+                async with self._limits['billing']:
+                    async for account in await billing_client.list_billing_accounts():
+                        billing_accounts.append({
+                            'name': account.name,
+                            'display_name': account.display_name,
+                            'open': account.open,
+                            'master_billing_account': account.master_billing_account
+                        })
+                
+                if self.logger.isEnabledFor(logging.INFO):
+                    self.logger.info("Contas de billing GCP listadas", {
+                        "accounts_count": len(billing_accounts)
                     })
                 
-                self.logger.info("Contas de billing GCP listadas", {
-                    "accounts_count": len(billing_accounts)
-                })
-                
                 return {
                     "success": True,
                     "data": billing_accounts,
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": self._iso_now()
                 }
                 
             except Exception as e:
                 self.logger.error(f"Erro ao obter contas de billing: {str(e)}")
                 return {"error": str(e)}
         
-        @self.server.tool("get_project_billing_info")
+        @self.server.tool("get_project_billing_info", cache=True, ttl=_TOOL_TTLS['get_project_billing_info'])
         async def get_project_billing_info(project_id: Optional[str] = None) -> Dict[str, Any]:
             """
             Obtém informações de billing de um projeto
@@ -116,12 +403,14 @@ class GCPMCPServer:
                 
                 # Obter informações de billing do projeto
                 project_name = f"projects/{target_project}"
-                billing_info = billing_client.get_project_billing_info(name=project_name)
+                async with self._limits['billing']:
+                    billing_info = await billing_client.get_project_billing_info(name=project_name)
                 
-                self.logger.info("Informações de billing obtidas", {
-                    "project_id": target_project,
-                    "billing_enabled": billing_info.billing_enabled
-                })
+                if self.logger.isEnabledFor(logging.INFO):
+                    self.logger.info("Informações de billing obtidas", {
+                        "project_id": target_project,
+                        "billing_enabled": billing_info.billing_enabled
+                    })
                 
                 return {
                     "success": True,
@@ -131,7 +420,7 @@ class GCPMCPServer:
                         "billing_enabled": billing_info.billing_enabled,
                         "name": billing_info.name
                     },
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": self._iso_now()
                 }
                 
             except Exception as e:
@@ -139,55 +428,115 @@ class GCPMCPServer:
                 return {"error": str(e)}
         
         @self.server.tool("get_compute_instances")
-        async def get_compute_instances(zone: str = "us-central1-a") -> Dict[str, Any]:
+        async def get_compute_instances(zone: str = "us-central1-a",
+                                        zones: Optional[List[str]] = None,
+                                        page_size: Optional[int] = None,
+                                        page_token: Optional[str] = None,
+                                        columnar: bool = False) -> Dict[str, Any]:
             """
             Lista instâncias Compute Engine
             
             Args:
                 zone: Zona do GCP (padrão: us-central1-a)
+                zones: Lista de zonas consultadas em paralelo (substitui zone)
+                page_size: Retorna apenas uma página com até page_size instâncias
+                    e o next_page_token para continuar (somente com zone)
+                page_token: Token retornado pela página anterior
+                columnar: Se True, retorna {"columns": [...], "rows": [[...]]}
+                    em vez de um dict por instância
             """
             try:
                 if not self.credentials:
                     return {"error": "GCP não conectado"}
+                if zones and (page_size or page_token):
+                    return {"error": "Paginação disponível apenas para uma zona"}
                 
                 compute_client = self.clients['compute']
-                
-                # Listar instâncias na zona especificada
-                request = compute_v1.ListInstancesRequest(
-                    project=config.gcp.project_id,
-                    zone=zone
+                target_zones = zones or [zone]
+                
+                results = await asyncio.gather(
+                    *(self._call('compute', _list_zone_instances, compute_client, config.gcp.project_id, target,
+                                page_size, page_token,
+                                _instance_to_row if columnar else _instance_to_dict)
+                      for target in target_zones),
+                    return_exceptions=True
                 )
                 
-                instances = []
-                for instance in compute_client.list(request=request):
-                    instances.append({
-                        'name': instance.name,
-                        'machine_type': instance.machine_type.split('/')[-1],
-                        'status': instance.status,
-                        'zone': zone,
-                        'creation_timestamp': instance.creation_timestamp,
-                        'cpu_platform': instance.cpu_platform
+                instances, errors = [], {}
+                for target, result in zip(target_zones, results):
+                    if isinstance(result, Exception):
+                        errors[target] = str(result)
+                    else:
+                        instances.extend(result[0])
+                
+                if errors and not zones:
+                    raise results[0]
+                
+                if self.logger.isEnabledFor(logging.INFO):
+                    self.logger.info("Instâncias Compute Engine listadas", {
+                        "zones": target_zones,
+                        "instances_count": len(instances),
+                        "failed_zones": list(errors)
                     })
                 
-                self.logger.info("Instâncias Compute Engine listadas", {
-                    "zone": zone,
-                    "instances_count": len(instances)
-                })
+                response = {
+                    "success": True,
+                    "data": {"columns": _INSTANCE_COLUMNS, "rows": instances} if columnar else instances,
+                    "timestamp": self._iso_now()
+                }
+                if page_size:
+                    response["next_page_token"] = results[0][1]
+                if errors:
+                    response["errors"] = errors
+                return response
+                
+            except Exception as e:
+                self.logger.error(f"Erro ao listar instâncias Compute: {str(e)}")
+                return {"error": str(e)}
+        
+        @self.server.tool("get_all_compute_instances")
+        async def get_all_compute_instances(columnar: bool = False) -> Dict[str, Any]:
+            """
+            Lista instâncias Compute Engine de todas as zonas do projeto
+            
+            Args:
+                columnar: Se True, retorna {"columns": [...], "rows": [[...]]}
+                    em vez de um dict por instância
+            """
+            try:
+                if not self.credentials:
+                    return {"error": "GCP não conectado"}
+                
+                instances = await self._call(
+                    'compute', _list_all_instances, self.clients['compute'], config.gcp.project_id,
+                    _instance_to_row if columnar else _instance_to_dict
+                )
+                
+                if self.logger.isEnabledFor(logging.INFO):
+                    self.logger.info("Instâncias Compute Engine listadas (todas as zonas)", {
+                        "instances_count": len(instances)
+                    })
                 
                 return {
                     "success": True,
-                    "data": instances,
-                    "timestamp": datetime.now().isoformat()
+                    "data": {"columns": _INSTANCE_COLUMNS, "rows": instances} if columnar else instances,
+                    "timestamp": self._iso_now()
                 }
                 
             except Exception as e:
                 self.logger.error(f"Erro ao listar instâncias Compute: {str(e)}")
                 return {"error": str(e)}
         
-        @self.server.tool("get_storage_buckets")
-        async def get_storage_buckets() -> Dict[str, Any]:
+        @self.server.tool("get_storage_buckets", cache=True, ttl=_TOOL_TTLS['get_storage_buckets'])
+        async def get_storage_buckets(page_size: Optional[int] = None,
+                                      page_token: Optional[str] = None) -> Dict[str, Any]:
             """
             Lista buckets Cloud Storage
+            
+            Args:
+                page_size: Retorna apenas uma página com até page_size buckets
+                    e o next_page_token para continuar
+                page_token: Token retornado pela página anterior
             """
             try:
                 if not self.credentials:
@@ -195,34 +544,55 @@ class GCPMCPServer:
                 
                 storage_client = self.clients['storage']
                 
-                buckets = []
-                for bucket in storage_client.list_buckets():
-                    buckets.append({
-                        'name': bucket.name,
-                        'location': bucket.location,
-                        'storage_class': bucket.storage_class,
-                        'time_created': bucket.time_created.isoformat() if bucket.time_created else None,
-                        'metageneration': bucket.metageneration
+                def _fetch():
+                    if page_size:
+                        listed, next_token = _first_page(
+                            storage_client.list_buckets(page_size=page_size, page_token=page_token)
+                        )
+                    else:
+                        listed, next_token = storage_client.list_buckets(), None
+                    
+                    buckets = []
+                    for bucket in listed:
+                        buckets.append({
+                            'name': bucket.name,
+                            'location': bucket.location,
+                            'storage_class': bucket.storage_class,
+                            'time_created': bucket.time_created,
+                            'metageneration': bucket.metageneration
+                        })
+                    return buckets, next_token
+                
+                buckets, next_token = await self._call('storage', _fetch)
+                
+                if self.logger.isEnabledFor(logging.INFO):
+                    self.logger.info("Buckets Cloud Storage listados", {
+                        "buckets_count": len(buckets)
                     })
                 
-                self.logger.info("Buckets Cloud Storage listados", {
-                    "buckets_count": len(buckets)
-                })
-                
-                return {
+                response = {
                     "success": True,
                     "data": buckets,
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": self._iso_now()
                 }
+                if page_size:
+                    response["next_page_token"] = next_token
+                return response
                 
             except Exception as e:
                 self.logger.error(f"Erro ao listar buckets Storage: {str(e)}")
                 return {"error": str(e)}
         
-        @self.server.tool("get_bigquery_datasets")
-        async def get_bigquery_datasets() -> Dict[str, Any]:
+        @self.server.tool("get_bigquery_datasets", cache=True, ttl=_TOOL_TTLS['get_bigquery_datasets'])
+        async def get_bigquery_datasets(page_size: Optional[int] = None,
+                                        page_token: Optional[str] = None) -> Dict[str, Any]:
             """
             Lista datasets BigQuery
+            
+            Args:
+                page_size: Retorna apenas uma página com até page_size datasets
+                    e o next_page_token para continuar
+                page_token: Token retornado pela página anterior
             """
             try:
                 if not self.credentials:
@@ -230,87 +600,207 @@ class GCPMCPServer:
                 
                 bigquery_client = self.clients['bigquery']
                 
-                datasets = []
-                for dataset in bigquery_client.list_datasets():
-                    dataset_info = bigquery_client.get_dataset(dataset.reference)
-                    datasets.append({
-                        'dataset_id': dataset.dataset_id,
-                        'project': dataset.project,
+                if page_size:
+                    listed, next_token = await self._call(
+                        'bigquery', lambda: _first_page(
+                            bigquery_client.list_datasets(page_size=page_size, page_token=page_token)
+                        )
+                    )
+                else:
+                    listed = await self._call('bigquery', lambda: list(bigquery_client.list_datasets()))
+                
+                # list_datasets não traz location/created/description: get_dataset
+                # só para os datasets fora do cache, todos em paralelo
+                now = time.monotonic()
+                cache = self._dataset_cache
+                missing = [
+                    dataset for dataset in listed
+                    if now - cache.get((dataset.project, dataset.dataset_id), (float('-inf'),))[0]
+                    >= _DATASET_CACHE_TTL
+                ]
+                fetched = await asyncio.gather(
+                    *(self._call('bigquery', bigquery_client.get_dataset, dataset.reference) for dataset in missing)
+                )
+                for dataset_info in fetched:
+                    cache[(dataset_info.project, dataset_info.dataset_id)] = (now, {
+                        'dataset_id': dataset_info.dataset_id,
+                        'project': dataset_info.project,
                         'location': dataset_info.location,
-                        'created': dataset_info.created.isoformat() if dataset_info.created else None,
-                        'modified': dataset_info.modified.isoformat() if dataset_info.modified else None,
+                        'created': dataset_info.created,
+                        'modified': dataset_info.modified,
                         'description': dataset_info.description
                     })
                 
-                self.logger.info("Datasets BigQuery listados", {
-                    "datasets_count": len(datasets)
-                })
+                datasets = [cache[(dataset.project, dataset.dataset_id)][1] for dataset in listed]
                 
-                return {
+                if self.logger.isEnabledFor(logging.INFO):
+                    self.logger.info("Datasets BigQuery listados", {
+                        "datasets_count": len(datasets)
+                    })
+                
+                response = {
                     "success": True,
                     "data": datasets,
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": self._iso_now()
                 }
+                if page_size:
+                    response["next_page_token"] = next_token
+                return response
                 
             except Exception as e:
                 self.logger.error(f"Erro ao listar datasets BigQuery: {str(e)}")
                 return {"error": str(e)}
         
         @self.server.tool("execute_bigquery_query")
-        async def execute_bigquery_query(query: str, dry_run: bool = False) -> Dict[str, Any]:
+        async def execute_bigquery_query(query: str, dry_run: bool = False,
+                                         columnar: bool = False,
+                                         page_size: Optional[int] = None,
+                                         page_token: Optional[str] = None,
+                                         job_id: Optional[str] = None) -> Dict[str, Any]:
             """
             Executa query no BigQuery
             
             Args:
                 query: Query SQL para executar
                 dry_run: Se True, apenas valida a query sem executar
+                columnar: Se True, lê o resultado em Arrow (Storage Read API) e
+                    retorna {"columns": [...], "data": {coluna: valores}} em vez
+                    de uma lista de dicts por linha
+                page_size: Retorna apenas uma página com até page_size linhas,
+                    com job_id e next_page_token para ler as seguintes
+                page_token: Token retornado pela página anterior (com job_id;
+                    a query não é executada novamente)
+                job_id: Job da query cujas páginas estão sendo lidas
             """
             try:
                 if not self.credentials:
                     return {"error": "GCP não conectado"}
+                if columnar and page_size:
+                    return {"error": "Paginação não disponível com columnar=True"}
+                if page_token and not job_id:
+                    return {"error": "page_token requer o job_id da primeira página"}
                 
                 bigquery_client = self.clients['bigquery']
                 
-                job_config = bigquery.QueryJobConfig(dry_run=dry_run)
-                query_job = bigquery_client.query(query, job_config=job_config)
-                
                 if dry_run:
-                    return {
-                        "success": True,
-                        "data": {
+                    dryrun_cache = self._dryrun_cache
+                    estimate = None
+                    if dryrun_cache is not None:
+                        cache_key = dryrun_cache.key(config.gcp.project_id, query)
+                        estimate = await self._run(dryrun_cache.get, cache_key)
+                    if estimate is None:
+                        query_job = await self._call(
+                            'bigquery', bigquery_client.query, query,
+                            job_config=bigquery.QueryJobConfig(dry_run=True)
+                        )
+                        estimate = {
                             "bytes_processed": query_job.total_bytes_processed,
                             "bytes_billed": query_job.total_bytes_billed,
                             "dry_run": True
-                        },
-                        "timestamp": datetime.now().isoformat()
+                        }
+                        if dryrun_cache is not None:
+                            await self._run(dryrun_cache.set, cache_key, estimate)
+                    
+                    return {
+                        "success": True,
+                        "data": estimate,
+                        "timestamp": self._iso_now()
                     }
                 else:
-                    results = query_job.result()
+                    if page_token:
+                        query_job = await self._call('bigquery', bigquery_client.get_job, job_id)
+                    else:
+                        job_config = bigquery.QueryJobConfig(dry_run=False)
+                        query_job = await self._call('bigquery', bigquery_client.query, query, job_config=job_config)
                     
-                    rows = []
-                    for row in results:
-                        rows.append(dict(row))
+                    if page_size:
+                        # Uma página por chamada: a memória fica limitada a
+                        # page_size linhas e a primeira página chega sem
+                        # esperar o resultado inteiro
+                        def _fetch():
+                            if page_token:
+                                results = bigquery_client.list_rows(
+                                    query_job.destination, page_size=page_size, page_token=page_token
+                                )
+                            else:
+                                results = query_job.result(page_size=page_size)
+                            page, token = _first_page(results)
+                            return results.total_rows, {"rows": [dict(row) for row in page]}, token
+                    elif columnar:
+                        # Um buffer colunar em vez de um dict por linha
+                        def _fetch():
+                            table = query_job.to_arrow(create_bqstorage_client=True)
+                            return table.num_rows, {
+                                "columns": table.column_names,
+                                "data": table.to_pydict()
+                            }, None
+                    else:
+                        def _fetch():
+                            results = query_job.result()
+                            rows = []
+                            for row in results:
+                                rows.append(dict(row))
+                            return results.total_rows, {"rows": rows}, None
                     
-                    self.logger.info("Query BigQuery executada", {
-                        "rows_returned": len(rows),
-                        "bytes_processed": query_job.total_bytes_processed
-                    })
+                    total_rows, result_data, next_token = await self._call('bigquery', _fetch)
                     
-                    return {
+                    if self.logger.isEnabledFor(logging.INFO):
+                        self.logger.info("Query BigQuery executada", {
+                            "rows_returned": total_rows,
+                            "bytes_processed": query_job.total_bytes_processed
+                        })
+                    
+                    response = {
                         "success": True,
                         "data": {
-                            "rows": rows,
-                            "total_rows": results.total_rows,
+                            **result_data,
+                            "total_rows": total_rows,
                             "bytes_processed": query_job.total_bytes_processed,
                             "job_id": query_job.job_id
                         },
-                        "timestamp": datetime.now().isoformat()
+                        "timestamp": self._iso_now()
                     }
+                    if page_size:
+                        response["next_page_token"] = next_token
+                    return response
                 
             except Exception as e:
                 self.logger.error(f"Erro ao executar query BigQuery: {str(e)}")
                 return {"error": str(e)}
         
+        @self.server.tool("get_multi_region_inventory")
+        async def get_multi_region_inventory(locations: List[str]) -> Dict[str, Any]:
+            """
+            Lista key rings do Cloud KMS em várias localizações (uma requisição batch)
+            
+            Args:
+                locations: Localizações do GCP (ex: ["us-central1", "europe-west1"])
+            """
+            try:
+                if not self.credentials:
+                    return {"error": "GCP não conectado"}
+                
+                key_rings, errors = await self._call('cloudkms', self._batch_list_key_rings, locations)
+                
+                if self.logger.isEnabledFor(logging.INFO):
+                    self.logger.info("Key rings KMS listados", {
+                        "locations_count": len(locations),
+                        "failed_locations": list(errors)
+                    })
+                
+                response = {
+                    "success": True,
+                    "data": key_rings,
+                    "timestamp": self._iso_now()
+                }
+                if errors:
+                    response["errors"] = errors
+                return response
+                
+            except Exception as e:
+                self.logger.error(f"Erro ao listar inventário multi-região: {str(e)}")
+                return {"error": str(e)}
+        
         @self.server.tool("get_recommender_recommendations")
         async def get_recommender_recommendations(recommender_type: str = "google.compute.instance.MachineTypeRecommender") -> Dict[str, Any]:
             """
@@ -337,15 +827,16 @@ class GCPMCPServer:
                     ]
                 }
                 
-                self.logger.info("Recomendações GCP obtidas", {
-                    "recommender_type": recommender_type,
-                    "recommendations_count": len(recommendations["recommendations"])
-                })
+                if self.logger.isEnabledFor(logging.INFO):
+                    self.logger.info("Recomendações GCP obtidas", {
+                        "recommender_type": recommender_type,
+                        "recommendations_count": len(recommendations["recommendations"])
+                    })
                 
                 return {
                     "success": True,
                     "data": recommendations,
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": self._iso_now()
                 }
                 
             except Exception as e:
@@ -354,6 +845,14 @@ class GCPMCPServer:
     
     def _register_resources(self):
         """Registra recursos MCP para GCP"""
+        # Ferramentas resolvidas uma vez no registro (versões com cache);
+        # um nome inexistente falha aqui, não na primeira requisição
+        tools = self.server.tools
+        get_billing_accounts = tools["get_billing_accounts"]
+        get_project_billing_info = tools["get_project_billing_info"]
+        get_compute_instances = tools["get_compute_instances"]
+        get_storage_buckets = tools["get_storage_buckets"]
+        get_bigquery_datasets = tools["get_bigquery_datasets"]
         
         @self.server.resource("gcp://billing/summary")
         async def billing_summary() -> Dict[str, Any]:
@@ -361,8 +860,16 @@ class GCPMCPServer:
             Recurso que fornece resumo de billing
             """
             try:
-                billing_accounts = await self.server.tools["get_billing_accounts"]()
-                project_billing = await self.server.tools["get_project_billing_info"]()
+                # Consultas independentes: executadas em paralelo, e a falha de
+                # uma não descarta o resultado da outra
+                billing_accounts, project_billing = [
+                    {"error": str(result)} if isinstance(result, Exception) else result
+                    for result in await asyncio.gather(
+                        get_billing_accounts(),
+                        get_project_billing_info(),
+                        return_exceptions=True
+                    )
+                ]
                 
                 return {
                     "resource_type": "billing_summary",
@@ -370,7 +877,7 @@ class GCPMCPServer:
                         "billing_accounts": billing_accounts,
                         "project_billing": project_billing
                     },
-                    "last_updated": datetime.now().isoformat()
+                    "last_updated": self._iso_now()
                 }
                 
             except Exception as e:
@@ -382,9 +889,16 @@ class GCPMCPServer:
             Recurso que fornece inventário de recursos
             """
             try:
-                compute_instances = await self.server.tools["get_compute_instances"]()
-                storage_buckets = await self.server.tools["get_storage_buckets"]()
-                bigquery_datasets = await self.server.tools["get_bigquery_datasets"]()
+                # As listagens rodam em threads: disparadas juntas se sobrepõem
+                compute_instances, storage_buckets, bigquery_datasets = [
+                    {"error": str(result)} if isinstance(result, Exception) else result
+                    for result in await asyncio.gather(
+                        get_compute_instances(),
+                        get_storage_buckets(),
+                        get_bigquery_datasets(),
+                        return_exceptions=True
+                    )
+                ]
                 
                 return {
                     "resource_type": "resources_inventory",
@@ -393,23 +907,80 @@ class GCPMCPServer:
                         "storage_buckets": storage_buckets,
                         "bigquery_datasets": bigquery_datasets
                     },
-                    "last_updated": datetime.now().isoformat()
+                    "last_updated": self._iso_now()
                 }
                 
             except Exception as e:
                 return {"error": str(e)}
     
+    async def _warmup(self):
+        """
+        Faz uma chamada mínima por cliente para abrir as conexões (TLS,
+        HTTP/2) antes da primeira ferramenta; falhas apenas geram aviso
+        """
+        clients = self.clients
+        results = await asyncio.gather(
+            clients['billing'].list_billing_accounts(request={'page_size': 1}),
+            self._run(lambda: next(iter(clients['compute'].list(request=compute_v1.ListInstancesRequest(
+                project=config.gcp.project_id, zone='us-central1-a', max_results=1
+            )).pages), None)),
+            self._run(lambda: next(iter(clients['storage'].list_buckets(max_results=1)), None)),
+            self._run(lambda: next(iter(clients['bigquery'].list_datasets(max_results=1)), None)),
+            return_exceptions=True
+        )
+        
+        failed = {
+            name: str(result)
+            for name, result in zip(('billing', 'compute', 'storage', 'bigquery'), results)
+            if isinstance(result, Exception)
+        }
+        if failed:
+            self.logger.warning("Pré-aquecimento de clientes GCP incompleto", {"errors": failed})
+    
+    async def _refresh_credentials_loop(self):
+        """
+        Renova o token das credenciais compartilhadas antes de expirar
+        
+        Uma renovação por processo em vez de uma por cliente, e sem que as
+        requisições encontrem o token expirado.
+        """
+        while True:
+            await asyncio.sleep(_CREDENTIALS_REFRESH_INTERVAL)
+            try:
+                await self._run(self.credentials.refresh, Request())
+            except Exception as e:
+                self.logger.error(f"Erro ao renovar credenciais GCP: {str(e)}")
+    
     async def start_server(self, host: str = "0.0.0.0", port: int = None):
         """Inicia o servidor MCP"""
         server_port = port or config.mcp.gcp_port
+        refresher = None
         
         try:
             self.logger.info(f"Iniciando GCP MCP Server em {host}:{server_port}")
+            if self.credentials:
+                await self._warmup()
+                refresher = asyncio.create_task(self._refresh_credentials_loop())
             await self.server.start(host=host, port=server_port)
             
         except Exception as e:
             self.logger.error(f"Erro ao iniciar GCP MCP Server: {str(e)}")
             raise
+        
+        finally:
+            if refresher is not None:
+                refresher.cancel()
+            self.close()
+    
+    def close(self):
+        """Libera a sessão HTTP e o cache de dry-run; o próximo instance() cria outro servidor"""
+        if self._http is not None:
+            self._http.close()
+        if self._dryrun_cache is not None:
+            self._dryrun_cache.close()
+        with GCPMCPServer._instance_lock:
+            if GCPMCPServer._instance is self:
+                GCPMCPServer._instance = None
     
     def get_server_info(self) -> Dict[str, Any]:
         """Retorna informações do servidor"""
@@ -426,7 +997,7 @@ class GCPMCPServer:
 
 async def main():
     """Função principal para executar o servidor"""
-    gcp_mcp = GCPMCPServer()
+    gcp_mcp = GCPMCPServer.instance()
     
     try:
         await gcp_mcp.start_server()
@@ -6,18 +6,25 @@ import os
 import sys
 import asyncio
 import json
-from typing import Dict, List, Any, Optional
+import time
+import base64
+import functools
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
 import hashlib
 from google.cloud import storage
 from google.oauth2 import service_account
 from google.auth import default
-import PyPDF2
+import pypdfium2 as pdfium
 import io
-import openai
+from openai import AsyncOpenAI
 from sentence_transformers import SentenceTransformer
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+import faiss
 import pickle
 
 # Adicionar o diretório raiz ao path
@@ -27,6 +34,215 @@ from mcp import MCPServer, Tool, Resource
 from config.project_config import config
 from agents.base.logger import AgentLogger
 
+# Cache semântico de respostas: pergunta com cosseno >= limiar em relação a
+# uma pergunta anterior (mesmo escopo) reaproveita a resposta gerada
+_QA_CACHE_THRESHOLD = 0.85
+_QA_CACHE_MAX = 1024
+_QA_CACHE_TTL = 300
+_QA_CACHE_CANDIDATES = 8
+
+# Candidatos buscados no índice int8 e reordenados com os vetores float32
+_RERANK_CANDIDATES = 100
+
+# Grafo HNSW do índice de chunks (efSearch >= candidatos do rerank)
+_HNSW_M = 32
+_HNSW_EF_CONSTRUCTION = 200
+_HNSW_EF_SEARCH = 128
+
+# Lote do SentenceTransformer na geração de embeddings
+_ENCODE_BATCH_SIZE = 64
+_EMBEDDINGS_MODEL = 'all-MiniLM-L6-v2'
+
+# Cache em disco de texto extraído e embeddings, chaveado pelo md5 do PDF
+_CACHE_DIR = Path(os.getenv('RAG_CACHE_DIR', './rag_mcp_cache'))
+_DOCUMENT_CACHE_VERSION = 2
+# Entra na chave dos embeddings; muda quando as fronteiras dos chunks mudam
+_CHUNKER_VERSION = 2
+
+# O PDFium não é thread-safe: nenhuma chamada pode rodar em paralelo, nem
+# sobre documentos diferentes (a extração roda no pool de I/O)
+_PDFIUM_LOCK = threading.Lock()
+
+
+def _content_key(md5_hash: Optional[str]) -> Optional[str]:
+    """Chave (hex) do conteúdo a partir do md5_hash base64 do GCS"""
+    if not md5_hash:
+        return None
+    return base64.b64decode(md5_hash).hex()
+
+
+def _extract_pdf_pages(pdf_content: bytes) -> List[str]:
+    """
+    Extrai o texto de cada página com o PDFium (C++)
+    
+    Páginas e text pages são fechadas logo após o uso para liberar os
+    buffers nativos. O PDFium não é thread-safe, então a extração inteira
+    (abertura ao fechamento) roda sob _PDFIUM_LOCK; o download continua
+    em paralelo no pool.
+    """
+    with _PDFIUM_LOCK:
+        pdf = pdfium.PdfDocument(pdf_content)
+        try:
+            pages = []
+            for page in pdf:
+                textpage = page.get_textpage()
+                # PDFium separa linhas com \r\n
+                pages.append(textpage.get_text_range().replace('\r\n', '\n'))
+                textpage.close()
+                page.close()
+            return pages
+        finally:
+            pdf.close()
+
+
+def _split_text(full_text: str, chunk_size: int, overlap: int) -> List[Dict[str, Any]]:
+    """
+    Divide o texto em chunks sobrepostos, quebrando em fim de frase/linha
+    
+    A quebra só é aceita nos últimos 30% do chunk, então o rfind procura
+    apenas nessa janela do texto completo (sem copiar o chunk antes). A
+    janela também começa depois da sobreposição, para que cada chunk avance.
+    """
+    if chunk_size <= 0 or not 0 <= overlap < chunk_size:
+        raise ValueError(
+            f"Parâmetros de chunking inválidos: chunk_size={chunk_size}, overlap={overlap} "
+            "(exigido chunk_size > 0 e 0 <= overlap < chunk_size)"
+        )
+    
+    text_length = len(full_text)
+    min_break = chunk_size * 0.7  # Pelo menos 70% do chunk
+    
+    chunks = []
+    start = 0
+    chunk_id = 0
+    
+    while start < text_length:
+        end = start + chunk_size
+        
+        # Tentar quebrar em uma frase completa (último '.'/'\n' antes de end)
+        if end < text_length:
+            # Quebra em break_point => próximo início em break_point + 1 - overlap > start
+            window_start = max(int(start + min_break) + 1, start + overlap)
+            break_point = max(
+                full_text.rfind('.', window_start, end),
+                full_text.rfind('\n', window_start, end)
+            )
+            if break_point >= 0:
+                end = break_point + 1
+        
+        chunk_text = full_text[start:end].strip()
+        chunks.append({
+            "chunk_id": chunk_id,
+            "start_position": start,
+            "end_position": end,
+            "text": chunk_text,
+            "char_count": len(chunk_text)
+        })
+        
+        chunk_id += 1
+        start = end - overlap
+    
+    return chunks
+
+
+def _chunk_index(dimension: int) -> faiss.IndexHNSWSQ:
+    """
+    Índice HNSW (busca sublinear) de produto interno sobre vetores int8 (1/4 da memória)
+    
+    Os embeddings são normalizados, então toda componente fica em [-1, 1];
+    o quantizador é treinado nesse intervalo fixo e não depende dos
+    documentos indexados primeiro.
+    """
+    index = faiss.IndexHNSWSQ(
+        dimension, faiss.ScalarQuantizer.QT_8bit, _HNSW_M, faiss.METRIC_INNER_PRODUCT
+    )
+    index.hnsw.efConstruction = _HNSW_EF_CONSTRUCTION
+    index.hnsw.efSearch = _HNSW_EF_SEARCH
+    index.train(np.array([[-1.0] * dimension, [1.0] * dimension], dtype=np.float32))
+    return index
+
+
+def _write_atomic(path: Path, data: bytes):
+    """Grava o arquivo inteiro ou nada (rename atômico)"""
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+class _DocumentCache:
+    """
+    Cache persistente do processamento dos PDFs
+    
+    Guarda o texto das páginas ({conteúdo}.text.json) e, por parâmetros de
+    chunking, os embeddings ({chave}.npy) com os chunks e metadados em
+    {chave}.meta.json. Como a chave vem do md5 do blob, um PDF alterado
+    simplesmente gera entradas novas.
+    """
+    
+    def __init__(self, path: Path):
+        self.path = path
+        path.mkdir(parents=True, exist_ok=True)
+    
+    def get_pages(self, content_key: str) -> Optional[List[str]]:
+        """Textos das páginas já extraídos do PDF"""
+        try:
+            data = json.loads((self.path / f"{content_key}.text.json").read_bytes())
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != _DOCUMENT_CACHE_VERSION:
+            return None
+        return data["pages"]
+    
+    def set_pages(self, content_key: str, pages: List[str]):
+        _write_atomic(
+            self.path / f"{content_key}.text.json",
+            json.dumps({"version": _DOCUMENT_CACHE_VERSION, "pages": pages}).encode()
+        )
+    
+    def get_embeddings(self, key: str) -> Optional[Dict[str, Any]]:
+        """Entrada de document_embeddings (embeddings mapeados do disco)"""
+        try:
+            meta = json.loads((self.path / f"{key}.meta.json").read_bytes())
+            if meta.get("version") != _DOCUMENT_CACHE_VERSION or meta.get("model") != _EMBEDDINGS_MODEL:
+                return None
+            return {
+                "embeddings": np.load(self.path / f"{key}.npy", mmap_mode='r'),
+                "chunks": meta["chunks"],
+                "generated_at": meta["generated_at"],
+                "content_key": meta["content_key"],
+                "document_name": meta["document_name"]
+            }
+        except (OSError, ValueError, KeyError):
+            return None
+    
+    def set_embeddings(self, key: str, document_name: str, entry: Dict[str, Any]):
+        buffer = io.BytesIO()
+        np.save(buffer, np.ascontiguousarray(entry["embeddings"]))
+        _write_atomic(self.path / f"{key}.npy", buffer.getvalue())
+        # Metadados por último: só são lidos com o .npy já completo
+        _write_atomic(self.path / f"{key}.meta.json", json.dumps({
+            "version": _DOCUMENT_CACHE_VERSION,
+            "model": _EMBEDDINGS_MODEL,
+            "document_name": document_name,
+            "content_key": entry["content_key"],
+            "chunks": entry["chunks"],
+            "generated_at": entry["generated_at"]
+        }).encode())
+    
+    def load_all(self) -> Dict[str, Dict[str, Any]]:
+        """Embeddings mais recentes de cada documento presentes no cache"""
+        latest = {}
+        for meta_path in self.path.glob("*.meta.json"):
+            entry = self.get_embeddings(meta_path.name[:-len(".meta.json")])
+            if entry is None:
+                continue
+            document_name = entry.pop("document_name")
+            current = latest.get(document_name)
+            if current is None or entry["generated_at"] > current["generated_at"]:
+                latest[document_name] = entry
+        return latest
+
+
 class RAGMCPServer:
     """
     Servidor MCP para RAG - Fornece acesso ao sistema RAG com documentos jurídicos
@@ -38,9 +254,33 @@ class RAGMCPServer:
         self.storage_client = None
         self.bucket_name = "lab-rag-files-bucket"
         self.embeddings_model = None
+        self.openai_client = None
         self.document_embeddings = {}
         self.document_chunks = {}
+        # Documento -> chave do conteúdo (md5 do blob) e parâmetros de chunking
+        self.document_sources: Dict[str, Dict[str, Any]] = {}
+        self.document_cache = None
+        # Download/parse de PDFs e I/O de cache rodam no pool (tamanho padrão,
+        # núcleos + 4, pois mistura rede e CPU); o modelo de embeddings tem um
+        # worker dedicado (acesso serializado ao modelo/GPU)
+        self.executor = ThreadPoolExecutor(thread_name_prefix="rag-io")
+        self._encode_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rag-encode")
+        # Índice único (inner product sobre vetores normalizados = cosseno,
+        # quantizados em int8) com todos os chunks; linha do índice -> (documento, posição do chunk)
+        # e documento -> intervalo [início, fim) de linhas. O HNSW não remove
+        # vetores: linhas de versões antigas ficam None no registro
+        self.index = None
+        self.chunk_registry: List[Optional[Tuple[str, int]]] = []
+        self.document_rows: Dict[str, Tuple[int, int]] = {}
+        self._stale_rows = 0
+        # Serializa buscas e alterações do índice (feitas fora do event loop)
+        self._index_lock = asyncio.Lock()
+        # Embeddings das perguntas já respondidas (id -> entrada, ordem LRU)
+        self.qa_cache_index = None
+        self.qa_cache_entries = OrderedDict()
+        self._qa_cache_next_id = 0
         self._initialize_connections()
+        self._preload_cache()
         self._register_tools()
         self._register_resources()
     
@@ -61,22 +301,317 @@ class RAGMCPServer:
             )
             
             # Inicializar modelo de embeddings
-            self.embeddings_model = SentenceTransformer('all-MiniLM-L6-v2')
+            self.embeddings_model = SentenceTransformer(_EMBEDDINGS_MODEL)
+            dimension = self.embeddings_model.get_sentence_embedding_dimension()
+            self.index = _chunk_index(dimension)
+            self.qa_cache_index = faiss.IndexIDMap(faiss.IndexFlatIP(dimension))
             
-            # Configurar OpenAI
-            openai.api_key = os.getenv('OPENAI_API_KEY')
-            openai.api_base = os.getenv('OPENAI_API_BASE', 'https://api.openai.com/v1')
+            # Configurar OpenAI (cliente assíncrono; sem chave, generate_answer usa o fallback)
+            if os.getenv('OPENAI_API_KEY'):
+                self.openai_client = AsyncOpenAI(
+                    api_key=os.getenv('OPENAI_API_KEY'),
+                    base_url=os.getenv('OPENAI_API_BASE', 'https://api.openai.com/v1')
+                )
             
             self.logger.info("RAG MCP Server conectado", {
                 "bucket": self.bucket_name,
                 "project_id": config.gcp.project_id,
-                "embeddings_model": "all-MiniLM-L6-v2"
+                "embeddings_model": _EMBEDDINGS_MODEL
             })
             
         except Exception as e:
             self.logger.error(f"Erro na inicialização RAG MCP: {str(e)}")
             self.storage_client = None
     
+    def _preload_cache(self):
+        """Carrega no índice os embeddings persistidos por execuções anteriores"""
+        try:
+            self.document_cache = _DocumentCache(_CACHE_DIR)
+        except OSError as e:
+            self.logger.warning(f"Cache de documentos indisponível: {str(e)}")
+            return
+        
+        if not self.embeddings_model:
+            return
+        
+        entries = self.document_cache.load_all()
+        if entries:
+            self._store_embeddings(entries)
+            self.logger.info("Embeddings carregados do cache", {
+                "cache_dir": str(_CACHE_DIR),
+                "documents_count": len(entries)
+            })
+    
+    async def _run(self, func, *args, executor: Optional[ThreadPoolExecutor] = None, **kwargs):
+        """Executa uma chamada bloqueante fora do event loop (pool de I/O por padrão)"""
+        return await asyncio.get_running_loop().run_in_executor(
+            executor or self.executor, functools.partial(func, *args, **kwargs)
+        )
+    
+    def _extract_sync(self, document_name: str) -> Optional[Tuple[Optional[str], List[str]]]:
+        """Obtém (chave do conteúdo, textos das páginas) do PDF; None se não existir"""
+        blob = self.storage_client.bucket(self.bucket_name).get_blob(document_name)
+        if blob is None:
+            return None
+        
+        # Texto já extraído desta versão do PDF (md5 do blob)
+        content_key = _content_key(blob.md5_hash)
+        pages = (
+            self.document_cache.get_pages(content_key)
+            if content_key and self.document_cache else None
+        )
+        
+        if pages is None:
+            # Baixar e extrair texto do PDF
+            pages = _extract_pdf_pages(blob.download_as_bytes())
+            
+            if content_key and self.document_cache:
+                try:
+                    self.document_cache.set_pages(content_key, pages)
+                except OSError as e:
+                    self.logger.warning(f"Falha ao gravar texto em cache: {str(e)}")
+        
+        return content_key, pages
+    
+    def _embeddings_cache_key(self, document_name: str) -> Optional[str]:
+        """Chave dos embeddings em disco: conteúdo do PDF + parâmetros de chunking"""
+        source = self.document_sources.get(document_name, {})
+        if not source.get("content_key") or "chunking" not in source:
+            return None
+        chunk_size, overlap = source["chunking"]
+        return f"{source['content_key']}-{chunk_size}-{overlap}-c{_CHUNKER_VERSION}"
+    
+    def _add_to_index(self, document_name: str, embeddings: np.ndarray):
+        """Adiciona os embeddings (normalizados) de um documento ao índice"""
+        start = self.index.ntotal
+        self.index.add(embeddings)
+        self.chunk_registry.extend((document_name, position) for position in range(len(embeddings)))
+        self.document_rows[document_name] = (start, self.index.ntotal)
+    
+    def _rebuild_index(self):
+        """Recria o índice a partir de document_embeddings (descarta linhas antigas)"""
+        self.index.reset()
+        self.chunk_registry = []
+        self.document_rows = {}
+        self._stale_rows = 0
+        for document_name, data in self.document_embeddings.items():
+            self._add_to_index(document_name, data["embeddings"])
+    
+    def _encode_all(self, texts: List[str]) -> np.ndarray:
+        """
+        Embeddings normalizados (float32) de vários textos em uma única chamada
+        
+        Os textos são codificados ordenados por tamanho para que cada lote
+        tenha comprimentos parecidos (menos padding) e as linhas voltam na
+        ordem original.
+        """
+        if not texts:
+            return np.empty((0, self.index.d), dtype=np.float32)
+        
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        encoded = self.embeddings_model.encode(
+            [texts[i] for i in order],
+            batch_size=_ENCODE_BATCH_SIZE,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=True
+        )
+        embeddings = np.empty((len(texts), encoded.shape[1]), dtype=np.float32)
+        embeddings[order] = encoded
+        return embeddings
+    
+    def _store_embeddings(self, entries: Dict[str, Dict[str, Any]]):
+        """
+        Guarda entradas de document_embeddings e atualiza o índice
+        
+        Um documento reindexado tem as linhas antigas marcadas como obsoletas
+        e as novas adicionadas; o grafo só é reconstruído quando mais da
+        metade das linhas está obsoleta.
+        """
+        for document_name in entries:
+            if document_name in self.document_rows:
+                start, end = self.document_rows[document_name]
+                self.chunk_registry[start:end] = [None] * (end - start)
+                self._stale_rows += end - start
+        self.document_embeddings.update(entries)
+        
+        if self._stale_rows * 2 > self.index.ntotal:
+            self._rebuild_index()
+        else:
+            for document_name, entry in entries.items():
+                self._add_to_index(document_name, entry["embeddings"])
+    
+    async def _embed_documents(self, chunked: List[Tuple[str, List[Dict[str, Any]]]]):
+        """
+        Gera os embeddings dos chunks de vários documentos e atualiza o índice
+        
+        Documentos já presentes no cache em disco são carregados de lá; os
+        demais são codificados juntos em uma única chamada e persistidos.
+        """
+        entries = {}
+        pending = []
+        for document_name, chunks in chunked:
+            cache_key = self._embeddings_cache_key(document_name)
+            cached = (
+                self.document_cache.get_embeddings(cache_key)
+                if cache_key and self.document_cache else None
+            )
+            if cached is not None:
+                cached.pop("document_name")
+                entries[document_name] = cached
+            else:
+                pending.append((document_name, chunks, cache_key))
+        
+        all_embeddings = await self._run(
+            self._encode_all,
+            [chunk["text"] for _, chunks, _ in pending for chunk in chunks],
+            executor=self._encode_executor
+        )
+        generated_at = datetime.now().isoformat()
+        offset = 0
+        for document_name, chunks, cache_key in pending:
+            entry = entries[document_name] = {
+                "embeddings": all_embeddings[offset:offset + len(chunks)],
+                "chunks": chunks,
+                "generated_at": generated_at,
+                "content_key": self.document_sources.get(document_name, {}).get("content_key")
+            }
+            offset += len(chunks)
+            
+            if cache_key and self.document_cache:
+                try:
+                    await self._run(self.document_cache.set_embeddings, cache_key, document_name, entry)
+                except OSError as e:
+                    self.logger.warning(f"Falha ao gravar embeddings em cache: {str(e)}")
+        
+        # Inserção no grafo HNSW é pesada: roda no worker do modelo
+        async with self._index_lock:
+            await self._run(self._store_embeddings, entries, executor=self._encode_executor)
+        # Respostas em cache podem não refletir o conteúdo novo
+        self._qa_cache_clear()
+    
+    def _encode_query(self, text: str) -> np.ndarray:
+        """Embedding normalizado (1 x dimensão, float32) de uma consulta"""
+        return np.ascontiguousarray(
+            self.embeddings_model.encode(
+                [text], show_progress_bar=False, convert_to_numpy=True, normalize_embeddings=True
+            ),
+            dtype=np.float32
+        )
+    
+    async def _search(
+        self,
+        query_embedding: np.ndarray,
+        document_name: Optional[str],
+        top_k: int,
+        similarity_threshold: float
+    ) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """Busca os chunks mais similares; retorna (documentos buscados, resultados)"""
+        documents_to_search = [document_name] if document_name else list(self.document_embeddings.keys())
+        
+        if document_name and document_name not in self.document_embeddings:
+            # Tentar gerar embeddings se não existirem
+            embed_result = await self.server.tools["generate_embeddings"](document_name)
+            if not embed_result.get("success"):
+                return [], []
+        
+        # O índice HNSW não admite busca durante add/reconstrução
+        async with self._index_lock:
+            if not documents_to_search or not self.index.ntotal:
+                return documents_to_search, []
+            
+            if document_name:
+                # Só as linhas do documento: produto escalar direto e seleção
+                # dos top-k em O(n) com argpartition (ordena apenas os k)
+                scores = self.document_embeddings[document_name]["embeddings"] @ query_embedding[0]
+                k = min(top_k, len(scores))
+                top = np.argpartition(-scores, k - 1)[:k] if k else np.empty(0, dtype=np.int64)
+                top = top[np.argsort(-scores[top])]
+                hits = [(document_name, int(position), scores[position]) for position in top]
+            else:
+                # Candidatos pelo índice int8, pontuação final com os vetores float32
+                candidates = min(max(top_k, _RERANK_CANDIDATES), self.index.ntotal)
+                _, rows = self.index.search(query_embedding, candidates)
+                located = [
+                    self.chunk_registry[row] for row in rows[0]
+                    if row >= 0 and self.chunk_registry[row] is not None
+                ]
+                # Todos os candidatos podem ser linhas removidas (tombstones)
+                if not located:
+                    return documents_to_search, []
+                vectors = np.array([
+                    self.document_embeddings[doc_name]["embeddings"][position]
+                    for doc_name, position in located
+                ], dtype=np.float32).reshape(-1, self.index.d)
+                scores = vectors @ query_embedding[0]
+                top = np.argsort(-scores)[:top_k]
+                hits = [(*located[i], scores[i]) for i in top]
+            
+            # Hits ordenados por similaridade
+            search_results = []
+            for doc_name, position, score in hits:
+                if score < similarity_threshold:
+                    break
+                chunk = self.document_embeddings[doc_name]["chunks"][position]
+                search_results.append({
+                    "document_name": doc_name,
+                    "chunk_id": chunk["chunk_id"],
+                    "similarity_score": float(score),
+                    "text": chunk["text"],
+                    "start_position": chunk["start_position"],
+                    "char_count": chunk["char_count"]
+                })
+            return documents_to_search, search_results
+    
+    def _qa_cache_lookup(self, query_embedding: np.ndarray, scope: tuple) -> Optional[Dict[str, Any]]:
+        """Resposta em cache para uma pergunta semanticamente equivalente"""
+        if not self.qa_cache_entries:
+            return None
+        
+        k = min(_QA_CACHE_CANDIDATES, self.qa_cache_index.ntotal)
+        scores, ids = self.qa_cache_index.search(query_embedding, k)
+        now = time.monotonic()
+        expired = []
+        hit = None
+        
+        for score, entry_id in zip(scores[0], ids[0]):
+            if entry_id < 0 or score < _QA_CACHE_THRESHOLD:
+                break
+            cached_at, entry_scope, response = self.qa_cache_entries[entry_id]
+            if now - cached_at > _QA_CACHE_TTL:
+                expired.append(entry_id)
+            elif entry_scope == scope:
+                self.qa_cache_entries.move_to_end(entry_id)
+                hit = response
+                break
+        
+        if expired:
+            self._qa_cache_remove(expired)
+        return hit
+    
+    def _qa_cache_store(self, query_embedding: np.ndarray, scope: tuple, response: Dict[str, Any]):
+        """Guarda a resposta, descartando a entrada menos usada acima do limite"""
+        entry_id = self._qa_cache_next_id
+        self._qa_cache_next_id += 1
+        self.qa_cache_index.add_with_ids(query_embedding, np.array([entry_id], dtype=np.int64))
+        self.qa_cache_entries[entry_id] = (time.monotonic(), scope, response)
+        
+        overflow = len(self.qa_cache_entries) - _QA_CACHE_MAX
+        if overflow > 0:
+            self._qa_cache_remove(list(self.qa_cache_entries)[:overflow])
+    
+    def _qa_cache_remove(self, entry_ids: List[int]):
+        """Remove entradas do cache semântico"""
+        self.qa_cache_index.remove_ids(np.array(entry_ids, dtype=np.int64))
+        for entry_id in entry_ids:
+            del self.qa_cache_entries[entry_id]
+    
+    def _qa_cache_clear(self):
+        """Esvazia o cache semântico"""
+        if self.qa_cache_entries:
+            self.qa_cache_index.reset()
+            self.qa_cache_entries.clear()
+    
     def _register_tools(self):
         """Registra ferramentas MCP para RAG"""
         
@@ -90,7 +625,7 @@ class RAGMCPServer:
                     return {"error": "Storage não conectado"}
                 
                 bucket = self.storage_client.bucket(self.bucket_name)
-                blobs = bucket.list_blobs()
+                blobs = await self._run(list, bucket.list_blobs())
                 
                 documents = []
                 for blob in blobs:
@@ -133,33 +668,30 @@ class RAGMCPServer:
                 if not self.storage_client:
                     return {"error": "Storage não conectado"}
                 
-                bucket = self.storage_client.bucket(self.bucket_name)
-                blob = bucket.blob(document_name)
-                
-
-
-
-                if not blob.exists():
+                extracted = await self._run(self._extract_sync, document_name)
+                if extracted is None:
                     return {"error": f"Documento {document_name} não encontrado"}
                 
-                # Baixar e extrair texto do PDF
-                pdf_content = blob.download_as_bytes()
-                pdf_reader = PyPDF2.PdfReader(io.BytesIO(pdf_content))
+                content_key, pages = extracted
+                self.document_sources[document_name] = {"content_key": content_key}
                 
-                extracted_text = ""
+                text_parts = []
                 page_texts = []
+                # Hash do conteúdo calculado página a página (sem codificar o texto inteiro)
+                content_hasher = hashlib.blake2b(digest_size=16)
                 
-                for page_num, page in enumerate(pdf_reader.pages):
-                    page_text = page.extract_text()
+                for page_num, page_text in enumerate(pages):
                     page_texts.append({
                         "page_number": page_num + 1,
                         "text": page_text,
                         "char_count": len(page_text)
                     })
-                    extracted_text += f"\n--- Página {page_num + 1} ---\n{page_text}\n"
+                    text_part = f"\n--- Página {page_num + 1} ---\n{page_text}\n"
+                    text_parts.append(text_part)
+                    content_hasher.update(text_part.encode())
                 
-                # Gerar hash do conteúdo para cache
-                content_hash = hashlib.md5(extracted_text.encode()).hexdigest()
+                extracted_text = "".join(text_parts)
+                content_hash = content_hasher.hexdigest()
                 
                 self.logger.info("Texto extraído do documento", {
                     "document": document_name,
@@ -203,40 +735,12 @@ class RAGMCPServer:
                 if not text_result.get("success"):
                     return text_result
                 
-                full_text = text_result["extracted_text"]
-                
                 # Dividir em chunks
-                chunks = []
-                start = 0
-                chunk_id = 0
-                
-                while start < len(full_text):
-                    end = start + chunk_size
-                    chunk_text = full_text[start:end]
-                    
-                    # Tentar quebrar em uma frase completa
-                    if end < len(full_text):
-                        last_period = chunk_text.rfind('.')
-                        last_newline = chunk_text.rfind('\n')
-                        break_point = max(last_period, last_newline)
-                        
-                        if break_point > start + chunk_size * 0.7:  # Pelo menos 70% do chunk
-                            chunk_text = chunk_text[:break_point + 1]
-                            end = start + len(chunk_text)
-                    
-                    chunks.append({
-                        "chunk_id": chunk_id,
-                        "start_position": start,
-                        "end_position": end,
-                        "text": chunk_text.strip(),
-                        "char_count": len(chunk_text.strip())
-                    })
-                    
-                    chunk_id += 1
-                    start = end - overlap
+                chunks = await self._run(_split_text, text_result["extracted_text"], chunk_size, overlap)
                 
                 # Armazenar chunks em cache
                 self.document_chunks[document_name] = chunks
+                self.document_sources.setdefault(document_name, {})["chunking"] = (chunk_size, overlap)
                 
                 self.logger.info("Documento dividido em chunks", {
                     "document": document_name,
@@ -278,17 +782,10 @@ class RAGMCPServer:
                         return chunk_result
                 
                 chunks = self.document_chunks[document_name]
-                chunk_texts = [chunk["text"] for chunk in chunks]
                 
-                # Gerar embeddings
-                embeddings = self.embeddings_model.encode(chunk_texts)
-                
-                # Armazenar embeddings
-                self.document_embeddings[document_name] = {
-                    "embeddings": embeddings,
-                    "chunks": chunks,
-                    "generated_at": datetime.now().isoformat()
-                }
+                # Gerar (ou carregar do cache em disco) e armazenar embeddings
+                await self._embed_documents([(document_name, chunks)])
+                embeddings = self.document_embeddings[document_name]["embeddings"]
                 
                 self.logger.info("Embeddings gerados", {
                     "document": document_name,
@@ -329,41 +826,10 @@ class RAGMCPServer:
                 if not self.embeddings_model:
                     return {"error": "Modelo de embeddings não carregado"}
                 
-                # Gerar embedding da query
-                query_embedding = self.embeddings_model.encode([query])
-                
-                search_results = []
-                documents_to_search = [document_name] if document_name else list(self.document_embeddings.keys())
-                
-                for doc_name in documents_to_search:
-                    if doc_name not in self.document_embeddings:
-                        # Tentar gerar embeddings se não existirem
-                        embed_result = await self.server.tools["generate_embeddings"](doc_name)
-                        if not embed_result.get("success"):
-                            continue
-                    
-                    doc_data = self.document_embeddings[doc_name]
-                    doc_embeddings = doc_data["embeddings"]
-                    doc_chunks = doc_data["chunks"]
-                    
-                    # Calcular similaridades
-                    similarities = cosine_similarity(query_embedding, doc_embeddings)[0]
-                    
-                    # Encontrar chunks mais similares
-                    for i, similarity in enumerate(similarities):
-                        if similarity >= similarity_threshold:
-                            search_results.append({
-                                "document_name": doc_name,
-                                "chunk_id": doc_chunks[i]["chunk_id"],
-                                "similarity_score": float(similarity),
-                                "text": doc_chunks[i]["text"],
-                                "start_position": doc_chunks[i]["start_position"],
-                                "char_count": doc_chunks[i]["char_count"]
-                            })
-                
-                # Ordenar por similaridade
-                search_results.sort(key=lambda x: x["similarity_score"], reverse=True)
-                search_results = search_results[:top_k]
+                query_embedding = await self._run(self._encode_query, query, executor=self._encode_executor)
+                documents_to_search, search_results = await self._search(
+                    query_embedding, document_name, top_k, similarity_threshold
+                )
                 
                 self.logger.info("Busca semântica realizada", {
                     "query": query[:100] + "..." if len(query) > 100 else query,
@@ -401,31 +867,47 @@ class RAGMCPServer:
                 max_context_length: Tamanho máximo do contexto
             """
             try:
+                if not self.embeddings_model:
+                    return {"error": "Modelo de embeddings não carregado"}
+                
+                document_name = context_documents[0] if context_documents else None
+                cache_scope = (document_name, max_context_length)
+                query_embedding = await self._run(self._encode_query, question, executor=self._encode_executor)
+                
+                cached = self._qa_cache_lookup(query_embedding, cache_scope)
+                if cached is not None:
+                    self.logger.info("Resposta RAG obtida do cache semântico", {
+                        "question": question[:100] + "..." if len(question) > 100 else question
+                    })
+                    return {**cached, "question": question, "cache_hit": True}
+                
                 # Realizar busca semântica
-                search_result = await self.server.tools["semantic_search"](
-                    question,
-                    document_name=context_documents[0] if context_documents else None,
-                    top_k=10,
-                    similarity_threshold=0.2
+                _, context_chunks = await self._search(
+                    query_embedding, document_name, top_k=10, similarity_threshold=0.2
                 )
                 
-                if not search_result.get("success") or not search_result["results"]:
+                if not context_chunks:
                     return {"error": "Nenhum contexto relevante encontrado"}
                 
                 # Construir contexto
-                context_chunks = search_result["results"]
-                context_text = ""
+                context_parts = []
+                context_length = 0
                 
                 for chunk in context_chunks:
                     chunk_text = f"\n[Documento: {chunk['document_name']}]\n{chunk['text']}\n"
-                    if len(context_text + chunk_text) <= max_context_length:
-                        context_text += chunk_text
-                    else:
+                    if context_length + len(chunk_text) > max_context_length:
                         break
+                    context_parts.append(chunk_text)
+                    context_length += len(chunk_text)
+                
+                context_text = "".join(context_parts)
                 
                 # Gerar resposta usando OpenAI
                 try:
-                    response = openai.ChatCompletion.create(
+                    if self.openai_client is None:
+                        raise RuntimeError("Cliente OpenAI não configurado")
+                    
+                    response = await self.openai_client.chat.completions.create(
                         model="gpt-3.5-turbo",
                         messages=[
                             {
@@ -440,14 +922,17 @@ class RAGMCPServer:
                             }
                         ],
                         max_tokens=1000,
-                        temperature=0.3
+                        temperature=0.3,
+                        stream=False
                     )
                     
                     answer = response.choices[0].message.content.strip()
+                    answer_from_llm = True
                     
                 except Exception as openai_error:
                     # Fallback para resposta simples baseada em contexto
                     answer = f"Baseado nos documentos analisados, encontrei as seguintes informações relevantes:\n\n{context_text[:500]}..."
+                    answer_from_llm = False
                 
                 self.logger.info("Resposta RAG gerada", {
                     "question": question[:100] + "..." if len(question) > 100 else question,
@@ -456,7 +941,7 @@ class RAGMCPServer:
                     "answer_length": len(answer)
                 })
                 
-                return {
+                result = {
                     "success": True,
                     "question": question,
                     "answer": answer,
@@ -469,9 +954,16 @@ class RAGMCPServer:
                         for chunk in context_chunks
                     ],
                     "context_length": len(context_text),
+                    "cache_hit": False,
                     "timestamp": datetime.now().isoformat()
                 }
                 
+                # Só respostas do modelo entram no cache (o fallback não)
+                if answer_from_llm:
+                    self._qa_cache_store(query_embedding, cache_scope, result)
+                
+                return result
+                
             except Exception as e:
                 self.logger.error(f"Erro ao gerar resposta: {str(e)}")
                 return {"error": str(e)}
@@ -487,22 +979,39 @@ class RAGMCPServer:
                 if not docs_result.get("success"):
                     return docs_result
                 
+                if not self.embeddings_model:
+                    return {"error": "Modelo de embeddings não carregado"}
+                
                 documents = docs_result["documents"]
-                indexed_count = 0
                 errors = []
+                unchanged = 0
                 
+                # Extrair e dividir todos os documentos
+                chunked = []
                 for doc in documents:
                     try:
-                        # Gerar embeddings para cada documento
-                        embed_result = await self.server.tools["generate_embeddings"](doc["name"])
-                        if embed_result.get("success"):
-                            indexed_count += 1
-                        else:
-                            errors.append(f"{doc['name']}: {embed_result.get('error', 'Erro desconhecido')}")
+                        # Já indexado (por exemplo, carregado do cache) e sem alteração no bucket
+                        content_key = _content_key(doc["md5_hash"])
+                        indexed = self.document_embeddings.get(doc["name"])
+                        if content_key and indexed and indexed.get("content_key") == content_key:
+                            unchanged += 1
+                            continue
+                        
+                        source = self.document_sources.get(doc["name"], {})
+                        if doc["name"] not in self.document_chunks or source.get("content_key") != content_key:
+                            chunk_result = await self.server.tools["chunk_document"](doc["name"])
+                            if not chunk_result.get("success"):
+                                errors.append(f"{doc['name']}: {chunk_result.get('error', 'Erro desconhecido')}")
+                                continue
+                        chunked.append((doc["name"], self.document_chunks[doc["name"]]))
                     
                     except Exception as e:
                         errors.append(f"{doc['name']}: {str(e)}")
                 
+                # Gerar embeddings de todos os chunks em uma única chamada
+                await self._embed_documents(chunked)
+                indexed_count = unchanged + len(chunked)
+                
                 self.logger.info("Indexação completa", {
                     "total_documents": len(documents),
                     "indexed_successfully": indexed_count,
@@ -573,7 +1082,7 @@ class RAGMCPServer:
                     "data": {
                         "indexed_documents": total_documents,
                         "total_chunks": total_chunks,
-                        "embedding_model": "all-MiniLM-L6-v2",
+                        "embedding_model": _EMBEDDINGS_MODEL,
                         "bucket_name": self.bucket_name,
                         "last_indexed": max(
                             [data["generated_at"] for data in self.document_embeddings.values()],
@@ -597,6 +1106,15 @@ class RAGMCPServer:
         except Exception as e:
             self.logger.error(f"Erro ao iniciar RAG MCP Server: {str(e)}")
             raise
+        finally:
+            if self.openai_client is not None:
+                await self.openai_client.close()
+            self.close()
+    
+    def close(self):
+        """Encerra os pools de threads"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self._encode_executor.shutdown(wait=False, cancel_futures=True)
     
     def get_server_info(self) -> Dict[str, Any]:
         """Retorna informações do servidor"""
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+RAG MCP Server - Teste da divisão de documentos em chunks
+Script para testar _split_text com sobreposições grandes e parâmetros inválidos
+"""
+
+import os
+import sys
+
+# Adicionar path do projeto
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from mcp.rag.rag_mcp_server import _split_text
+
+# Frases de ~720 caracteres: a quebra cai logo após 70% de um chunk de 1000,
+# abaixo de sobreposições de 750/800 (o início do chunk seguinte recuaria)
+SENTENCE_TEXT = ("x" * 719 + ".") * 40
+WORDS_TEXT = " ".join(
+    ("custo", "nuvem.", "política\n", "ação", "região", "instância")[i % 6] for i in range(3000)
+)
+
+
+def _check_progress(text: str, chunk_size: int, overlap: int):
+    """Cada chunk começa depois do anterior e o último alcança o fim do texto"""
+    chunks = _split_text(text, chunk_size, overlap)
+    starts = [chunk["start_position"] for chunk in chunks]
+
+    assert starts[0] == 0
+    assert all(later > earlier for earlier, later in zip(starts, starts[1:]))
+    assert chunks[-1]["end_position"] >= len(text)
+    assert len(chunks) <= len(text)
+    return chunks
+
+
+def test_large_overlaps():
+    """Sobreposições acima de 70% do chunk terminam e avançam"""
+    print("🧩 Testando sobreposições grandes...")
+
+    for text in (SENTENCE_TEXT, WORDS_TEXT):
+        for chunk_size, overlap in ((1000, 200), (1000, 750), (1000, 800), (500, 400), (1000, 999)):
+            chunks = _check_progress(text, chunk_size, overlap)
+            print(f"   chunk_size={chunk_size} overlap={overlap}: {len(chunks)} chunks")
+
+    print("✅ Sobreposições grandes OK")
+
+
+def test_sentence_breaks():
+    """Com sobreposição pequena, os chunks terminam em fim de frase"""
+    print("🧩 Testando quebra em fim de frase...")
+
+    chunks = _check_progress(SENTENCE_TEXT, 1000, 200)
+    assert all(chunk["text"].endswith(".") for chunk in chunks[:-1])
+
+    print("✅ Quebra em fim de frase OK")
+
+
+def test_invalid_parameters():
+    """chunk_size <= 0 ou overlap fora de [0, chunk_size) são rejeitados"""
+    print("🧩 Testando parâmetros inválidos...")
+
+    for chunk_size, overlap in ((1000, 1000), (1000, 1500), (0, 0), (100, -1)):
+        try:
+            _split_text(WORDS_TEXT, chunk_size, overlap)
+        except ValueError:
+            continue
+        raise AssertionError(f"chunk_size={chunk_size} overlap={overlap} deveria falhar")
+
+    print("✅ Parâmetros inválidos OK")
+
+
+def main():
+    """Executa todos os testes de chunking"""
+    test_large_overlaps()
+    test_sentence_breaks()
+    test_invalid_parameters()
+    print("🎉 Testes de chunking concluídos")
+
+
+if __name__ == "__main__":
+    main()
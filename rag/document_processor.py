@@ -17,10 +17,9 @@ from google.oauth2 import service_account
 from google.auth import default
 import PyPDF2
 import io
-import openai
+from openai import OpenAI
 from sentence_transformers import SentenceTransformer
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 import faiss
 import tiktoken
 
@@ -41,6 +40,7 @@ class DocumentProcessor:
         self.bucket_name = "lab-rag-files-bucket"
         self.embeddings_model = None
         self.tokenizer = None
+        self.openai_client = None
         self.vector_index = None
         self.document_metadata = {}
         self.chunk_metadata = {}
@@ -71,8 +71,11 @@ class DocumentProcessor:
             self.tokenizer = tiktoken.get_encoding("cl100k_base")
             
             # Configurar OpenAI
-            openai.api_key = os.getenv('OPENAI_API_KEY')
-            openai.api_base = os.getenv('OPENAI_API_BASE', 'https://api.openai.com/v1')
+            if os.getenv('OPENAI_API_KEY'):
+                self.openai_client = OpenAI(
+                    api_key=os.getenv('OPENAI_API_KEY'),
+                    base_url=os.getenv('OPENAI_API_BASE', 'https://api.openai.com/v1')
+                )
             
             # Carregar cache se existir
             self._load_cache()
@@ -597,7 +600,10 @@ class DocumentProcessor:
             
             # Gerar resposta usando OpenAI
             try:
-                response = openai.ChatCompletion.create(
+                if self.openai_client is None:
+                    raise RuntimeError("Cliente OpenAI não configurado")
+                
+                response = self.openai_client.chat.completions.create(
                     model=model,
                     messages=[
                         {